@@ -0,0 +1,205 @@
+"""
+Benchmark harness for the expression evaluator.
+
+Times a fixed corpus of shallow, deeply nested, function-heavy and
+long-chain expressions, reporting parse (ast.parse), compile (parse +
+optimize + closure build, cache disabled) and evaluation times separately
+with percentiles. Each call is warmed up first and the corpus is timed
+several rounds with the garbage collector off; the fastest round counts.
+Results can be saved as JSON and compared against an earlier run with the
+same settings to flag regressions.
+
+Run:
+  python bench.py --save baseline.json
+  python bench.py --compare baseline.json --threshold 0.10
+"""
+from __future__ import annotations
+
+import argparse
+import ast
+import datetime
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+from engine import SafeEvaluator
+
+PHASES = ("parse", "compile", "eval")
+# options that change what is measured; runs are only comparable if they match
+SETTINGS = ("seed", "repeat", "rounds", "warmup")
+# a single sub-microsecond call mostly measures the clock; time loops at least this long
+MIN_SAMPLE_NS = 20_000
+
+
+def build_corpus(seed: int = 1234) -> dict[str, list[str]]:
+	"""Deterministic expression corpus, grouped by shape."""
+	rng = random.Random(seed)
+	funcs = ["sin", "cos", "sqrt", "log", "tanh", "atan", "fabs", "floor"]
+	ops = ["+", "-", "*", "/"]
+
+	def num():
+		return str(rng.choice([rng.randint(1, 99), round(rng.uniform(0.1, 9.9), 3)]))
+
+	corpus = {
+		"shallow": [f"{num()} {rng.choice(ops)} {num()}" for _ in range(50)],
+		"nested": [],
+		"function_heavy": [],
+		"long_chain": [],
+	}
+	# every non-shallow expression mentions `x` so constant folding cannot
+	# reduce it to a single number and the eval phase measures real work
+	for _ in range(50):
+		expr = "x"
+		for _ in range(30):
+			expr = f"({expr} {rng.choice(ops[:3])} {num()})"
+		corpus["nested"].append(expr)
+	for _ in range(50):
+		expr = f"x * {num()}"
+		for _ in range(12):
+			# sqrt/log of a possibly negative value would just raise; keep arguments positive
+			expr = f"{rng.choice(funcs)}(fabs({expr}) + 1)"
+		corpus["function_heavy"].append(expr)
+	for _ in range(50):
+		corpus["long_chain"].append(" + ".join(f"{num()}*x" if i % 3 == 0 else num() for i in range(200)))
+	return corpus
+
+
+def _time_ns(func, repeat, warmup):
+	"""`repeat` per-call times; calls faster than MIN_SAMPLE_NS are timed in loops and averaged."""
+	for _ in range(warmup):
+		func()
+	start = time.perf_counter_ns()
+	func()
+	single = time.perf_counter_ns() - start
+	loops = max(1, MIN_SAMPLE_NS // max(single, 1))
+	samples = []
+	for _ in range(repeat):
+		start = time.perf_counter_ns()
+		for _ in range(loops):
+			func()
+		samples.append((time.perf_counter_ns() - start) / loops)
+	return samples
+
+
+def summarize(samples_ns: list[int]) -> dict[str, float]:
+	"""Percentiles and mean in microseconds."""
+	cuts = statistics.quantiles(samples_ns, n=100, method="inclusive")
+	return {
+		"n": len(samples_ns),
+		"mean_us": statistics.fmean(samples_ns) / 1000,
+		"p50_us": cuts[49] / 1000,
+		"p90_us": cuts[89] / 1000,
+		"p99_us": cuts[98] / 1000,
+	}
+
+
+def run(
+	corpus: dict[str, list[str]], repeat: int, rounds: int = 5, warmup: int = 3
+) -> dict[str, dict[str, dict[str, float]]]:
+	"""Time every group and phase `rounds` times; keep each one's fastest round (by p50)."""
+	# a cache would turn every compile after the first into a dictionary hit
+	evaluator = SafeEvaluator(cache_size=0)
+	env = {"x": 1.5}
+	best = {}
+	gc_was_enabled = gc.isenabled()
+	gc.collect()
+	gc.disable()
+	try:
+		for _ in range(rounds):
+			for group, expressions in corpus.items():
+				samples = {phase: [] for phase in PHASES}
+				for expr in expressions:
+					samples["parse"] += _time_ns(lambda: ast.parse(expr, mode="eval"), repeat, warmup)
+					samples["compile"] += _time_ns(lambda: evaluator.compile(expr, env), repeat, warmup)
+					compiled = evaluator.compile(expr, env)
+					samples["eval"] += _time_ns(lambda: compiled(env), repeat, warmup)
+				for phase, s in samples.items():
+					stats = summarize(s)
+					kept = best.setdefault(group, {}).get(phase)
+					if kept is None or stats["p50_us"] < kept["p50_us"]:
+						best[group][phase] = stats
+				# collect between groups, outside the timed calls
+				gc.collect()
+	finally:
+		if gc_was_enabled:
+			gc.enable()
+	return best
+
+
+def compare(current, baseline, threshold: float) -> list[str]:
+	"""Return a line per group/phase whose median got slower than `threshold`."""
+	regressions = []
+	for group, phases in current.items():
+		for phase, stats in phases.items():
+			old = baseline.get(group, {}).get(phase)
+			if not old:
+				continue
+			ratio = stats["p50_us"] / old["p50_us"]
+			if ratio > 1 + threshold:
+				regressions.append(
+					f"{group}/{phase}: p50 {old['p50_us']:.2f} -> {stats['p50_us']:.2f} us ({(ratio - 1) * 100:+.0f}%)"
+				)
+	return regressions
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Benchmark SafeEvaluator")
+	parser.add_argument("--repeat", type=int, default=20, help="timed runs per expression and phase")
+	parser.add_argument("--seed", type=int, default=1234, help="corpus seed")
+	parser.add_argument("--rounds", type=int, default=5, help="times the whole corpus is timed; the fastest round counts")
+	parser.add_argument("--warmup", type=int, default=3, help="untimed calls before each timed series")
+	parser.add_argument("--save", metavar="FILE", help="write results as JSON")
+	parser.add_argument("--compare", metavar="FILE", help="JSON from an earlier run to compare against")
+	parser.add_argument("--threshold", type=float, default=0.10, help="allowed p50 slowdown before flagging (0.10 = 10%%)")
+	args = parser.parse_args(argv)
+
+	settings = {name: getattr(args, name) for name in SETTINGS}
+	baseline = None
+	if args.compare:
+		with open(args.compare, "r", encoding="utf-8") as f:
+			baseline = json.load(f)
+		differ = [
+			f"{name} {baseline.get(name)} vs {value}" for name, value in settings.items() if baseline.get(name) != value
+		]
+		if differ:
+			# different settings measure different things; the ratios would mean nothing
+			print(f"error: {args.compare} was recorded with other settings: {', '.join(differ)}", file=sys.stderr)
+			return 2
+		if baseline.get("python") != sys.version.split()[0] or baseline.get("platform") != platform.platform():
+			print("warning: baseline was recorded on a different Python or platform")
+
+	results = run(build_corpus(args.seed), args.repeat, args.rounds, args.warmup)
+
+	print(f"{'group':<16}{'phase':<9}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'mean us':>10}")
+	for group, phases in results.items():
+		for phase, s in phases.items():
+			print(f"{group:<16}{phase:<9}{s['p50_us']:>10.2f}{s['p90_us']:>10.2f}{s['p99_us']:>10.2f}{s['mean_us']:>10.2f}")
+
+	if args.save:
+		report = {
+			"created": datetime.datetime.now().isoformat(timespec="seconds"),
+			"python": sys.version.split()[0],
+			"platform": platform.platform(),
+			**settings,
+			"results": results,
+		}
+		with open(args.save, "w", encoding="utf-8") as f:
+			json.dump(report, f, indent=2)
+		print(f"saved {args.save}")
+
+	if baseline is not None:
+		regressions = compare(results, baseline["results"], args.threshold)
+		for line in regressions:
+			print(f"REGRESSION {line}")
+		if regressions:
+			return 1
+		print(f"no regressions beyond {args.threshold:.0%}")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
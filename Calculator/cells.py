@@ -0,0 +1,151 @@
+"""
+Spreadsheet-style named cells on top of SafeEvaluator.
+
+Each cell holds a formula that may reference other cells by name. A
+dependency graph (cell -> cells it reads, and the reverse) lets a change
+re-evaluate only the cells downstream of it, in topological order.
+Definitions that would introduce a cycle are rejected before anything
+changes.
+"""
+from __future__ import annotations
+
+from engine import SafeEvaluator
+
+
+class CircularReferenceError(ValueError):
+	"""Raised when a cell definition would make a cell depend on itself."""
+
+
+class Cell:
+	__slots__ = ("name", "formula", "compiled", "refs", "value", "error")
+
+	def __init__(self, name, formula, compiled, refs):
+		self.name = name
+		self.formula = formula
+		self.compiled = compiled
+		self.refs = refs
+		self.value = None
+		self.error: str | None = None
+
+	def __repr__(self):
+		shown = self.error if self.error else self.value
+		return f"<Cell {self.name} = {self.formula!r} -> {shown!r}>"
+
+
+class Worksheet:
+	"""Named cells with incremental recomputation."""
+
+	def __init__(self, evaluator: SafeEvaluator | None = None):
+		self.evaluator = evaluator or SafeEvaluator()
+		self.cells: dict[str, Cell] = {}
+		# name -> names of cells whose formulas reference it (defined or not)
+		self.dependents: dict[str, set[str]] = {}
+
+	def set(self, name: str, formula: str) -> list[str]:
+		"""Define or redefine `name`; returns the cells that were recomputed, in order."""
+		if not name.isidentifier() or self.evaluator.is_reserved(name):
+			raise ValueError(f"Invalid cell name: {name}")
+		refs = frozenset(self.evaluator.free_names(formula))
+		compiled = self.evaluator.compile(formula, refs)
+		cycle = self._find_path(refs, name)
+		if cycle is not None:
+			raise CircularReferenceError("Circular reference: " + " -> ".join([name] + cycle))
+
+		old = self.cells.get(name)
+		if old is not None:
+			for ref in old.refs:
+				self._unlink(ref, name)
+		for ref in refs:
+			self.dependents.setdefault(ref, set()).add(name)
+		self.cells[name] = Cell(name, formula, compiled, refs)
+		return self._recompute(name)
+
+	def delete(self, name: str) -> list[str]:
+		"""Remove `name`; cells that used it are recomputed (and now fail)."""
+		cell = self.cells.pop(name)
+		for ref in cell.refs:
+			self._unlink(ref, name)
+		return self._recompute(name)[1:]
+
+	def get(self, name: str):
+		cell = self.cells.get(name)
+		if cell is None:
+			raise ValueError(f"Unknown cell: {name}")
+		if cell.error:
+			raise ValueError(cell.error)
+		return cell.value
+
+	def values(self) -> dict[str, float]:
+		"""Values of all cells that evaluated successfully, for binding into expressions."""
+		return {name: c.value for name, c in self.cells.items() if c.error is None}
+
+	def _unlink(self, ref, name):
+		users = self.dependents.get(ref)
+		if users is not None:
+			users.discard(name)
+			if not users:
+				del self.dependents[ref]
+
+	def _find_path(self, starts, target):
+		"""Cells from one of `starts` to `target` following references, or None."""
+		stack = [(s, [s]) for s in starts]
+		seen = set()
+		while stack:
+			node, path = stack.pop()
+			if node == target:
+				return path
+			if node in seen:
+				continue
+			seen.add(node)
+			cell = self.cells.get(node)
+			if cell is not None:
+				stack.extend((ref, path + [ref]) for ref in cell.refs)
+		return None
+
+	def _recompute(self, name) -> list[str]:
+		"""Re-evaluate `name` and everything downstream of it, each exactly once."""
+		# collect the affected subgraph
+		affected = {name}
+		stack = [name]
+		while stack:
+			for user in self.dependents.get(stack.pop(), ()):
+				if user not in affected:
+					affected.add(user)
+					stack.append(user)
+		# Kahn's algorithm restricted to the affected cells
+		indegree = {n: 0 for n in affected}
+		for n in affected:
+			cell = self.cells.get(n)
+			if cell is not None:
+				indegree[n] = sum(1 for ref in cell.refs if ref in affected)
+		ready = [n for n, d in indegree.items() if d == 0]
+		order = []
+		while ready:
+			n = ready.pop()
+			order.append(n)
+			self._evaluate(n)
+			for user in self.dependents.get(n, ()):
+				if user in indegree:
+					indegree[user] -= 1
+					if indegree[user] == 0:
+						ready.append(user)
+		return order
+
+	def _evaluate(self, name):
+		cell = self.cells.get(name)
+		if cell is None:
+			return
+		env = {}
+		for ref in cell.refs:
+			dep = self.cells.get(ref)
+			if dep is None:
+				cell.value, cell.error = None, f"Unknown cell: {ref}"
+				return
+			if dep.error:
+				cell.value, cell.error = None, f"Depends on {ref}: {dep.error}"
+				return
+			env[ref] = dep.value
+		try:
+			cell.value, cell.error = self.evaluator.run(cell.compiled, env), None
+		except ValueError as e:
+			cell.value, cell.error = None, str(e)
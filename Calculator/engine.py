@@ -0,0 +1,707 @@
+"""
+Calculator engine: the safe expression evaluator without any GUI dependency.
+
+Import this module (not main.py) when only evaluation is needed; it pulls in
+nothing beyond a few lightweight standard-library modules.
+"""
+from __future__ import annotations
+
+import ast
+import itertools
+import math
+import operator
+import sys
+import time
+from array import array
+from collections import Counter, OrderedDict, namedtuple
+from functools import lru_cache
+from collections.abc import Iterable, Mapping, Sequence
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+def _normalize(expression: str) -> str:
+	"""Canonical cache key: drop insignificant whitespace, collapse the rest.
+
+	Whitespace only carries meaning between two word-like tokens (``1 2``),
+	so that is the only place a single space is kept.
+	"""
+	parts = expression.split()
+	if len(parts) < 2:
+		return parts[0] if parts else ""
+	out = [parts[0]]
+	for part in parts[1:]:
+		if _is_word_char(out[-1][-1]) and _is_word_char(part[0]):
+			out.append(" ")
+		out.append(part)
+	return "".join(out)
+
+
+def _is_word_char(ch: str) -> bool:
+	return ch.isalnum() or ch in "_."
+
+
+_COMPOUND_NODES = (ast.BinOp, ast.UnaryOp, ast.Call)
+
+def _default_max_bits() -> int:
+	"""The most bits an int can have and still be printed by str() (4300 digits by default)."""
+	digits = sys.get_int_max_str_digits() if hasattr(sys, "get_int_max_str_digits") else 0
+	# 0 means no limit (and before Python 3.11 there is none)
+	return int(digits * math.log2(10)) if digits else 1 << 17
+
+
+# default cap on the estimated size of integer results
+DEFAULT_MAX_BITS = _default_max_bits()
+
+
+class EvaluationLimitError(ValueError):
+	"""Raised when an expression exceeds the evaluator's cost budget or time limit."""
+
+
+class CompiledExpression:
+	"""Validated, optimized form of an expression.
+
+	Call it with a mapping of variable values. ``bindings`` lists the common
+	subexpressions hoisted into temporaries and ``body`` is the remaining
+	(constant-folded) tree; ``str()`` renders both as source text.
+	"""
+
+	__slots__ = ("source", "bindings", "body", "evaluate")
+
+	def __init__(self, source, bindings, body, steps, body_func):
+		self.source = source
+		self.bindings = bindings
+		self.body = body
+		if steps:
+			def evaluate(env):
+				scope = dict(env)
+				for name, step in steps:
+					scope[name] = step(scope)
+				return body_func(scope)
+			self.evaluate = evaluate
+		else:
+			self.evaluate = body_func
+
+	def __call__(self, env=None):
+		return self.evaluate({} if env is None else env)
+
+	def __str__(self):
+		lines = [f"{name} = {_unparse(node)}" for name, node in self.bindings]
+		lines.append(_unparse(self.body))
+		return "; ".join(lines)
+
+	def __repr__(self):
+		return f"<CompiledExpression {self.source!r} -> {self}>"
+
+
+class SafeEvaluator:
+	"""Evaluate math expressions safely using AST.
+
+	Supports +, -, *, /, %, **, unary +/-, parentheses, numbers,
+	and math functions/constants from the allowed list.
+
+	Expressions are validated once, optimized (constant folding and
+	common-subexpression elimination) and compiled into a tree of closures;
+	compiled forms are kept in a bounded LRU cache keyed by the normalized
+	expression text, so re-evaluating a formula skips parsing entirely.
+	"""
+
+	# allowed binary operators
+	_binops = {
+		ast.Add: operator.add,
+		ast.Sub: operator.sub,
+		ast.Mult: operator.mul,
+		ast.Div: operator.truediv,
+		ast.Mod: operator.mod,
+		ast.Pow: operator.pow,
+		ast.FloorDiv: operator.floordiv,
+	}
+
+	# allowed unary ops
+	_unaryops = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+	def __init__(
+		self,
+		cache_size: int = 256,
+		optimize: bool = True,
+		max_bits: int = DEFAULT_MAX_BITS,
+		time_limit: float | None = None,
+	):
+		"""`max_bits` bounds the estimated size of integer results of ``**``,
+		``*``, factorial(), comb(), perm(), lcm() and round(); anything larger is
+		rejected before it is computed. `time_limit` (seconds) is a wall-clock
+		limit per eval() call, checked before every operation.
+		"""
+		self.cache_size = cache_size
+		self.optimize = optimize
+		self.max_bits = max_bits
+		self.time_limit = time_limit
+		self._deadline: float | None = None
+		self._cache: OrderedDict[tuple, CompiledExpression] = OrderedDict()
+		self.cache_hits = 0
+		self.cache_misses = 0
+
+		# functions safe to evaluate at compile time and to share between call
+		# sites; everything whitelisted is side-effect free
+		self._pure = frozenset(k for k, v in _allowed_names().items() if callable(v))
+
+		# per-instance tables so the guards can see this instance's limits
+		self._binops = {**self._binops, ast.Pow: self._pow, ast.Mult: self._mul}
+		self._names = {
+			**_allowed_names(),
+			"factorial": self._factorial,
+			"comb": self._comb,
+			"perm": self._perm,
+			"round": self._round,
+		}
+		if "lcm" in self._names:
+			self._names["lcm"] = self._lcm
+		if time_limit is not None:
+			self._binops = {k: self._timed(f) for k, f in self._binops.items()}
+			self._unaryops = {k: self._timed(f) for k, f in self._unaryops.items()}
+			self._names = {k: self._timed(v) if callable(v) else v for k, v in self._names.items()}
+
+	def eval(self, expression: str, variables: Mapping[str, float] | None = None) -> float:
+		env = dict(variables) if variables else {}
+		self._start_clock()
+		try:
+			func = self.compile(expression, env)
+			try:
+				return func(env)
+			except EvaluationLimitError:
+				raise
+			except Exception as e:
+				raise ValueError(f"Invalid expression: {e}")
+		finally:
+			self._deadline = None
+
+	def run(self, compiled: CompiledExpression, variables: Mapping[str, float] | None = None) -> float:
+		"""Evaluate an expression compiled by this evaluator, under its time limit.
+
+		For callers that keep compiled forms around (cells, graph sampling)
+		and would otherwise call them directly, with no clock running.
+		"""
+		outer = self._deadline
+		if outer is None:
+			self._start_clock()
+		try:
+			return compiled({} if variables is None else variables)
+		except EvaluationLimitError:
+			raise
+		except Exception as e:
+			raise ValueError(f"Invalid expression: {e}")
+		finally:
+			self._deadline = outer
+
+	def eval_batch(self, expression: str, variables: Mapping[str, Sequence[float]], chunk_size: int = 65536):
+		"""Evaluate `expression` element-wise over equally sized input columns.
+
+		`variables` maps names to NumPy arrays, `array` buffers or any other
+		sequence of numbers. Inputs are evaluated as float64. With NumPy
+		exact arithmetic runs on whole columns and everything else applies the
+		scalar function per element, so results are bit-identical to eval();
+		an ndarray is returned. Without it the compiled scalar form is run
+		over the rows in chunks and an ``array('d')`` is returned.
+		"""
+		lengths = {len(col) for col in variables.values()}
+		if len(lengths) > 1:
+			raise ValueError("All variable columns must have the same length")
+		size = lengths.pop() if lengths else 1
+		np = _numpy()
+		if np is not None:
+			return self._eval_batch_numpy(np, expression, variables, size)
+		func = self.compile(expression, variables).evaluate
+		names = list(variables)
+		columns = [variables[n] for n in names]
+		out = array("d")
+		env = {}
+		self._start_clock()
+		try:
+			for start in range(0, size, chunk_size):
+				stop = min(start + chunk_size, size)
+				chunk = array("d", bytes(8 * (stop - start)))
+				rows = zip(*[col[start:stop] for col in columns]) if columns else [()] * (stop - start)
+				for i, row in enumerate(rows):
+					for name, value in zip(names, row):
+						env[name] = float(value)
+					chunk[i] = func(env)
+				out.extend(chunk)
+		except EvaluationLimitError:
+			raise
+		except Exception as e:
+			raise ValueError(f"Invalid expression: {e}")
+		finally:
+			self._deadline = None
+		return out
+
+	def _eval_batch_numpy(self, np, expression, variables, size):
+		func = self.compile(expression, variables, vectorized=True)
+		env = {name: np.asarray(col, dtype=np.float64) for name, col in variables.items()}
+		try:
+			# Python float arithmetic overflows to inf and yields nan silently;
+			# the errors it does raise come from the per-element functions
+			with np.errstate(all="ignore"):
+				result = func(env)
+				return np.broadcast_to(np.asarray(result, dtype=np.float64), (size,)).copy()
+		except Exception as e:
+			raise ValueError(f"Invalid expression: {e}")
+
+	def compile(self, expression: str, variables: Iterable[str] = (), vectorized: bool = False) -> CompiledExpression:
+		"""Return a validated, reusable callable for `expression`.
+
+		Names listed in `variables` are looked up in the mapping passed to the
+		callable; every other name must come from the allowed list. With
+		`vectorized` the callable operates on NumPy arrays.
+		"""
+		text = _normalize(expression)
+		variables = frozenset(variables)
+		key = (text, variables, vectorized)
+		func = self._cache.get(key)
+		if func is not None:
+			self.cache_hits += 1
+			self._cache.move_to_end(key)
+			return func
+		self.cache_misses += 1
+		names = _numpy_names() if vectorized else self._names
+		binops = _numpy_binops() if vectorized else self._binops
+		try:
+			body = ast.parse(text, mode="eval").body
+			bindings = []
+			if self.optimize:
+				body = _ConstantFolder(self, variables).visit(body)
+				body, bindings = self._eliminate_common(body, variables | names.keys())
+			scope = variables | {name for name, _ in bindings}
+			steps = [(name, self._compile(node, scope, names, binops)) for name, node in bindings]
+			func = CompiledExpression(text, bindings, body, steps, self._compile(body, scope, names, binops))
+		except Exception as e:
+			raise ValueError(f"Invalid expression: {e}")
+		if self.cache_size > 0:
+			self._cache[key] = func
+			if len(self._cache) > self.cache_size:
+				self._cache.popitem(last=False)
+		return func
+
+	def cache_info(self) -> CacheInfo:
+		return CacheInfo(self.cache_hits, self.cache_misses, self.cache_size, len(self._cache))
+
+	def cache_clear(self):
+		self._cache.clear()
+		self.cache_hits = 0
+		self.cache_misses = 0
+
+	# --- evaluation limits -------------------------------------------------
+
+	def _start_clock(self):
+		self._deadline = None if self.time_limit is None else time.monotonic() + self.time_limit
+
+	def _timed(self, func):
+		def timed(*args):
+			if self._deadline is not None and time.monotonic() > self._deadline:
+				raise EvaluationLimitError(f"Evaluation exceeded the {self.time_limit}s time limit")
+			return func(*args)
+		return timed
+
+	def _check_bits(self, bits, what):
+		if bits > self.max_bits:
+			raise EvaluationLimitError(
+				f"{what} would produce a ~{int(bits)}-bit result (limit is {self.max_bits} bits)"
+			)
+
+	def _pow(self, base, exp):
+		if _is_int(base) and _is_int(exp) and exp > 0 and abs(base) > 1:
+			# |base| >= 2, so the result has at least `exp` bits
+			self._check_bits(exp if exp > self.max_bits else exp * math.log2(abs(base)), "Power")
+		return base ** exp
+
+	def _mul(self, a, b):
+		if _is_int(a) and _is_int(b):
+			self._check_bits(abs(a).bit_length() + abs(b).bit_length(), "Product")
+		return a * b
+
+	def _factorial(self, n):
+		if _is_int(n) and n > 1:
+			self._check_bits(n if n > self.max_bits else _log2_falling(n, n), "factorial()")
+		return math.factorial(n)
+
+	def _perm(self, n, k=None):
+		if _is_int(n) and (k is None or _is_int(k)) and 0 <= (n if k is None else k) <= n:
+			self._check_bits(_log2_falling(n, n if k is None else k), "perm()")
+		return math.perm(n, k)
+
+	def _comb(self, n, k):
+		if _is_int(n) and _is_int(k) and 0 <= k <= n:
+			k = min(k, n - k)
+			self._check_bits(_log2_falling(n, k) - _log2_falling(k, k), "comb()")
+		return math.comb(n, k)
+
+	def _lcm(self, *integers):
+		if all(_is_int(n) for n in integers):
+			# at most the product of the operands
+			self._check_bits(sum(abs(n).bit_length() for n in integers), "lcm()")
+		return math.lcm(*integers)
+
+	def _round(self, number, ndigits=None):
+		if _is_int(number) and _is_int(ndigits) and ndigits < 0:
+			# rounding an int to -n digits computes 10**n internally
+			self._check_bits(-ndigits * math.log2(10), "round()")
+		if ndigits is None:
+			return round(number)
+		return round(number, ndigits)
+
+	def free_names(self, expression: str) -> set[str]:
+		"""Names `expression` uses that are not on the allowed list, i.e. the
+		variables it needs bound."""
+		try:
+			tree = ast.parse(_normalize(expression), mode="eval")
+		except SyntaxError as e:
+			raise ValueError(f"Invalid expression: {e}")
+		called = {id(n.func) for n in ast.walk(tree) if isinstance(n, ast.Call)}
+		return {
+			n.id for n in ast.walk(tree)
+			if isinstance(n, ast.Name) and id(n) not in called and n.id not in self._names
+		}
+
+	def is_reserved(self, name: str) -> bool:
+		"""True for function and constant names that cannot be used as variables."""
+		return name in self._names
+
+	def explain(self, expression: str, variables: Iterable[str] = ()) -> str:
+		"""Show the optimized form of `expression`, e.g. ``_t0 = sin(x); _t0 * _t0``."""
+		return str(self.compile(expression, variables))
+
+	def _eliminate_common(self, body, reserved):
+		"""Hoist pure subexpressions that occur more than once into temporaries.
+
+		Returns the rewritten body and an ordered list of ``(name, node)``
+		bindings; inner temporaries are always bound before outer ones.
+		"""
+		keys = {}
+		_structural_key(body, keys, {})
+		counts = Counter(keys.values())
+		if not counts or max(counts.values()) < 2:
+			return body, []
+		temps = {}
+		bindings = []
+
+		def visit(node):
+			if not isinstance(node, _COMPOUND_NODES):
+				return node
+			key = keys[id(node)]
+			if key in temps:
+				return ast.Name(id=temps[key], ctx=ast.Load())
+			for field, value in ast.iter_fields(node):
+				if isinstance(value, ast.AST):
+					setattr(node, field, visit(value))
+				elif isinstance(value, list):
+					setattr(node, field, [visit(v) for v in value])
+			if counts[key] < 2:
+				return node
+			name = f"_t{len(bindings)}"
+			while name in reserved:
+				name = "_" + name
+			temps[key] = name
+			bindings.append((name, node))
+			return ast.Name(id=name, ctx=ast.Load())
+
+		return visit(body), bindings
+
+	def _compile(self, node, variables, names, binops):
+		if isinstance(node, ast.BinOp):
+			op_type = type(node.op)
+			if op_type in binops:
+				op = binops[op_type]
+				left = self._compile(node.left, variables, names, binops)
+				right = self._compile(node.right, variables, names, binops)
+				return lambda env: op(left(env), right(env))
+			raise ValueError(f"Unsupported binary operator: {op_type}")
+		if isinstance(node, ast.UnaryOp):
+			op_type = type(node.op)
+			if op_type in self._unaryops:
+				op = self._unaryops[op_type]
+				operand = self._compile(node.operand, variables, names, binops)
+				return lambda env: op(operand(env))
+			raise ValueError(f"Unsupported unary operator: {op_type}")
+		if isinstance(node, ast.Constant):
+			if isinstance(node.value, (int, float)):
+				value = node.value
+				return lambda env: value
+			raise ValueError("Only numeric constants are allowed")
+		if isinstance(node, ast.Call):
+			# func(args...)
+			if isinstance(node.func, ast.Name) and not node.keywords:
+				func_name = node.func.id
+				if func_name in names and callable(names[func_name]):
+					func = names[func_name]
+					args = [self._compile(a, variables, names, binops) for a in node.args]
+					if len(args) == 1:
+						arg = args[0]
+						return lambda env: func(arg(env))
+					return lambda env: func(*[a(env) for a in args])
+			raise ValueError("Only simple function calls are allowed")
+		if isinstance(node, ast.Name):
+			name = node.id
+			if name in variables:
+				return lambda env: env[name]
+			if name in names:
+				val = names[name]
+				if isinstance(val, (int, float)):
+					return lambda env: val
+			raise ValueError(f"Unknown name: {name}")
+		if isinstance(node, ast.Expr):
+			return self._compile(node.value, variables, names, binops)
+		raise ValueError(f"Unsupported expression: {type(node)}")
+
+
+class _ConstantFolder(ast.NodeTransformer):
+	"""Replace whitelisted operations on constant operands by their value.
+
+	Anything the folder does not recognise is left untouched for
+	`SafeEvaluator._compile` to validate, and an operation that raises is
+	kept so the error surfaces at evaluation time as before.
+	"""
+
+	def __init__(self, evaluator, variables):
+		self.evaluator = evaluator
+		self.variables = variables
+
+	def visit(self, node):
+		# hand-rolled dispatch: the generic NodeTransformer machinery costs
+		# more than the folding itself for one-off expressions
+		if isinstance(node, ast.BinOp):
+			node.left = self.visit(node.left)
+			node.right = self.visit(node.right)
+			op = self.evaluator._binops.get(type(node.op))
+			if op and _is_number(node.left) and _is_number(node.right):
+				return self._fold(node, op, node.left.value, node.right.value)
+		elif isinstance(node, ast.UnaryOp):
+			node.operand = self.visit(node.operand)
+			op = self.evaluator._unaryops.get(type(node.op))
+			if op and _is_number(node.operand):
+				return self._fold(node, op, node.operand.value)
+		elif isinstance(node, ast.Call):
+			node.args = [self.visit(a) for a in node.args]
+			if (
+				isinstance(node.func, ast.Name)
+				and node.func.id in self.evaluator._pure
+				and not node.keywords
+				and all(_is_number(a) for a in node.args)
+			):
+				func = self.evaluator._names[node.func.id]
+				return self._fold(node, func, *[a.value for a in node.args])
+		elif isinstance(node, ast.Name) and node.id not in self.variables:
+			value = self.evaluator._names.get(node.id)
+			if isinstance(value, (int, float)):
+				return ast.Constant(value)
+		return node
+
+	@staticmethod
+	def _fold(node, func, *args):
+		try:
+			value = func(*args)
+		except Exception:
+			return node
+		if not isinstance(value, (int, float)):
+			return node
+		return ast.Constant(value)
+
+
+def _is_int(value) -> bool:
+	return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _log2_falling(n: int, k: int) -> float:
+	"""log2 of n * (n-1) * ... * (n-k+1), i.e. the bit size of n!/(n-k)!."""
+	if k <= 0:
+		return 0.0
+	if n > 1 << 1000:
+		# too large for lgamma; every factor has about n.bit_length() bits
+		return k * n.bit_length()
+	return (math.lgamma(n + 1) - math.lgamma(n - k + 1)) / math.log(2)
+
+
+def _structural_key(node, keys, interned):
+	"""Return a small integer identifying the structure of `node`.
+
+	Keys are hash-consed through `interned`, so a parent's key holds its
+	children's ids instead of nested tuples and hashing stays O(1) per node.
+	Compound nodes are also recorded in `keys` by id(node). Unlike ast.dump
+	this never renders constants as text, which fails for integers beyond
+	the interpreter's str() digit limit.
+	"""
+	if isinstance(node, ast.Constant):
+		value = node.value
+		key = (float, repr(value)) if isinstance(value, float) else (type(value), value)
+	elif isinstance(node, ast.Name):
+		key = ("name", node.id)
+	elif isinstance(node, ast.BinOp):
+		key = (type(node.op), _structural_key(node.left, keys, interned), _structural_key(node.right, keys, interned))
+	elif isinstance(node, ast.UnaryOp):
+		key = (type(node.op), _structural_key(node.operand, keys, interned))
+	elif isinstance(node, ast.Call) and not node.keywords:
+		key = (
+			"call",
+			_structural_key(node.func, keys, interned),
+			tuple(_structural_key(a, keys, interned) for a in node.args),
+		)
+	else:
+		# never shared; left for _compile to validate
+		key = ("node", id(node))
+	ident = interned.setdefault(key, len(interned))
+	if isinstance(node, _COMPOUND_NODES):
+		keys[id(node)] = ident
+	return ident
+
+
+def _is_number(node) -> bool:
+	return isinstance(node, ast.Constant) and isinstance(node.value, (int, float))
+
+
+def _unparse(node) -> str:
+	if hasattr(ast, "unparse"):
+		try:
+			return ast.unparse(node)
+		except ValueError:
+			# a folded int past str()'s digit limit; hex has no limit
+			import copy
+			return ast.unparse(_HexInts().visit(copy.deepcopy(node)))
+	return ast.dump(node)
+
+
+class _HexInts(ast.NodeTransformer):
+	"""Spell int constants that repr() refuses as hex literals."""
+
+	def visit_Constant(self, node):
+		if not _is_int(node.value):
+			return node
+		try:
+			repr(node.value)
+		except ValueError:
+			text = hex(node.value)
+			return ast.Name(id=f"({text})" if node.value < 0 else text, ctx=ast.Load())
+		return node
+
+
+@lru_cache(maxsize=None)
+def _allowed_names():
+	"""Allowed names -> functions/constants, built on first use rather than at import."""
+	names = {k: getattr(math, k) for k in dir(math) if not k.startswith("__")}
+	# add some builtins
+	names.update({
+		"abs": abs,
+		"round": round,
+		"min": min,
+		"max": max,
+		"pi": math.pi,
+		"e": math.e,
+	})
+	return names
+
+
+# math/builtin names whose NumPy ufunc is bit-identical to the scalar function,
+# errors included. NumPy's transcendental functions (exp, sin, power, ...) use
+# their own approximations and may differ from libm in the last bit, and
+# floor/fmod return nan or inf where math raises; sqrt is exact but needs
+# math's domain check (see _numpy_names).
+_NUMPY_UFUNCS = {
+	"fabs": "fabs", "abs": "absolute", "copysign": "copysign",
+	# a single multiplication by the same constant as CPython's
+	"degrees": "degrees", "radians": "radians",
+}
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+	try:
+		import numpy
+	except ImportError:
+		return None
+	return numpy
+
+
+@lru_cache(maxsize=None)
+def _numpy_names():
+	"""Element-wise counterparts of the allowed names for array operands."""
+	np = _numpy()
+	table = {}
+	for name, value in _allowed_names().items():
+		if not callable(value):
+			table[name] = value
+		elif name in _NUMPY_UFUNCS:
+			table[name] = getattr(np, _NUMPY_UFUNCS[name])
+		else:
+			table[name] = _elementwise(value)
+
+	def sqrt(x):
+		# correctly rounded in both; only the negative arguments math rejects need care
+		if not isinstance(x, np.ndarray):
+			return math.sqrt(x)
+		if np.any(np.less(x, 0)):
+			raise ValueError("math domain error")
+		return np.sqrt(x)
+
+	table["sqrt"] = sqrt
+	return table
+
+
+@lru_cache(maxsize=None)
+def _numpy_binops():
+	"""Operators for array operands that give the same results as on Python floats."""
+	np = _numpy()
+
+	def true_divide(a, b):
+		# IEEE division is exact either way; only x/0 needs Python's error
+		if np.any(np.equal(b, 0)):
+			raise ZeroDivisionError("float division by zero")
+		return np.true_divide(a, b)
+
+	def on_floats(ufunc, scalar, message):
+		# NumPy's float remainder and floor_divide follow CPython's
+		# float_divmod step for step; int operands past 2**53 would be
+		# rounded differently on the way in, so those stay on `scalar`
+		def apply(a, b):
+			if not all(
+				isinstance(v, (np.ndarray, float)) or (isinstance(v, int) and abs(v) <= 1 << 53) for v in (a, b)
+			):
+				return scalar(a, b)
+			if np.any(np.equal(b, 0)):
+				raise ZeroDivisionError(message)
+			return ufunc(a, b)
+		return apply
+
+	return {
+		ast.Add: operator.add,
+		ast.Sub: operator.sub,
+		ast.Mult: operator.mul,
+		ast.Div: true_divide,
+		ast.Mod: on_floats(np.remainder, _elementwise(operator.mod), "float modulo"),
+		ast.FloorDiv: on_floats(np.floor_divide, _elementwise(operator.floordiv), "float floor division by zero"),
+		# np.power (and x*x for x**2) differ from libm's pow in the last bit
+		ast.Pow: _elementwise(operator.pow),
+	}
+
+
+def _elementwise(func):
+	"""Apply scalar `func` to each element, as Python floats, and collect a float64 array."""
+	np = _numpy()
+
+	def apply(*args):
+		sizes = [len(a) for a in args if isinstance(a, np.ndarray)]
+		if not sizes:
+			return func(*args)
+		# map over lists is cheaper per element than frompyfunc's object arrays
+		columns = [a.tolist() if isinstance(a, np.ndarray) else itertools.repeat(a) for a in args]
+		return np.fromiter(map(func, *columns), np.float64, sizes[0])
+
+	return apply
+
+
+def format_result(value) -> str:
+	# format nicely
+	if isinstance(value, float) and value.is_integer():
+		value = int(value)
+	try:
+		return str(value)
+	except ValueError:
+		# an int past the interpreter's str() digit limit (raised with --max-bits)
+		from decimal import Decimal
+		return format(Decimal(value), ".15e")
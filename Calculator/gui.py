@@ -0,0 +1,409 @@
+"""
+Tkinter front end for the calculator. Imported lazily by main.py so the
+engine and the headless batch mode never load Tk.
+"""
+from __future__ import annotations
+
+import re
+import tkinter as tk
+from tkinter import ttk
+from tkinter import messagebox
+
+from cells import Worksheet
+from engine import SafeEvaluator, format_result
+from history import HistoryStore
+from sampling import SamplerCache
+
+
+# "rate = 0.07" or "total = price*(1+rate)"
+_CELL_DEFINITION = re.compile(r"^([A-Za-z_]\w*)\s*=(?!=)\s*(.+)$")
+
+
+class CalculatorApp(tk.Tk):
+	# rows kept in the history Listbox; older entries stay in the store
+	HISTORY_ROWS = 100
+
+	def __init__(self):
+		super().__init__()
+		self.title("Advanced Calculator")
+		self.geometry("420x640")
+		self.resizable(False, False)
+
+		self.style = ttk.Style(self)
+		# default theme
+		self._theme = "light"
+		self._apply_theme()
+
+		self.evaluator = SafeEvaluator(time_limit=2.0)
+		self.memory = 0.0
+		self.history_store = HistoryStore()
+		last = self.history_store.last()
+		self.last_result: str | None = last[2] if last else None
+		self._search_job = None
+		# sampled points survive closing and reopening the graph of a formula
+		self.samplers = SamplerCache(self.evaluator)
+		self.worksheet = Worksheet(self.evaluator)
+
+		self._create_widgets()
+		self._bind_keys()
+		self._refresh_history()
+		self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+	def _apply_theme(self):
+		if self._theme == "dark":
+			bg = "#2e2e2e"
+			fg = "#ffffff"
+			btn_bg = "#3c3f41"
+			entry_bg = "#1e1e1e"
+		else:
+			bg = "#f3f4f6"
+			fg = "#111827"
+			btn_bg = "#ffffff"
+			entry_bg = "#ffffff"
+		self.configure(bg=bg)
+		self.style.configure("TFrame", background=bg)
+		self.style.configure("TLabel", background=bg, foreground=fg)
+		self.style.configure("TButton", background=btn_bg, foreground=fg)
+
+	def _create_widgets(self):
+		main = ttk.Frame(self)
+		main.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+		# display
+		self.display_var = tk.StringVar()
+		entry = ttk.Entry(main, textvariable=self.display_var, font=("Segoe UI", 20), justify=tk.RIGHT)
+		entry.pack(fill=tk.X, pady=(0, 10))
+		entry.focus()
+
+		# buttons frame
+		btn_frame = ttk.Frame(main)
+		btn_frame.pack()
+
+		buttons = [
+			["MC", "MR", "M+", "M-"],
+			["7", "8", "9", "/"],
+			["4", "5", "6", "*"],
+			["1", "2", "3", "-"],
+			["0", ".", "%", "+"],
+			["(", ")", "^", "sqrt"],
+			["sin", "cos", "tan", "log"],
+			["C", "⌫", "Ans", "="],
+		]
+
+		for r, row in enumerate(buttons):
+			for c, label in enumerate(row):
+				b = ttk.Button(btn_frame, text=label, command=lambda l=label: self._on_button(l))
+				b.grid(row=r, column=c, ipadx=10, ipady=12, padx=4, pady=4, sticky="nsew")
+		for i in range(4):
+			btn_frame.grid_columnconfigure(i, weight=1)
+
+		# history
+		hist_bar = ttk.Frame(main)
+		hist_bar.pack(fill=tk.X, pady=(10, 0))
+		hist_label = ttk.Label(hist_bar, text="History")
+		hist_label.pack(side=tk.LEFT)
+		self.search_var = tk.StringVar()
+		search = ttk.Entry(hist_bar, textvariable=self.search_var, width=20)
+		search.pack(side=tk.RIGHT)
+		ttk.Label(hist_bar, text="Search:").pack(side=tk.RIGHT, padx=(0, 4))
+		# keep typing in the search box away from the window-wide calculator keys
+		search.bindtags((str(search), "TEntry", "HistorySearch", ".", "all"))
+		self.bind_class("HistorySearch", "<Key>", lambda e: "break")
+		self.search_var.trace_add("write", lambda *_: self._schedule_search())
+		self.history_list = tk.Listbox(main, height=6)
+		self.history_list.pack(fill=tk.X)
+		self.history_list.bind("<<ListboxSelect>>", self._on_history_select)
+
+		# bottom controls
+		bottom = ttk.Frame(main)
+		bottom.pack(fill=tk.X, pady=(10, 0))
+
+		theme_btn = ttk.Button(bottom, text="Toggle Theme", command=self._toggle_theme)
+		theme_btn.pack(side=tk.LEFT)
+
+		copy_btn = ttk.Button(bottom, text="Copy", command=self._copy)
+		copy_btn.pack(side=tk.RIGHT)
+
+		graph_btn = ttk.Button(bottom, text="Graph f(x)", command=self._open_graph)
+		graph_btn.pack(side=tk.RIGHT, padx=(0, 6))
+
+	def _on_button(self, label: str):
+		if label == "C":
+			self.display_var.set("")
+			return
+		if label == "⌫":
+			self.display_var.set(self.display_var.get()[:-1])
+			return
+		if label == "=":
+			self._calculate()
+			return
+		if label == "Ans":
+			if self.last_result is not None:
+				self.display_var.set(self.display_var.get() + self.last_result)
+			return
+		if label in ("M+", "M-", "MR", "MC"):
+			self._memory_op(label)
+			return
+		# map ^ -> ** and sqrt -> sqrt(...)
+		if label == "^":
+			self.display_var.set(self.display_var.get() + "**")
+			return
+		if label == "sqrt":
+			self.display_var.set(self.display_var.get() + "sqrt(")
+			return
+		if label in ("sin", "cos", "tan", "log"):
+			self.display_var.set(self.display_var.get() + f"{label}(")
+			return
+		# default: append label
+		self.display_var.set(self.display_var.get() + label)
+
+	def _calculate(self):
+		expr = self.display_var.get().strip()
+		if not expr:
+			return
+		try:
+			cell = _CELL_DEFINITION.match(expr)
+			if cell:
+				# "name = formula" defines a cell; dependents update incrementally
+				name, formula = cell.groups()
+				self.worksheet.set(name, formula)
+				result = format_result(self.worksheet.get(name))
+			else:
+				result = format_result(self.evaluator.eval(expr, self.worksheet.values()))
+		except Exception as e:
+			messagebox.showerror("Error", str(e))
+			return
+		self.history_store.add(expr, result)
+		self.last_result = result
+		self._append_history(expr, result)
+		self.display_var.set(result)
+
+	def _append_history(self, expr: str, result: str):
+		"""Add one row at the top instead of rebuilding the list."""
+		item = f"{expr} = {result}"
+		query, prefix = self._history_query()
+		if prefix and not expr.startswith(query):
+			return
+		if query and not prefix and query.lower() not in item.lower():
+			return
+		self.history_list.insert(0, item)
+		if self.history_list.size() > self.HISTORY_ROWS:
+			self.history_list.delete(self.HISTORY_ROWS, tk.END)
+
+	def _refresh_history(self):
+		"""Reload the list from the store (startup and search changes only)."""
+		self._search_job = None
+		query, prefix = self._history_query()
+		rows = self.history_store.search(query, limit=self.HISTORY_ROWS, prefix=prefix)
+		self.history_list.delete(0, tk.END)
+		self.history_list.insert(tk.END, *[f"{expr} = {result}" for _, expr, result in rows])
+
+	def _history_query(self) -> tuple[str, bool]:
+		"""The search text and whether it is a prefix search (typed with a leading ``^``)."""
+		query = self.search_var.get().strip()
+		if query.startswith("^"):
+			return query[1:], True
+		return query, False
+
+	def _schedule_search(self):
+		# debounce: search once typing pauses
+		if self._search_job is not None:
+			self.after_cancel(self._search_job)
+		self._search_job = self.after(200, self._refresh_history)
+
+	def _on_close(self):
+		self.history_store.close()
+		self.destroy()
+
+	def _on_history_select(self, _ev):
+		sel = self.history_list.curselection()
+		if not sel:
+			return
+		item = self.history_list.get(sel[0])
+		# the expression is everything before the last " = " (cell definitions contain one too)
+		expr = item.rsplit(" = ", 1)[0]
+		self.display_var.set(expr)
+
+	def _memory_op(self, op: str):
+		try:
+			if op == "MC":
+				self.memory = 0.0
+			elif op == "MR":
+				self.display_var.set(self.display_var.get() + str(self.memory))
+			elif op == "M+":
+				val = float(self.display_var.get() or 0)
+				self.memory += val
+			elif op == "M-":
+				val = float(self.display_var.get() or 0)
+				self.memory -= val
+		except Exception:
+			messagebox.showerror("Error", "Memory operation failed")
+
+	def _toggle_theme(self):
+		self._theme = "dark" if self._theme == "light" else "light"
+		self._apply_theme()
+
+	def _open_graph(self):
+		expr = self.display_var.get().strip()
+		if not expr:
+			messagebox.showinfo("Graph", "Type an expression in x, e.g. sin(x)/x")
+			return
+		try:
+			sampler = self.samplers.get(expr)
+		except ValueError as e:
+			messagebox.showerror("Error", str(e))
+			return
+		GraphWindow(self, sampler)
+
+	def _copy(self):
+		self.clipboard_clear()
+		self.clipboard_append(self.display_var.get())
+
+	def _bind_keys(self):
+		self.bind("<Return>", lambda e: self._calculate())
+		self.bind("<BackSpace>", lambda e: self.display_var.set(self.display_var.get()[:-1]))
+		self.bind("<Escape>", lambda e: self.display_var.set(""))
+		for ch in "0123456789.+-*/()%":
+			self.bind(ch, lambda e, c=ch: self.display_var.set(self.display_var.get() + c))
+		# caret ^ mapping
+		self.bind("^", lambda e: self.display_var.set(self.display_var.get() + "**"))
+
+
+class GraphWindow(tk.Toplevel):
+	"""Plot or tabulate f(x) over a range, with pan and zoom.
+
+	Sampling is adaptive and cached by the sampler, so panning and zooming
+	only evaluates the points that were not seen before.
+	"""
+
+	WIDTH = 480
+	HEIGHT = 320
+
+	def __init__(self, master, sampler, lo: float = -10.0, hi: float = 10.0):
+		super().__init__(master)
+		self.title(f"f(x) = {sampler.expression}")
+		self.sampler = sampler
+		self.lo_var = tk.StringVar(value=str(lo))
+		self.hi_var = tk.StringVar(value=str(hi))
+		self.status_var = tk.StringVar()
+
+		controls = ttk.Frame(self)
+		controls.pack(fill=tk.X, padx=6, pady=6)
+		ttk.Label(controls, text="x from").pack(side=tk.LEFT)
+		ttk.Entry(controls, textvariable=self.lo_var, width=8).pack(side=tk.LEFT, padx=2)
+		ttk.Label(controls, text="to").pack(side=tk.LEFT)
+		ttk.Entry(controls, textvariable=self.hi_var, width=8).pack(side=tk.LEFT, padx=2)
+		ttk.Button(controls, text="Plot", command=self._plot).pack(side=tk.LEFT, padx=2)
+		ttk.Button(controls, text="Table", command=self._tabulate).pack(side=tk.LEFT, padx=2)
+		nav = [
+			("−", lambda: self._zoom(2.0)),
+			("+", lambda: self._zoom(0.5)),
+			("▶", lambda: self._pan(0.25)),
+			("◀", lambda: self._pan(-0.25)),
+		]
+		for text, command in nav:
+			ttk.Button(controls, text=text, width=3, command=command).pack(side=tk.RIGHT)
+
+		self.canvas = tk.Canvas(self, width=self.WIDTH, height=self.HEIGHT, bg="white")
+		self.canvas.pack(padx=6)
+		self.table = tk.Listbox(self, height=8, font=("Consolas", 10))
+		self.table.pack(fill=tk.X, padx=6)
+		ttk.Label(self, textvariable=self.status_var, anchor=tk.W).pack(fill=tk.X, padx=6, pady=(0, 6))
+		self.bind("<Return>", lambda e: self._plot())
+		self._plot()
+
+	def _range(self):
+		try:
+			lo, hi = float(self.lo_var.get()), float(self.hi_var.get())
+		except ValueError:
+			raise ValueError("Range bounds must be numbers")
+		if not hi > lo:
+			raise ValueError("Range must have 'to' greater than 'from'")
+		return lo, hi
+
+	def _set_range(self, lo, hi):
+		self.lo_var.set(f"{lo:g}")
+		self.hi_var.set(f"{hi:g}")
+		self._plot()
+
+	def _pan(self, fraction):
+		lo, hi = self._range()
+		shift = (hi - lo) * fraction
+		self._set_range(lo + shift, hi + shift)
+
+	def _zoom(self, factor):
+		lo, hi = self._range()
+		mid, half = (lo + hi) / 2, (hi - lo) / 2 * factor
+		self._set_range(mid - half, mid + half)
+
+	def _plot(self):
+		try:
+			lo, hi = self._range()
+		except ValueError as e:
+			messagebox.showerror("Graph", str(e), parent=self)
+			return
+		before = self.sampler.evaluations
+		try:
+			points = self.sampler.sample(lo, hi)
+		except ValueError as e:
+			messagebox.showerror("Graph", str(e), parent=self)
+			return
+		points = [(x, y) for x, y in points if lo <= x <= hi]
+		self._draw(points, lo, hi)
+		status = f"{len(points)} points, {self.sampler.evaluations - before} newly evaluated"
+		if self.sampler.truncated:
+			status += "; time limit reached, curve is partial"
+		self.status_var.set(status)
+
+	def _draw(self, points, lo, hi):
+		c = self.canvas
+		c.delete("all")
+		ys = sorted(y for _, y in points if y is not None)
+		if not ys:
+			c.create_text(self.WIDTH / 2, self.HEIGHT / 2, text="undefined on this range")
+			return
+		# ignore the extreme tails (asymptotes) when choosing the vertical scale
+		y_lo, y_hi = ys[len(ys) // 50], ys[-1 - len(ys) // 50]
+		if y_hi == y_lo:
+			y_lo, y_hi = y_lo - 1, y_hi + 1
+		margin = (y_hi - y_lo) * 0.1
+		y_lo, y_hi = y_lo - margin, y_hi + margin
+
+		def px(x):
+			return (x - lo) / (hi - lo) * self.WIDTH
+
+		def py(y):
+			return self.HEIGHT - (y - y_lo) / (y_hi - y_lo) * self.HEIGHT
+
+		if lo <= 0 <= hi:
+			c.create_line(px(0), 0, px(0), self.HEIGHT, fill="#9ca3af")
+		if y_lo <= 0 <= y_hi:
+			c.create_line(0, py(0), self.WIDTH, py(0), fill="#9ca3af")
+		c.create_text(4, 4, anchor=tk.NW, text=f"{y_hi:.4g}", fill="#6b7280")
+		c.create_text(4, self.HEIGHT - 4, anchor=tk.SW, text=f"{y_lo:.4g}", fill="#6b7280")
+
+		# one polyline per defined run; clamp far-off values to just outside the canvas
+		segment = []
+		for x, y in points + [(hi, None)]:
+			if y is None:
+				if len(segment) >= 4:
+					c.create_line(*segment, fill="#2563eb", width=2)
+				segment = []
+				continue
+			segment += [px(x), min(max(py(y), -self.HEIGHT), 2 * self.HEIGHT)]
+
+	def _tabulate(self):
+		try:
+			lo, hi = self._range()
+		except ValueError as e:
+			messagebox.showerror("Graph", str(e), parent=self)
+			return
+		self.table.delete(0, tk.END)
+		try:
+			rows = self.sampler.table(lo, hi, (hi - lo) / 20)
+		except ValueError as e:
+			messagebox.showerror("Graph", str(e), parent=self)
+			return
+		self.table.insert(tk.END, *[f"{x:>12.6g}  {'undefined' if y is None else format(y, '.10g')}" for x, y in rows])
+		if self.sampler.truncated:
+			self.table.insert(tk.END, "(time limit reached)")
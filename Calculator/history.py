@@ -0,0 +1,117 @@
+"""
+Persistent calculation history backed by SQLite.
+
+Entries are appended to a single table and never rewritten. Prefix search
+uses the index on ``expr``; substring search uses an FTS5 trigram index
+when the SQLite build has one and falls back to a LIKE scan otherwise.
+Callers only ever hold the rows they asked for, so memory use does not
+depend on how long the history gets.
+"""
+from __future__ import annotations
+
+import datetime
+import os
+import sqlite3
+
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.db")
+
+
+class HistoryStore:
+	"""Append-only log of ``expr = result`` entries with prefix/substring search."""
+
+	def __init__(self, path: str = HISTORY_PATH):
+		self.path = path
+		self.conn = sqlite3.connect(path)
+		self._init_db()
+
+	def _init_db(self):
+		cur = self.conn.cursor()
+		cur.execute(
+			"""
+			CREATE TABLE IF NOT EXISTS history (
+				id INTEGER PRIMARY KEY,
+				expr TEXT NOT NULL,
+				result TEXT NOT NULL,
+				created TEXT NOT NULL
+			)
+			"""
+		)
+		cur.execute("CREATE INDEX IF NOT EXISTS history_expr ON history(expr)")
+		existed = cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'history_fts'").fetchone()
+		try:
+			cur.execute(
+				"""
+				CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+					expr, result, content='history', content_rowid='id', tokenize='trigram'
+				)
+				"""
+			)
+			cur.execute(
+				"""
+				CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+					INSERT INTO history_fts(rowid, expr, result) VALUES (new.id, new.expr, new.result);
+				END
+				"""
+			)
+			if not existed:
+				# index the rows saved before the table existed (a history.db
+				# from an older version); the trigger only sees new ones
+				cur.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+			self.has_fts = True
+		except sqlite3.OperationalError:
+			# SQLite without FTS5 or the trigram tokenizer (< 3.34)
+			self.has_fts = False
+		self.conn.commit()
+
+	def add(self, expr: str, result: str) -> int:
+		cur = self.conn.execute(
+			"INSERT INTO history (expr, result, created) VALUES (?, ?, ?)",
+			(expr, result, datetime.datetime.now().isoformat(sep=" ", timespec="seconds")),
+		)
+		self.conn.commit()
+		return cur.lastrowid
+
+	def recent(self, limit: int = 100) -> list[tuple[int, str, str]]:
+		"""Newest entries first as ``(id, expr, result)``."""
+		return self.conn.execute(
+			"SELECT id, expr, result FROM history ORDER BY id DESC LIMIT ?", (limit,)
+		).fetchall()
+
+	def last(self) -> tuple[int, str, str] | None:
+		rows = self.recent(1)
+		return rows[0] if rows else None
+
+	def search(self, query: str, limit: int = 100, prefix: bool = False) -> list[tuple[int, str, str]]:
+		"""Entries whose expression starts with (`prefix`) or contains `query`, newest first."""
+		if not query:
+			return self.recent(limit)
+		if prefix:
+			# index range scan on history_expr
+			return self.conn.execute(
+				"""
+				SELECT id, expr, result FROM history
+				WHERE expr >= ? AND expr < ? ORDER BY id DESC LIMIT ?
+				""",
+				(query, query + "\U0010ffff", limit),
+			).fetchall()
+		if self.has_fts and len(query) >= 3:
+			# trigram tokens need at least three characters
+			phrase = '"' + query.replace('"', '""') + '"'
+			return self.conn.execute(
+				"""
+				SELECT h.id, h.expr, h.result FROM history_fts f JOIN history h ON h.id = f.rowid
+				WHERE history_fts MATCH ? ORDER BY h.id DESC LIMIT ?
+				""",
+				(phrase, limit),
+			).fetchall()
+		like = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+		return self.conn.execute(
+			"""
+			SELECT id, expr, result FROM history
+			WHERE expr LIKE ? ESCAPE '\\' OR result LIKE ? ESCAPE '\\' ORDER BY id DESC LIMIT ?
+			""",
+			(like, like, limit),
+		).fetchall()
+
+	def close(self):
+		self.conn.close()
@@ -0,0 +1,82 @@
+"""
+Import-time report for the calculator modules.
+
+Runs a fresh interpreter with ``-X importtime``, prints the slowest imports
+pulled in by the target module and fails when the cumulative import time
+exceeds the budget or when a forbidden module (Tk by default) gets loaded.
+
+Run: python importtime.py [--module engine] [--budget-ms 30] [--repeat 5]
+
+Bytecode caching matters: with PYTHONDONTWRITEBYTECODE set every run pays
+for compiling the sources, so the numbers come out several ms higher.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(module: str) -> list[tuple[str, int, int, int]]:
+	"""Return ``(name, self_us, cumulative_us, depth)`` for every import in a
+	fresh interpreter that runs ``import module``, in -X importtime order."""
+	proc = subprocess.run(
+		[sys.executable, "-X", "importtime", "-c", f"import {module}"],
+		cwd=os.path.dirname(os.path.abspath(__file__)),
+		capture_output=True,
+		text=True,
+		check=True,
+	)
+	rows = []
+	for line in proc.stderr.splitlines():
+		m = _LINE.match(line)
+		if m:
+			rows.append((m.group(4), int(m.group(1)), int(m.group(2)), (len(m.group(3)) - 1) // 2))
+	return rows
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Measure and budget the import time of a calculator module")
+	parser.add_argument("--module", default="engine", help="module to import (default: engine)")
+	parser.add_argument("--budget-ms", type=float, default=30.0, help="fail if cumulative import time exceeds this")
+	parser.add_argument("--repeat", type=int, default=5, help="runs to take the best of (filters out cold caches)")
+	parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+	parser.add_argument("--forbid", action="append", default=["tkinter", "_tkinter"], help="module that must not be imported")
+	args = parser.parse_args(argv)
+
+	best = None
+	for _ in range(max(1, args.repeat)):
+		rows = measure(args.module)
+		# -X importtime prints children before their parent, so the target's
+		# subtree is the run of nested rows right above its own line
+		end = next(i for i, row in enumerate(rows) if row[0] == args.module and row[3] == 0)
+		start = end
+		while start > 0 and rows[start - 1][3] > 0:
+			start -= 1
+		total = rows[end][2]
+		if best is None or total < best[0]:
+			best = (total, rows[start:end + 1])
+	total, rows = best
+
+	print(f"{args.module}: {total / 1000:.2f} ms cumulative (budget {args.budget_ms:.2f} ms)")
+	for name, self_us, cum_us, _ in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]:
+		print(f"  {self_us / 1000:8.2f} ms self {cum_us / 1000:8.2f} ms cumulative  {name}")
+
+	failed = False
+	loaded = {name for name, *_ in rows}
+	for name in args.forbid:
+		if name in loaded:
+			print(f"FAIL: {args.module} imports {name}")
+			failed = True
+	if total / 1000 > args.budget_ms:
+		print(f"FAIL: import time over budget by {total / 1000 - args.budget_ms:.2f} ms")
+		failed = True
+	return 1 if failed else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
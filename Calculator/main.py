@@ -5,280 +5,162 @@ File: main.py
 Features:
 - Modern Tkinter UI with light/dark theme toggle
 - Safe expression evaluator using ast parsing and math functions
-- History panel, memory buttons (M+, M-, MR, MC)
+- Compiled expression cache (LRU) so repeated formulas skip parsing
+- Batch evaluation over variable columns (NumPy when available)
+- Optimizer: constant folding and common-subexpression elimination
+- Headless batch mode streaming expressions through a process pool
+- Cost budget for huge integer results and a per-evaluation time limit
+- Graph/tabulate f(x) with adaptive, cached sampling
+- Spreadsheet-style named cells with incremental recomputation
+- Persistent, searchable history panel; memory buttons (M+, M-, MR, MC)
 - Keyboard bindings, copy/paste, backspace, clear
 
+Layout:
+- engine.py: SafeEvaluator and helpers, no GUI dependencies
+- gui.py: the Tkinter CalculatorApp, imported only when the window is shown
+- history.py: SQLite-backed calculation history
+- sampling.py: adaptive f(x) sampling for the graph window
+- cells.py: named cells and their dependency graph
+- main.py: command-line entry point and headless batch mode
+
 Run: python main.py
+Headless: python main.py --batch [FILE] [-j N] [--unordered]
 """
 from __future__ import annotations
 
-import ast
-import math
-import operator
-import tkinter as tk
-from tkinter import ttk
-from tkinter import messagebox
+import argparse
+import os
+import sys
+from collections import deque
 
+from engine import DEFAULT_MAX_BITS, SafeEvaluator, format_result
 
-class SafeEvaluator:
-	"""Evaluate math expressions safely using AST.
 
-	Supports +, -, *, /, %, **, unary +/-, parentheses, numbers,
-	and math functions/constants from the allowed list.
-	"""
+# per-process evaluator used by the batch workers
+_worker_evaluator: SafeEvaluator | None = None
 
-	# allowed binary operators
-	_binops = {
-		ast.Add: operator.add,
-		ast.Sub: operator.sub,
-		ast.Mult: operator.mul,
-		ast.Div: operator.truediv,
-		ast.Mod: operator.mod,
-		ast.Pow: operator.pow,
-		ast.FloorDiv: operator.floordiv,
-	}
 
-	# allowed unary ops
-	_unaryops = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+def _batch_init(max_bits=DEFAULT_MAX_BITS, time_limit=None):
+	global _worker_evaluator
+	_worker_evaluator = SafeEvaluator(max_bits=max_bits, time_limit=time_limit)
 
-	# allowed names -> functions/constants
-	_names = {k: getattr(math, k) for k in dir(math) if not k.startswith("__")}
-	# add some builtins
-	_names.update({
-		"abs": abs,
-		"round": round,
-		"min": min,
-		"max": max,
-		"pi": math.pi,
-		"e": math.e,
-	})
 
-	def eval(self, expression: str) -> float:
+def _batch_eval(chunk):
+	"""Evaluate ``(lineno, text)`` pairs; errors are reported, not raised."""
+	results = []
+	for lineno, text in chunk:
+		if not text.strip():
+			results.append((lineno, True, ""))
+			continue
 		try:
-			node = ast.parse(expression, mode="eval")
-			return self._eval(node.body)
+			results.append((lineno, True, format_result(_worker_evaluator.eval(text))))
 		except Exception as e:
-			raise ValueError(f"Invalid expression: {e}")
-
-	def _eval(self, node):
-		if isinstance(node, ast.BinOp):
-			op_type = type(node.op)
-			if op_type in self._binops:
-				left = self._eval(node.left)
-				right = self._eval(node.right)
-				return self._binops[op_type](left, right)
-			raise ValueError(f"Unsupported binary operator: {op_type}")
-		if isinstance(node, ast.UnaryOp):
-			op_type = type(node.op)
-			if op_type in self._unaryops:
-				return self._unaryops[op_type](self._eval(node.operand))
-			raise ValueError(f"Unsupported unary operator: {op_type}")
-		if isinstance(node, ast.Num):
-			return node.n
-		if isinstance(node, ast.Constant):
-			if isinstance(node.value, (int, float)):
-				return node.value
-			raise ValueError("Only numeric constants are allowed")
-		if isinstance(node, ast.Call):
-			# func(args...)
-			if isinstance(node.func, ast.Name):
-				func_name = node.func.id
-				if func_name in self._names and callable(self._names[func_name]):
-					args = [self._eval(a) for a in node.args]
-					return self._names[func_name](*args)
-			raise ValueError("Only simple function calls are allowed")
-		if isinstance(node, ast.Name):
-			if node.id in self._names:
-				val = self._names[node.id]
-				if isinstance(val, (int, float)):
-					return val
-			raise ValueError(f"Unknown name: {node.id}")
-		if isinstance(node, ast.Expr):
-			return self._eval(node.value)
-		raise ValueError(f"Unsupported expression: {type(node)}")
-
-
-class CalculatorApp(tk.Tk):
-	def __init__(self):
-		super().__init__()
-		self.title("Advanced Calculator")
-		self.geometry("420x600")
-		self.resizable(False, False)
-
-		self.style = ttk.Style(self)
-		# default theme
-		self._theme = "light"
-		self._apply_theme()
-
-		self.evaluator = SafeEvaluator()
-		self.memory = 0.0
-		self.history: list[str] = []
-
-		self._create_widgets()
-		self._bind_keys()
-
-	def _apply_theme(self):
-		if self._theme == "dark":
-			bg = "#2e2e2e"
-			fg = "#ffffff"
-			btn_bg = "#3c3f41"
-			entry_bg = "#1e1e1e"
+			results.append((lineno, False, f"error: {e}"))
+	return results
+
+
+def _read_chunks(lines, size):
+	chunk = []
+	for lineno, line in enumerate(lines, 1):
+		chunk.append((lineno, line.rstrip("\r\n")))
+		if len(chunk) >= size:
+			yield chunk
+			chunk = []
+	if chunk:
+		yield chunk
+
+
+def run_batch(
+	lines,
+	out,
+	jobs: int | None = None,
+	ordered: bool = True,
+	chunk_size: int = 512,
+	max_bits: int = DEFAULT_MAX_BITS,
+	time_limit: float | None = None,
+) -> int:
+	"""Evaluate one expression per line of `lines` and write results to `out`.
+
+	Lines are read lazily and evaluated in chunks across a process pool with
+	a bounded number of chunks in flight, so memory use does not depend on
+	input size. In ordered mode each output line matches its input line;
+	otherwise results are written as they complete, prefixed with the line
+	number and a tab. Returns the number of lines that failed.
+	"""
+	jobs = jobs or os.cpu_count() or 1
+	chunks = _read_chunks(lines, chunk_size)
+	failures = 0
+
+	def emit(results):
+		nonlocal failures
+		for lineno, ok, text in results:
+			failures += not ok
+			out.write(f"{text}\n" if ordered else f"{lineno}\t{text}\n")
+		out.flush()
+
+	if jobs == 1:
+		_batch_init(max_bits, time_limit)
+		for chunk in chunks:
+			emit(_batch_eval(chunk))
+		return failures
+
+	from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+	window = jobs * 4
+	with ProcessPoolExecutor(jobs, initializer=_batch_init, initargs=(max_bits, time_limit)) as pool:
+		if ordered:
+			queue = deque()
+			for chunk in chunks:
+				queue.append(pool.submit(_batch_eval, chunk))
+				if len(queue) >= window:
+					emit(queue.popleft().result())
+			while queue:
+				emit(queue.popleft().result())
 		else:
-			bg = "#f3f4f6"
-			fg = "#111827"
-			btn_bg = "#ffffff"
-			entry_bg = "#ffffff"
-		self.configure(bg=bg)
-		self.style.configure("TFrame", background=bg)
-		self.style.configure("TLabel", background=bg, foreground=fg)
-		self.style.configure("TButton", background=btn_bg, foreground=fg)
-
-	def _create_widgets(self):
-		main = ttk.Frame(self)
-		main.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-
-		# display
-		self.display_var = tk.StringVar()
-		entry = ttk.Entry(main, textvariable=self.display_var, font=("Segoe UI", 20), justify=tk.RIGHT)
-		entry.pack(fill=tk.X, pady=(0, 10))
-		entry.focus()
-
-		# buttons frame
-		btn_frame = ttk.Frame(main)
-		btn_frame.pack()
-
-		buttons = [
-			["MC", "MR", "M+", "M-"],
-			["7", "8", "9", "/"],
-			["4", "5", "6", "*"],
-			["1", "2", "3", "-"],
-			["0", ".", "%", "+"],
-			["(", ")", "^", "sqrt"],
-			["sin", "cos", "tan", "log"],
-			["C", "⌫", "Ans", "="],
-		]
-
-		for r, row in enumerate(buttons):
-			for c, label in enumerate(row):
-				b = ttk.Button(btn_frame, text=label, command=lambda l=label: self._on_button(l))
-				b.grid(row=r, column=c, ipadx=10, ipady=12, padx=4, pady=4, sticky="nsew")
-		for i in range(4):
-			btn_frame.grid_columnconfigure(i, weight=1)
-
-		# history
-		hist_label = ttk.Label(main, text="History")
-		hist_label.pack(anchor=tk.W, pady=(10, 0))
-		self.history_list = tk.Listbox(main, height=6)
-		self.history_list.pack(fill=tk.X)
-		self.history_list.bind("<<ListboxSelect>>", self._on_history_select)
-
-		# bottom controls
-		bottom = ttk.Frame(main)
-		bottom.pack(fill=tk.X, pady=(10, 0))
-
-		theme_btn = ttk.Button(bottom, text="Toggle Theme", command=self._toggle_theme)
-		theme_btn.pack(side=tk.LEFT)
-
-		copy_btn = ttk.Button(bottom, text="Copy", command=self._copy)
-		copy_btn.pack(side=tk.RIGHT)
-
-	def _on_button(self, label: str):
-		if label == "C":
-			self.display_var.set("")
-			return
-		if label == "⌫":
-			self.display_var.set(self.display_var.get()[:-1])
-			return
-		if label == "=":
-			self._calculate()
-			return
-		if label == "Ans":
-			if self.history:
-				last = self.history[-1].split(" = ")[-1]
-				self.display_var.set(self.display_var.get() + last)
-			return
-		if label in ("M+", "M-", "MR", "MC"):
-			self._memory_op(label)
-			return
-		# map ^ -> ** and sqrt -> sqrt(...)
-		if label == "^":
-			self.display_var.set(self.display_var.get() + "**")
-			return
-		if label == "sqrt":
-			self.display_var.set(self.display_var.get() + "sqrt(")
-			return
-		if label in ("sin", "cos", "tan", "log"):
-			self.display_var.set(self.display_var.get() + f"{label}(")
-			return
-		# default: append label
-		self.display_var.set(self.display_var.get() + label)
-
-	def _calculate(self):
-		expr = self.display_var.get().strip()
-		if not expr:
-			return
-		try:
-			result = self.evaluator.eval(expr)
-			# format nicely
-			if isinstance(result, float) and result.is_integer():
-				result = int(result)
-			self.history.append(f"{expr} = {result}")
-			self._refresh_history()
-			self.display_var.set(str(result))
-		except Exception as e:
-			messagebox.showerror("Error", str(e))
-
-	def _refresh_history(self):
-		self.history_list.delete(0, tk.END)
-		for item in reversed(self.history[-100:]):
-			self.history_list.insert(tk.END, item)
-
-	def _on_history_select(self, _ev):
-		sel = self.history_list.curselection()
-		if not sel:
-			return
-		item = self.history_list.get(sel[0])
-		expr = item.split(" = ")[0]
-		self.display_var.set(expr)
-
-	def _memory_op(self, op: str):
-		try:
-			if op == "MC":
-				self.memory = 0.0
-			elif op == "MR":
-				self.display_var.set(self.display_var.get() + str(self.memory))
-			elif op == "M+":
-				val = float(self.display_var.get() or 0)
-				self.memory += val
-			elif op == "M-":
-				val = float(self.display_var.get() or 0)
-				self.memory -= val
-		except Exception:
-			messagebox.showerror("Error", "Memory operation failed")
-
-	def _toggle_theme(self):
-		self._theme = "dark" if self._theme == "light" else "light"
-		self._apply_theme()
-
-	def _copy(self):
-		self.clipboard_clear()
-		self.clipboard_append(self.display_var.get())
-
-	def _bind_keys(self):
-		self.bind("<Return>", lambda e: self._calculate())
-		self.bind("<BackSpace>", lambda e: self.display_var.set(self.display_var.get()[:-1]))
-		self.bind("<Escape>", lambda e: self.display_var.set(""))
-		for ch in "0123456789.+-*/()%":
-			self.bind(ch, lambda e, c=ch: self.display_var.set(self.display_var.get() + c))
-		# caret ^ mapping
-		self.bind("^", lambda e: self.display_var.set(self.display_var.get() + "**"))
-
-
-def main():
-	app = CalculatorApp()
-	app.mainloop()
+			pending = set()
+			for chunk in chunks:
+				pending.add(pool.submit(_batch_eval, chunk))
+				if len(pending) >= window:
+					done, pending = wait(pending, return_when=FIRST_COMPLETED)
+					for future in done:
+						emit(future.result())
+			for future in as_completed(pending):
+				emit(future.result())
+	return failures
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Advanced Calculator")
+	parser.add_argument(
+		"--batch", nargs="?", const="-", metavar="FILE",
+		help="evaluate expressions from FILE (default: stdin), one per line, without the GUI",
+	)
+	parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: all cores)")
+	parser.add_argument("--unordered", action="store_true", help="write results as they complete, prefixed with line numbers")
+	parser.add_argument("--chunk-size", type=int, default=512, help="lines sent to a worker at a time")
+	parser.add_argument("--max-bits", type=int, default=DEFAULT_MAX_BITS, help="reject integer results estimated above this many bits")
+	parser.add_argument("--time-limit", type=float, default=1.0, help="wall-clock limit per expression in seconds")
+	args = parser.parse_args(argv)
+
+	if args.batch is None:
+		# the GUI (and Tk) is only loaded when it is actually shown
+		from gui import CalculatorApp
+
+		app = CalculatorApp()
+		app.mainloop()
+		return 0
+
+	stream = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+	try:
+		failures = run_batch(
+			stream, sys.stdout, args.jobs, not args.unordered, args.chunk_size, args.max_bits, args.time_limit
+		)
+	finally:
+		if stream is not sys.stdin:
+			stream.close()
+	return 1 if failures else 0
 
 
 if __name__ == "__main__":
-	main()
+	sys.exit(main())
 
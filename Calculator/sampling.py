@@ -0,0 +1,184 @@
+"""
+Adaptive sampling of ``f(x)`` for the graph/tabulate mode.
+
+Points are taken on a dyadic grid (multiples of a power of two) anchored at
+zero, so the x values chosen for one view coincide with those of a panned
+or zoomed view and come straight out of the per-expression point cache.
+Intervals are only subdivided where the curve bends or is undefined, and
+a whole pass shares one time budget: when it runs out, the points found so
+far are returned.
+"""
+from __future__ import annotations
+
+import math
+import time
+from collections import OrderedDict
+
+from engine import EvaluationLimitError, SafeEvaluator
+
+# point caches larger than this are dropped and rebuilt
+MAX_CACHED_POINTS = 200_000
+
+
+class AdaptiveSampler:
+	"""Sample one expression in one variable, caching every evaluated point."""
+
+	def __init__(self, evaluator: SafeEvaluator, expression: str, var: str = "x"):
+		self.expression = expression
+		self.var = var
+		self.evaluator = evaluator
+		# validates once; raises ValueError for a bad expression
+		self._compiled = evaluator.compile(expression, [var])
+		self._points: dict[float, float | None] = {}
+		self.evaluations = 0
+		# whether the last sample() or table() ran out of time and is partial
+		self.truncated = False
+		self._deadline: float | None = None
+
+	def __call__(self, x: float) -> float | None:
+		"""f(x), or None where the expression is undefined or not real.
+
+		Raises EvaluationLimitError if a point exceeds the evaluator's time
+		limit, so one slow formula can't stall a whole plot.
+		"""
+		y = self._points.get(x, _MISSING)
+		if y is not _MISSING:
+			return y
+		if len(self._points) >= MAX_CACHED_POINTS:
+			self._points.clear()
+		self.evaluations += 1
+		try:
+			y = self.evaluator.run(self._compiled, {self.var: x})
+			y = float(y) if isinstance(y, (int, float)) and math.isfinite(y) else None
+		except EvaluationLimitError:
+			raise
+		except Exception:
+			y = None
+		self._points[x] = y
+		return y
+
+	def sample(
+		self, lo: float, hi: float, initial: int = 64, max_depth: int = 8, tolerance: float = 2e-3,
+		time_limit: float | None = None,
+	):
+		"""Return ``(x, y)`` points covering [lo, hi], sorted by x.
+
+		`initial` aligned points are refined up to `max_depth` times wherever
+		the midpoint deviates from the chord by more than `tolerance` times
+		the visible y-range, or where the curve becomes undefined. ``y`` is
+		None at undefined points and at detected jumps, so callers can break
+		the line there.
+
+		The pass stops once `time_limit` seconds (default: the evaluator's
+		time limit) have gone by, leaving the remaining intervals unrefined
+		and setting `truncated`; it can overrun by at most one point.
+		"""
+		if not hi > lo:
+			raise ValueError("Range must have hi > lo")
+		self._start_clock(time_limit)
+		step = _grid_step(hi - lo, initial)
+		first = math.floor(lo / step)
+		last = math.ceil(hi / step)
+		xs = [k * step for k in range(first, last + 1)]
+		ys = []
+		for x in xs:
+			if self._out_of_time():
+				break
+			ys.append(self(x))
+		if not ys:
+			return []
+		finite = [y for y in ys if y is not None]
+		scale = (max(finite) - min(finite)) if finite else 1.0
+		tol = tolerance * (scale or 1.0)
+
+		out = [(xs[0], ys[0])]
+		for a, fa, b, fb in zip(xs, ys, xs[1:], ys[1:]):
+			self._refine(a, fa, b, fb, max_depth, tol, scale, out)
+			out.append((b, fb))
+		return out
+
+	def _refine(self, a, fa, b, fb, depth, tol, scale, out):
+		if self._out_of_time():
+			return
+		m = (a + b) / 2
+		fm = self(m)
+		defined = (fa is not None) + (fm is not None) + (fb is not None)
+		if defined == 3:
+			bends = abs(fm - (fa + fb) / 2) > tol
+		else:
+			# at the edge of an undefined region: narrow it down
+			bends = defined > 0
+		if bends and depth > 0:
+			self._refine(a, fa, m, fm, depth - 1, tol, scale, out)
+			out.append((m, fm))
+			self._refine(m, fm, b, fb, depth - 1, tol, scale, out)
+			return
+		if not (bends and defined == 3):
+			out.append((m, fm))
+			return
+		# still bending at full resolution. A jump (floor(x), a pole) keeps
+		# nearly all of its rise in one half however far it is split, a
+		# steep but smooth stretch divides it about evenly
+		left, right = abs(fm - fa), abs(fb - fm)
+		if abs(fb - fa) > scale / 2 or min(left, right) < (left + right) / 8:
+			# break the line on the side of m that holds the jump
+			if left > right:
+				out.append((m, None))
+				out.append((m, fm))
+			else:
+				out.append((m, fm))
+				out.append((m, None))
+		else:
+			out.append((m, fm))
+
+	def table(self, lo: float, hi: float, step: float, time_limit: float | None = None):
+		"""Regularly spaced ``(x, y)`` rows for tabulating; the leading rows only if time runs out."""
+		if step <= 0:
+			raise ValueError("Step must be positive")
+		self._start_clock(time_limit)
+		count = int(math.floor((hi - lo) / step + 1e-9)) + 1
+		rows = []
+		for i in range(count):
+			if self._out_of_time():
+				break
+			rows.append((lo + i * step, self(lo + i * step)))
+		return rows
+
+	def _start_clock(self, time_limit):
+		limit = self.evaluator.time_limit if time_limit is None else time_limit
+		self._deadline = None if limit is None else time.monotonic() + limit
+		self.truncated = False
+
+	def _out_of_time(self) -> bool:
+		if self._deadline is not None and time.monotonic() > self._deadline:
+			self.truncated = True
+		return self.truncated
+
+
+class SamplerCache:
+	"""Bounded LRU of samplers keyed by expression, so revisiting a formula keeps its points."""
+
+	def __init__(self, evaluator: SafeEvaluator, maxsize: int = 8):
+		self.evaluator = evaluator
+		self.maxsize = maxsize
+		self._samplers: OrderedDict[tuple[str, str], AdaptiveSampler] = OrderedDict()
+
+	def get(self, expression: str, var: str = "x") -> AdaptiveSampler:
+		key = (expression.strip(), var)
+		sampler = self._samplers.get(key)
+		if sampler is None:
+			sampler = AdaptiveSampler(self.evaluator, expression, var)
+			self._samplers[key] = sampler
+			if len(self._samplers) > self.maxsize:
+				self._samplers.popitem(last=False)
+		else:
+			self._samplers.move_to_end(key)
+		return sampler
+
+
+_MISSING = object()
+
+
+def _grid_step(span: float, initial: int) -> float:
+	"""Largest power of two giving at least `initial` intervals over `span`."""
+	return 2.0 ** math.floor(math.log2(span / initial))
@@ -0,0 +1,67 @@
+import unittest
+
+from cells import CircularReferenceError, Worksheet
+
+
+class WorksheetTest(unittest.TestCase):
+	def setUp(self):
+		self.sheet = Worksheet()
+
+	def test_diamond_recomputes_each_cell_once_in_order(self):
+		self.sheet.set("a", "1")
+		self.sheet.set("b", "a + 1")
+		self.sheet.set("c", "a * 2")
+		self.sheet.set("d", "b + c")
+		self.sheet.set("other", "5")
+		order = self.sheet.set("a", "10")
+		self.assertEqual(sorted(order), ["a", "b", "c", "d"])
+		self.assertEqual((order[0], order[-1]), ("a", "d"))
+		self.assertEqual(self.sheet.get("d"), 31)
+
+	def test_cycles_are_rejected_before_anything_changes(self):
+		self.sheet.set("a", "1")
+		self.sheet.set("b", "a + 1")
+		self.sheet.set("c", "b * 2")
+		with self.assertRaises(CircularReferenceError) as caught:
+			self.sheet.set("a", "c + 1")
+		self.assertIn("a -> c -> b -> a", str(caught.exception))
+		with self.assertRaises(CircularReferenceError):
+			self.sheet.set("x", "x + 1")
+		self.assertIsInstance(caught.exception, ValueError)
+		self.assertEqual(self.sheet.cells["a"].formula, "1")
+		self.assertNotIn("x", self.sheet.cells)
+		self.assertEqual(self.sheet.set("a", "2"), ["a", "b", "c"])
+
+	def test_undefined_reference_fails_until_defined(self):
+		self.sheet.set("total", "price * qty")
+		with self.assertRaisesRegex(ValueError, "Unknown cell"):
+			self.sheet.get("total")
+		self.sheet.set("price", "2.5")
+		self.assertEqual(self.sheet.set("qty", "4"), ["qty", "total"])
+		self.assertEqual(self.sheet.get("total"), 10)
+
+	def test_delete_and_errors_propagate_downstream(self):
+		self.sheet.set("a", "1")
+		self.sheet.set("b", "1 / (a - 1)")
+		self.sheet.set("c", "b + 1")
+		with self.assertRaisesRegex(ValueError, "Depends on b"):
+			self.sheet.get("c")
+		self.sheet.set("a", "3")
+		self.assertEqual(self.sheet.get("c"), 1.5)
+		self.assertEqual(self.sheet.delete("a"), ["b", "c"])
+		with self.assertRaisesRegex(ValueError, "Unknown cell: a"):
+			self.sheet.get("b")
+		self.assertEqual(self.sheet.values(), {})
+		# the reference is remembered, so defining `a` again brings them back
+		self.assertEqual(self.sheet.set("a", "2"), ["a", "b", "c"])
+		self.assertEqual(self.sheet.get("c"), 2)
+
+	def test_names_are_checked(self):
+		for name in ("1x", "sin", "pi", "a b"):
+			with self.subTest(name=name):
+				with self.assertRaises(ValueError):
+					self.sheet.set(name, "1")
+
+
+if __name__ == "__main__":
+	unittest.main()
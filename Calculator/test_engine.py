@@ -0,0 +1,116 @@
+import math
+import random
+import unittest
+
+from engine import EvaluationLimitError, SafeEvaluator, _numpy
+
+
+class CacheTest(unittest.TestCase):
+	def test_hits_and_eviction(self):
+		evaluator = SafeEvaluator(cache_size=2)
+		first = evaluator.compile("x + 1", ["x"])
+		self.assertIs(evaluator.compile("x+1", ["x"]), first)
+		# the variable set is part of the key
+		self.assertIsNot(evaluator.compile("x + 1", ["x", "y"]), first)
+		evaluator.compile("x * 2", ["x"])
+		self.assertEqual(evaluator.cache_info(), (1, 3, 2, 2))
+		self.assertIsNot(evaluator.compile("x + 1", ["x"]), first)
+
+	def test_disabled(self):
+		evaluator = SafeEvaluator(cache_size=0)
+		self.assertIsNot(evaluator.compile("x + 1", ["x"]), evaluator.compile("x + 1", ["x"]))
+		self.assertEqual(evaluator.cache_info().currsize, 0)
+
+
+class OptimizerTest(unittest.TestCase):
+	EXPRESSIONS = [
+		"2*3 + x", "sin(x)*2 + sin(x)*3", "pi*x - pi*x", "(x+1)**2 / (x+1)", "x % 3 + x % 3",
+		"-(2**10) + x", "round(x, 2) + round(x, 2)", "1/(x-x+1e-9)", "factorial(5) * x", "x**0.5 + x**0.5",
+	]
+
+	def test_same_results_as_unoptimized(self):
+		plain = SafeEvaluator(optimize=False)
+		optimized = SafeEvaluator()
+		for expression in self.EXPRESSIONS:
+			for x in (-2.5, 0.0, 1.0, 7.25):
+				with self.subTest(expression=expression, x=x):
+					try:
+						expected = plain.eval(expression, {"x": x})
+					except ValueError:
+						with self.assertRaises(ValueError):
+							optimized.eval(expression, {"x": x})
+						continue
+					self.assertEqual(repr(optimized.eval(expression, {"x": x})), repr(expected))
+
+	def test_folds_and_shares(self):
+		evaluator = SafeEvaluator()
+		self.assertEqual(evaluator.explain("2*3 + x", ["x"]), "6 + x")
+		self.assertEqual(evaluator.explain("sin(x)*2 + sin(x)*3", ["x"]), "_t0 = sin(x); _t0 * 2 + _t0 * 3")
+
+	def test_failing_constant_is_left_for_evaluation(self):
+		evaluator = SafeEvaluator()
+		compiled = evaluator.compile("1/0 + x", ["x"])
+		with self.assertRaises(ZeroDivisionError):
+			compiled({"x": 1.0})
+
+
+class LimitTest(unittest.TestCase):
+	def test_oversized_integers_are_refused(self):
+		evaluator = SafeEvaluator()
+		for expression in ["9**9**9", "factorial(10**6)", "comb(10**7, 5*10**6)", "perm(10**6)", "10**5000", "(10**4000)*(10**4000)"]:
+			with self.subTest(expression=expression):
+				with self.assertRaises(EvaluationLimitError):
+					evaluator.eval(expression)
+		self.assertEqual(evaluator.eval("2**14000"), 2**14000)
+		self.assertEqual(SafeEvaluator(max_bits=100_000).eval("10**5000"), 10**5000)
+
+	def test_time_limit(self):
+		evaluator = SafeEvaluator(time_limit=1e-6)
+		with self.assertRaises(EvaluationLimitError):
+			evaluator.eval(" + ".join(["x*1.5"] * 500), {"x": 2.0})
+		self.assertEqual(SafeEvaluator(time_limit=5.0).eval("x + 1", {"x": 1}), 2)
+
+
+@unittest.skipIf(_numpy() is None, "NumPy is not installed")
+class BatchEquivalenceTest(unittest.TestCase):
+	"""eval_batch with NumPy must give exactly what eval() gives row by row."""
+
+	EXPRESSIONS = [
+		"exp(x/10)", "cosh(x/10)", "x**3-2*x", "atan2(x, y)", "tan(x)", "log(y, 3)", "log(y)",
+		"sin(x)*cos(y)", "x % 7", "x // 3", "sqrt(y)", "x/y", "hypot(x, y)", "min(x, y, 3)",
+		"max(x, y)", "floor(x)/2", "fmod(x, 3)", "degrees(x)", "abs(x)**0.5", "x**2", "-x+y*2.5",
+		"copysign(y, x)", "sin(x)**2 + sin(x)*y", "x % -y", "-x // y", "x % 2.5 // 0.5", "sqrt(y)+x",
+		"x**2+y**2", "(x*1e300) % y", "(x*1e300) // (y*1e-10)", "x // (y*1e-300)",
+	]
+
+	def setUp(self):
+		rng = random.Random(1)
+		self.x = [rng.uniform(-50, 50) for _ in range(20000)] + [0.0, -0.0, 1.0, -1.0]
+		self.y = [rng.uniform(0.5, 20) for _ in range(20000)] + [1.0, 2.0, 0.5, 3.0]
+		self.evaluator = SafeEvaluator()
+
+	def test_bit_identical(self):
+		np = _numpy()
+		for expression in self.EXPRESSIONS:
+			with self.subTest(expression=expression):
+				batch = self.evaluator.eval_batch(expression, {"x": self.x, "y": self.y})
+				scalar = [self.evaluator.eval(expression, {"x": a, "y": b}) for a, b in zip(self.x, self.y)]
+				scalar = np.array(scalar, dtype=np.float64)
+				mismatches = np.flatnonzero(batch.view(np.int64) != scalar.view(np.int64))
+				self.assertEqual(mismatches.size, 0, f"row {mismatches[:1]} differs")
+
+	def test_same_errors(self):
+		cases = [
+			("x/(x-1)", 1.0), ("sqrt(x)", -1.0), ("sqrt(x)", -math.inf), ("exp(x)", 1000.0), ("floor(x)", math.inf),
+			("x % (x-1)", 1.0), ("x // (x-1)", 1.0), ("x**2", 1e300),
+		]
+		for expression, x in cases:
+			with self.subTest(expression=expression):
+				with self.assertRaises(ValueError):
+					self.evaluator.eval(expression, {"x": x})
+				with self.assertRaises(ValueError):
+					self.evaluator.eval_batch(expression, {"x": [0.5, x]})
+
+
+if __name__ == "__main__":
+	unittest.main()
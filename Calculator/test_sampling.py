@@ -0,0 +1,29 @@
+import unittest
+
+from engine import SafeEvaluator
+from sampling import AdaptiveSampler
+
+
+class SamplerTimeLimitTest(unittest.TestCase):
+	# each point is cheap, but the pass as a whole would take far longer than the limit
+	EXPRESSION = "sin(1/x) + factorial(1500 + floor(x*0))*0"
+
+	def test_pass_stops_at_the_limit(self):
+		sampler = AdaptiveSampler(SafeEvaluator(time_limit=0.05), self.EXPRESSION)
+		points = sampler.sample(-1, 1, max_depth=20)
+		self.assertTrue(sampler.truncated)
+		self.assertTrue(points)
+		self.assertEqual(points, sorted(points, key=lambda p: p[0]))
+		rows = sampler.table(-1, 1, 1e-6)
+		self.assertTrue(sampler.truncated)
+		self.assertLess(len(rows), 2_000_001)
+
+	def test_quick_pass_is_complete(self):
+		sampler = AdaptiveSampler(SafeEvaluator(time_limit=2.0), "sin(x)")
+		points = sampler.sample(-5, 5)
+		self.assertFalse(sampler.truncated)
+		self.assertEqual((points[0][0], points[-1][0]), (-5.0, 5.0))
+
+
+if __name__ == "__main__":
+	unittest.main()
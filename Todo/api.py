@@ -0,0 +1,367 @@
+"""
+Headless JSON API for the Todo database, built on asyncio and the standard library.
+
+Run: python api.py [--db PATH] [--host 127.0.0.1] [--port 8765]
+
+    GET    /tasks               tasks in list order (ranked when searching):
+                                ?search= &filter=Todo &tags=a,b &match=any &limit= &after=
+    GET    /tasks?since=CURSOR  only what changed since an earlier response's cursor
+    GET    /tasks/<id>
+    POST   /tasks               create; the body is a task object
+    PATCH  /tasks/<id>          change the fields in the body; If-Match makes it conditional
+    DELETE /tasks/<id>          delete the task and its subtasks
+
+GET responses carry an ETag; sending it back as If-None-Match gives 304 Not
+Modified. List responses have a `next` token to pass as `after` while there
+are more rows. Delta responses (with `since`) list changed tasks under
+`tasks`, and the ids of deleted tasks or tasks that no longer pass the
+filters under `removed`. Once `next` is null, their `cursor` is the `since`
+for the next sync. Changes may be sent twice but are never skipped, so
+clients should apply them idempotently.
+"""
+import argparse
+import asyncio
+import base64
+import functools
+import hashlib
+import json
+import sqlite3
+import traceback
+import urllib.parse
+from http import HTTPStatus
+
+from storage import DB_PATH, PAGE_SIZE, TaskStorage, build_task_filter, parse_due, parse_recurrence
+
+
+# largest page a client may ask for
+MAX_LIMIT = 1000
+# request bodies above this are refused
+MAX_BODY = 1 << 20
+# fields a client may set; the rest are maintained by storage
+WRITABLE_FIELDS = ('title', 'notes', 'due', 'priority', 'status', 'tags', 'recurrence', 'parent_id')
+FILTERS = ('All', 'Todo', 'Completed', 'Overdue', 'Today')
+# keys of each kind of `after` cursor, with the JSON types they may hold
+PAGE_CURSOR = {'due_epoch': (int, type(None)), 'priority': (int, type(None)), 'id': (int,)}
+SEARCH_CURSOR = {'score': (int, float), 'id': (int,)}
+CHANGES_CURSOR = {'updated': (str,), 'id': (int,)}
+# JSON types each writable field accepts, and how to say so
+TEXT, OPTIONAL_TEXT = ((str,), 'a string'), ((str, type(None)), 'a string or null')
+FIELD_TYPES = {
+    'title': TEXT, 'notes': OPTIONAL_TEXT, 'due': OPTIONAL_TEXT, 'priority': ((int,), 'an integer'),
+    'status': TEXT, 'tags': OPTIONAL_TEXT, 'recurrence': OPTIONAL_TEXT,
+    'parent_id': ((int, type(None)), 'a task id or null'),
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+
+
+def _encode(payload):
+    return json.dumps(payload, default=str).encode('utf-8')
+
+
+def _etag(body):
+    return '"%s"' % hashlib.sha1(body).hexdigest()
+
+
+def task_etag(row):
+    """The ETag GET /tasks/<id> sends for `row`."""
+    return _etag(_encode(dict(row)))
+
+
+def _encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(token, shape):
+    """The key behind an `after` token, checked against `shape` (key -> allowed types)."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        raise HTTPError(400, 'bad cursor') from None
+    if not (isinstance(key, dict) and set(key) == set(shape)
+            and all(_is_type(key[k], types) for k, types in shape.items())):
+        raise HTTPError(400, 'bad cursor')
+    return key
+
+
+def _is_type(value, types):
+    # JSON true/false decode to bool, which is an int subclass
+    return isinstance(value, types) and not isinstance(value, bool)
+
+
+def _check_fields(fields, creating=False):
+    """Validate a POST/PATCH body; returns the writable fields."""
+    if not isinstance(fields, dict):
+        raise HTTPError(400, 'expected a JSON object')
+    unknown = set(fields) - set(WRITABLE_FIELDS)
+    if unknown:
+        raise HTTPError(400, f"unknown or read-only fields: {', '.join(sorted(unknown))}")
+    for name, value in fields.items():
+        types, kind = FIELD_TYPES[name]
+        if not _is_type(value, types):
+            raise HTTPError(400, f'{name} must be {kind}')
+    if creating and not (fields.get('title') or '').strip():
+        raise HTTPError(400, 'title is required')
+    if 'title' in fields and not (fields['title'] or '').strip():
+        raise HTTPError(400, 'title cannot be empty')
+    if fields.get('due') and parse_due(fields['due']) is None:
+        raise HTTPError(400, 'due must be YYYY-MM-DD, YYYY-MM-DD HH:MM or YYYY-MM-DD HH:MM:SS')
+    if fields.get('status', 'todo') not in ('todo', 'done'):
+        raise HTTPError(400, "status must be 'todo' or 'done'")
+    if fields.get('recurrence'):
+        parse_recurrence(fields['recurrence'], parse_due(fields.get('due')))  # ValueError -> 400
+    return fields
+
+
+class TaskAPI:
+    """Routes requests to a TaskStorage.
+
+    Reads run on the default executor, each borrowing a pooled reader
+    connection; writes are queued to the storage writer and awaited, so the
+    event loop never blocks on SQLite.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    async def _read(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+    async def _write(self, future):
+        return await asyncio.wrap_future(future)
+
+    # -- HTTP ---------------------------------------------------------------
+
+    async def serve_client(self, reader, writer):
+        """asyncio.start_server callback: HTTP/1.1 with keep-alive."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._respond(writer, 400, {}, _encode({'error': 'bad request line'}), False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                length = headers.get('content-length') or '0'
+                if not (length.isascii() and length.isdigit()):
+                    await self._respond(writer, 400, {}, _encode({'error': 'bad Content-Length'}), False)
+                    break
+                length = int(length)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {}, _encode({'error': 'request body too large'}), False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                try:
+                    status, extra, payload = await self.handle(method, target, headers, body)
+                except Exception:
+                    # a bug shouldn't drop the connection without an answer
+                    traceback.print_exc()
+                    status, extra, payload = 500, {}, _encode({'error': 'internal server error'})
+                await self._respond(writer, status, extra, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, extra, body, keep_alive):
+        head = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}']
+        if status != 304:
+            head += ['Content-Type: application/json', f'Content-Length: {len(body)}']
+        head += [f'{k}: {v}' for k, v in extra.items()]
+        head.append('Connection: ' + ('keep-alive' if keep_alive else 'close'))
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        if status != 304:
+            writer.write(body)
+        await writer.drain()
+
+    async def handle(self, method, target, headers, body):
+        """Route one request; returns (status, extra headers, encoded body)."""
+        url = urllib.parse.urlsplit(target)
+        query = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+        parts = [p for p in url.path.split('/') if p]
+        try:
+            if parts == ['tasks']:
+                if method == 'GET':
+                    return self._cached(headers, await self._list(query))
+                if method == 'POST':
+                    task = await self._create(self._json(body))
+                    return 201, {'Location': f"/tasks/{task['id']}", 'ETag': task_etag(task)}, _encode(dict(task))
+                raise HTTPError(405)
+            if len(parts) == 2 and parts[0] == 'tasks' and parts[1].isdigit():
+                task_id = int(parts[1])
+                if method == 'GET':
+                    return self._cached(headers, dict(await self._get(task_id)))
+                if method == 'PATCH':
+                    task = await self._update(task_id, self._json(body), headers.get('if-match'))
+                    return 200, {'ETag': task_etag(task)}, _encode(dict(task))
+                if method == 'DELETE':
+                    return 200, {}, _encode({'deleted': await self._delete(task_id)})
+                raise HTTPError(405)
+            raise HTTPError(404)
+        except HTTPError as e:
+            return e.status, {}, _encode({'error': str(e)})
+        except (ValueError, sqlite3.IntegrityError) as e:
+            return 400, {}, _encode({'error': str(e)})
+
+    @staticmethod
+    def _cached(headers, payload):
+        body = _encode(payload)
+        etag = _etag(body)
+        if etag in [t.strip() for t in headers.get('if-none-match', '').split(',')]:
+            return 304, {'ETag': etag}, b''
+        return 200, {'ETag': etag}, body
+
+    @staticmethod
+    def _json(body):
+        try:
+            return json.loads(body or b'{}')
+        except ValueError:
+            raise HTTPError(400, 'body is not valid JSON') from None
+
+    # -- endpoints ----------------------------------------------------------
+
+    async def _list(self, query):
+        search = query.get('search', '').strip()
+        filter_opt = query.get('filter', 'All')
+        if filter_opt not in FILTERS:
+            raise HTTPError(400, f"filter must be one of {', '.join(FILTERS)}")
+        tags = [t.strip() for t in query.get('tags', '').split(',') if t.strip()]
+        match_all = query.get('match', 'all') != 'any'
+        try:
+            limit = max(1, min(int(query.get('limit', PAGE_SIZE)), MAX_LIMIT))
+        except ValueError:
+            raise HTTPError(400, 'limit must be an integer') from None
+        ranked = search and self.storage.has_fts
+        shape = CHANGES_CURSOR if 'since' in query else SEARCH_CURSOR if ranked else PAGE_CURSOR
+        after = _decode_cursor(query['after'], shape) if 'after' in query else None
+        where, params = build_task_filter(search, filter_opt, self.storage.has_fts, tags, match_all)
+
+        if 'since' in query:
+            since = query['since']
+            rows, deleted = await self._read(self.storage.changes, since, where, params, after, limit)
+            more = len(rows) == limit
+            cursor = since
+            if not more:
+                # the newest stamp seen; everything up to it has been sent
+                cursor = max([since, *(r['updated'] for r in rows[-1:]), *(d['deleted'] for d in deleted)])
+            return {
+                'tasks': [{k: r[k] for k in r.keys() if k != 'matches'} for r in rows if r['matches']],
+                'removed': sorted({r['id'] for r in rows if not r['matches']} | {d['task_id'] for d in deleted}),
+                'cursor': cursor,
+                'next': _encode_cursor({'updated': rows[-1]['updated'], 'id': rows[-1]['id']}) if more else None,
+            }
+
+        if ranked:
+            # ranked by relevance, as in the app
+            where, params = build_task_filter('', filter_opt, tags=tags, match_all=match_all)
+            rows = await self._read(self.storage.search, search, where, params, after, limit)
+            key = ('score', 'id')
+        else:
+            rows = await self._read(self.storage.page_tasks, where, params, after, limit)
+            key = ('due_epoch', 'priority', 'id')
+        more = len(rows) == limit
+        return {
+            'tasks': [dict(r) for r in rows],
+            'next': _encode_cursor({k: rows[-1][k] for k in key}) if more else None,
+        }
+
+    async def _get(self, task_id):
+        row = await self._read(self.storage.get_task, task_id)
+        if row is None:
+            raise HTTPError(404, f'no task {task_id}')
+        return row
+
+    async def _check_parent(self, fields):
+        parent_id = fields.get('parent_id')
+        if parent_id is not None and await self._read(self.storage.get_task, parent_id) is None:
+            raise HTTPError(400, f'no parent task {parent_id}')
+
+    async def _create(self, fields):
+        fields = _check_fields(fields, creating=True)
+        await self._check_parent(fields)
+        done = fields.get('status') == 'done'
+        task_id = await self._write(self.storage.add_task({**fields, 'status': 'todo'} if done else fields))
+        if done:
+            await self._complete(task_id)
+        return await self._get(task_id)
+
+    async def _update(self, task_id, fields, if_match=None):
+        fields = _check_fields(fields)
+        await self._check_parent(fields)
+        done = fields.get('status') == 'done'
+        if done:
+            del fields['status']
+
+        def check(row):
+            if row is None:
+                raise HTTPError(404, f'no task {task_id}')
+            if if_match and if_match != '*' and task_etag(row) not in [t.strip() for t in if_match.split(',')]:
+                raise HTTPError(412, 'task was changed by someone else')
+
+        if fields:
+            # checked inside the write transaction, so nothing can slip in between
+            await self._write(self.storage.update_task(task_id, fields, check))
+        else:
+            check(await self._read(self.storage.get_task, task_id))
+        if done:
+            await self._complete(task_id)
+        return await self._get(task_id)
+
+    async def _complete(self, task_id):
+        # same as ticking it off in the app: subtasks too, and recurring tasks continue
+        await self._write(self.storage.complete_task(task_id))
+
+    async def _delete(self, task_id):
+        await self._get(task_id)
+        return await self._write(self.storage.delete_task(task_id))
+
+
+async def serve(storage, host='127.0.0.1', port=8765):
+    """Start serving `storage`; returns the asyncio Server."""
+    return await asyncio.start_server(TaskAPI(storage).serve_client, host, port)
+
+
+async def _run(args):
+    storage = TaskStorage(args.db)
+    try:
+        server = await serve(storage, args.host, args.port)
+        print(f'Serving {args.db} on http://{args.host}:{args.port}')
+        async with server:
+            await server.serve_forever()
+    finally:
+        storage.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Todo JSON API')
+    parser.add_argument('--db', default=DB_PATH, help='SQLite database (default: tasks.db next to the script)')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (0.0.0.0 for the whole LAN)')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,126 +1,353 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
-import sqlite3
 import threading
-import json
-import datetime
-import os
+import time
 import traceback
+import bisect
+import heapq
+import itertools
+from collections import deque
 
+from storage import (
+    PAGE_SIZE, TaskStorage, build_task_filter, due_epoch, format_recurrence, id_filter, iter_occurrences,
+    parents_first, parse_due, parse_recurrence,
+)
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "tasks.db")
-
-
-def now_iso():
-    return datetime.datetime.now().isoformat(sep=" ", timespec="seconds")
-
-
-class TaskStorage:
-    """Simple SQLite-backed task storage."""
-    def __init__(self, path=DB_PATH):
-        self.path = path
-        self.conn = sqlite3.connect(self.path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        self._init_db()
-
-    def _init_db(self):
-        cur = self.conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY,
-                title TEXT NOT NULL,
-                notes TEXT,
-                due TEXT,
-                priority INTEGER DEFAULT 2,
-                status TEXT DEFAULT 'todo',
-                tags TEXT,
-                created TEXT,
-                updated TEXT,
-                recurrence TEXT,
-                parent_id INTEGER
-            )
-            """
-        )
-        self.conn.commit()
-
-    def add_task(self, task):
-        cur = self.conn.cursor()
-        now = now_iso()
-        cur.execute(
-            """
-            INSERT INTO tasks (title, notes, due, priority, status, tags, created, updated, recurrence, parent_id)
-            VALUES (:title, :notes, :due, :priority, :status, :tags, :created, :updated, :recurrence, :parent_id)
-            """,
-            {
-                'title': task.get('title'),
-                'notes': task.get('notes'),
-                'due': task.get('due'),
-                'priority': task.get('priority', 2),
-                'status': task.get('status', 'todo'),
-                'tags': task.get('tags'),
-                'created': now,
-                'updated': now,
-                'recurrence': task.get('recurrence'),
-                'parent_id': task.get('parent_id'),
-            },
-        )
-        self.conn.commit()
-        return cur.lastrowid
-
-    def update_task(self, task_id, fields):
-        fields = dict(fields)
-        fields['updated'] = now_iso()
-        set_clause = ",".join(f"{k} = :{k}" for k in fields.keys())
-        params = {**fields, 'id': task_id}
-        cur = self.conn.cursor()
-        cur.execute(f"UPDATE tasks SET {set_clause} WHERE id = :id", params)
-        self.conn.commit()
-
-    def delete_task(self, task_id):
-        cur = self.conn.cursor()
-        cur.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-        self.conn.commit()
-
-    def get_task(self, task_id):
-        cur = self.conn.cursor()
-        cur.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
-        return cur.fetchone()
-
-    def list_tasks(self, where_clause=None, params=()):
-        cur = self.conn.cursor()
-        q = "SELECT * FROM tasks"
-        if where_clause:
-            q += " WHERE " + where_clause
-        q += " ORDER BY due IS NULL, due, priority"
-        cur.execute(q, params)
-        return cur.fetchall()
-
-    def export_json(self, path):
-        rows = self.list_tasks()
-        data = [dict(r) for r in rows]
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, default=str)
-
-    def import_json(self, path):
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        inserted = 0
-        for item in data:
-            # simple mapping, ignore id from source
-            task = {
-                'title': item.get('title') or 'Untitled',
-                'notes': item.get('notes'),
-                'due': item.get('due'),
-                'priority': item.get('priority', 2),
-                'status': item.get('status', 'todo'),
-                'tags': item.get('tags'),
-                'recurrence': item.get('recurrence'),
-                'parent_id': item.get('parent_id'),
-            }
-            self.add_task(task)
-            inserted += 1
-        return inserted
+
+# the next page is fetched once the view is this close to the last loaded row
+PREFETCH_ROWS = 100
+# reminders fire this many seconds before a task is due
+REMINDER_LEAD = 60
+# upcoming reminders read from the index at a time
+REMINDER_BATCH = 256
+# longest single timer; guards against wall-clock jumps
+REMINDER_MAX_SLEEP = 3600
+SEARCH_DEBOUNCE_MS = 200
+# how often the model checks for committed writes while some are pending
+WRITE_POLL_MS = 15
+
+
+def task_sort_key(task):
+    """Python equivalent of TASK_ORDER."""
+    return (task['due_epoch'] is None, task['due_epoch'] or 0, task['priority'] or 0, task['id'])
+
+
+class TaskModel:
+    """In-memory copy of the tasks on screen, kept in step with storage writes.
+
+    Edits go through the model. It writes to storage and then notifies each
+    subscriber as ``callback(event, task_id, task)``. `event` is 'added',
+    'updated' or 'removed', and `task` is None for removals. Listeners patch
+    the one affected row instead of reloading the list. Bulk edits send a
+    single 'reset' (task_id and task None) instead, and listeners reload.
+
+    Writes never block the Tk thread, which an import holding the writer
+    would otherwise freeze. Each write is queued. Once it has committed,
+    listeners are notified from a Tk timer and the write's `done` callback
+    gets its result, in the order the writes were made, so listeners always
+    read the new state. Failed writes go to `on_error`. Every edit is one
+    step in the storage's undo journal; undo() and redo() replay it.
+    """
+
+    def __init__(self, storage, widget):
+        self.storage = storage
+        self.widget = widget
+        self.tasks = {}
+        self._listeners = []
+        self._pending = deque()  # (future, callback, done), in submission order
+        self._poll_after = None
+        self.on_error = None
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def _emit(self, event, task_id, task):
+        for callback in self._listeners:
+            callback(event, task_id, task)
+
+    def _then(self, future, callback, done=None):
+        """Once `future` resolves, call `callback(result)` and pass what it returns to `done`."""
+        self._pending.append((future, callback, done))
+        if self._poll_after is None:
+            self._poll_writes()
+
+    def _poll_writes(self):
+        self._poll_after = None
+        while self._pending and self._pending[0][0].done():
+            future, callback, done = self._pending.popleft()
+            try:
+                result = callback(future.result())
+            except Exception as e:
+                if self.on_error is None:
+                    raise
+                self.on_error(e)
+                continue
+            if done is not None:
+                done(result)
+        if self._pending:
+            self._poll_after = self.widget.after(WRITE_POLL_MS, self._poll_writes)
+
+    def load(self, rows, replace=False):
+        """Cache rows fetched for display; `replace` drops what was there."""
+        if replace:
+            self.tasks.clear()
+        for r in rows:
+            self.tasks[r['id']] = dict(r)
+
+    def get(self, task_id):
+        task = self.tasks.get(task_id)
+        if task is None:
+            row = self.storage.get_task(task_id)
+            if row is None:
+                return None
+            task = self.tasks[task_id] = dict(row)
+        return task
+
+    def _emit_reloaded(self, event, task_id):
+        row = self.storage.get_task(task_id)
+        if row is None:
+            return  # a write queued after this one (an undo, a delete) removed it
+        task = self.tasks[task_id] = dict(row)
+        self._emit(event, task_id, task)
+
+    def _emit_updated(self, ids):
+        # one query for however many rows changed (a completed subtree, its ancestors)
+        for row in self.storage.get_tasks(ids):
+            task = self.tasks[row['id']] = dict(row)
+            self._emit('updated', row['id'], task)
+
+    def add(self, task, done=None):
+        """Insert a task; `done` gets its id."""
+        def added(task_id):
+            self._emit_reloaded('added', task_id)
+            if task.get('parent_id'):
+                self._emit_updated(self.storage.ancestor_ids(task_id))
+            return task_id
+        self._then(self.storage.add_task(task, undo='add'), added, done)
+
+    def update(self, task_id, fields, label='edit', done=None):
+        before = self.storage.ancestor_ids(task_id) if 'parent_id' in fields else []
+
+        def updated(_):
+            self._emit_reloaded('updated', task_id)
+            if 'parent_id' in fields or 'status' in fields:
+                # their subtask rollups changed
+                self._emit_updated(set(before) | set(self.storage.ancestor_ids(task_id)))
+        self._then(self.storage.update_task(task_id, fields, undo=label), updated, done)
+
+    def set_status(self, task_id, status, done=None):
+        """Update the status; completing a task also completes its subtasks.
+
+        Completed recurring tasks get their next instance. `done` gets the
+        id of the task's own next instance, or None.
+        """
+        if status != 'done':
+            self.update(task_id, {'status': status}, 'reopen', done)
+            return
+
+        def completed(result):
+            changed, spawned = result
+            self._emit_updated(changed + self.storage.ancestor_ids(task_id))
+            for next_id in spawned.values():
+                self._emit_reloaded('added', next_id)
+            return spawned.get(task_id)
+        self._then(self.storage.complete_task(task_id, undo='complete'), completed, done)
+
+    def delete(self, task_id, done=None):
+        """Delete a task and its subtasks; `done` gets the deleted ids."""
+        ancestors = self.storage.ancestor_ids(task_id)
+
+        def deleted(ids):
+            for removed in ids:
+                self.tasks.pop(removed, None)
+                self._emit('removed', removed, None)
+            self._emit_updated(ancestors)
+            return ids
+        self._then(self.storage.delete_task(task_id, undo='delete'), deleted, done)
+
+    def bulk(self, action, where_clause=None, params=(), done=None, **changes):
+        """Run storage.bulk_<action> on the tasks matching the filter as one undo step.
+
+        Listeners get one 'reset' rather than an event per row; `done` gets
+        the storage method's result.
+        """
+        def finished(result):
+            self._reset()
+            return result
+        self._then(getattr(self.storage, 'bulk_' + action)(where_clause, params, undo=action, **changes), finished, done)
+
+    def _reset(self):
+        self.tasks.clear()
+        self._emit('reset', None, None)
+
+    def undo(self, done=None):
+        """Revert the last journaled step; `done` gets storage.undo()'s result."""
+        self._then(self.storage.undo(), self._replay, done)
+
+    def redo(self, done=None):
+        self._then(self.storage.redo(), self._replay, done)
+
+    def _replay(self, step):
+        if step is None:
+            return None
+        if len(step['added']) + len(step['removed']) + len(step['updated']) > PAGE_SIZE:
+            self._reset()  # a bulk edit: cheaper to reload than to patch row by row
+            return step
+        for task_id in step['removed']:
+            self.tasks.pop(task_id, None)
+            self._emit('removed', task_id, None)
+        added = set(step['added'])
+        for row in parents_first(self.storage.get_tasks(added | set(step['updated']))):
+            task = self.tasks[row['id']] = dict(row)
+            self._emit('added' if row['id'] in added else 'updated', row['id'], task)
+        return step
+
+
+class ReminderScheduler:
+    """Calls `notify(tasks)` shortly before tasks fall due, from one Tk timer.
+
+    Upcoming reminders sit in a heap ordered by fire time, and only the
+    next REMINDER_BATCH are read from the due_epoch index at a time. A
+    single `after` timer sleeps until the earliest one. Model changes
+    re-arm the timer straight away. Entries for tasks that were edited,
+    completed or deleted are dropped lazily when they reach the top.
+    Fired reminders are recorded in the reminders table, so they don't
+    repeat, across restarts too, unless the due date changes.
+    """
+
+    def __init__(self, widget, storage, notify, lead=REMINDER_LEAD):
+        self.widget = widget
+        self.storage = storage
+        self.notify = notify
+        self.lead = lead
+        self._heap = []
+        self._due = {}  # task_id -> due_epoch of its live heap entry
+        self._horizon = None  # sort key of the last row read; None once none are left
+        self._timer = None
+
+    def reload(self):
+        """Rebuild the queue from storage (on start and after imports)."""
+        self._heap.clear()
+        self._due.clear()
+        self._horizon = (int(time.time()), 0, 0)
+        self._fill()
+        self._arm()
+
+    def task_changed(self, event, task_id, task):
+        """TaskModel listener."""
+        if event == 'reset':
+            self.reload()
+            return
+        self._due.pop(task_id, None)
+        if task is not None and task['status'] == 'todo' and task['due_epoch'] is not None:
+            key = (task['due_epoch'], task['priority'] or 0, task_id)
+            # beyond the horizon it's picked up by a later _fill
+            if (self._horizon is None or key <= self._horizon) and not self._fired(task_id, task['due_epoch']):
+                self._push(task_id, task['due_epoch'])
+        self._arm()
+
+    def _fired(self, task_id, due):
+        return self.storage.reminded_due(task_id) == due
+
+    def _push(self, task_id, due):
+        self._due[task_id] = due
+        heapq.heappush(self._heap, (due - self.lead, task_id, due))
+
+    def _fill(self):
+        rows = self.storage.upcoming_reminders(self._horizon, REMINDER_BATCH)
+        for r in rows:
+            if r['id'] not in self._due:
+                self._push(r['id'], r['due_epoch'])
+        last = rows[-1] if rows else None
+        self._horizon = (last['due_epoch'], last['priority'] or 0, last['id']) if len(rows) == REMINDER_BATCH else None
+
+    def _arm(self):
+        if self._timer is not None:
+            self.widget.after_cancel(self._timer)
+            self._timer = None
+        while True:
+            while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][2]:
+                heapq.heappop(self._heap)  # superseded by an edit
+            if self._heap or self._horizon is None:
+                break
+            self._fill()
+        if self._heap:
+            delay = min(max(self._heap[0][0] - time.time(), 0), REMINDER_MAX_SLEEP)
+            self._timer = self.widget.after(int(delay * 1000), self._tick)
+
+    def _tick(self):
+        self._timer = None
+        now = time.time()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, task_id, due_epoch = heapq.heappop(self._heap)
+            if self._due.get(task_id) == due_epoch:
+                del self._due[task_id]
+                due.append((task_id, due_epoch))
+        if due:
+            # not waited for: these are already off the heap, so nothing reads them back this session
+            self.storage.mark_reminded(due)
+            tasks = [self.storage.get_task(task_id) for task_id, _ in due]
+            self.notify([t for t in tasks if t is not None])
+        self._arm()
+
+
+class QueryWorker:
+    """Runs task queries on a background thread; the newest request wins.
+
+    submit() replaces any request that hasn't started yet and aborts the
+    one in flight: the pooled reader connection's progress handler notices the
+    newer generation and SQLite interrupts the statement. Results of
+    superseded generations are dropped, so poll() only ever hands back
+    the latest one.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._running = 0
+        self._pending = None
+        self._result = None
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, query):
+        """Schedule `query(conn)` and return its generation token."""
+        with self._cond:
+            self._generation += 1
+            self._pending = (self._generation, query)
+            self._result = None
+            self._cond.notify()
+            return self._generation
+
+    def poll(self):
+        """(generation, rows, error) once the latest query finished, else None."""
+        with self._cond:
+            result, self._result = self._result, None
+            return result
+
+    def _superseded(self):
+        return self._running != self._generation
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                generation, query = self._pending
+                self._pending = None
+                self._running = generation
+            with self.storage.reader() as conn:
+                conn.set_progress_handler(self._superseded, 1000)
+                try:
+                    rows, error = query(conn), None
+                except Exception as e:
+                    rows, error = None, e
+                finally:
+                    conn.set_progress_handler(None, 0)
+            with self._cond:
+                if generation == self._generation:
+                    self._result = (generation, rows, error)
 
 
 class TaskDialog(simpledialog.Dialog):
@@ -146,16 +373,39 @@ class TaskDialog(simpledialog.Dialog):
         self.tags_var = tk.StringVar(value=self.task.get('tags') or '')
         tk.Entry(master, textvariable=self.tags_var).grid(row=2, column=1, columnspan=3, sticky='we')
 
-        tk.Label(master, text="Notes:").grid(row=3, column=0, sticky='nw')
+        tk.Label(master, text="Repeat (daily, weekly, monthly or\nFREQ=WEEKLY;BYDAY=MO,TH;COUNT=5):").grid(row=3, column=0, sticky='w')
+        self.recur_var = tk.StringVar(value=self.task.get('recurrence') or '')
+        tk.Entry(master, textvariable=self.recur_var).grid(row=3, column=1, columnspan=3, sticky='we')
+
+        tk.Label(master, text="Notes:").grid(row=4, column=0, sticky='nw')
         self.notes_text = tk.Text(master, width=50, height=8)
-        self.notes_text.grid(row=3, column=1, columnspan=3, sticky='we')
+        self.notes_text.grid(row=4, column=1, columnspan=3, sticky='we')
         if self.task.get('notes'):
             self.notes_text.insert('1.0', self.task.get('notes'))
 
         return self.title_entry
 
+    def validate(self):
+        due = self.due_var.get().strip()
+        if due and parse_due(due) is None:
+            messagebox.showerror('Invalid due date', 'Use YYYY-MM-DD or YYYY-MM-DD HH:MM', parent=self)
+            return False
+        self.recurrence = None
+        text = self.recur_var.get().strip()
+        if text:
+            if not due:
+                messagebox.showerror('Invalid repeat', 'A repeating task needs a due date', parent=self)
+                return False
+            try:
+                self.recurrence = format_recurrence(parse_recurrence(text, parse_due(due)))
+            except ValueError as e:
+                messagebox.showerror('Invalid repeat', str(e), parent=self)
+                return False
+        return True
+
     def apply(self):
         self.result = {
+            'recurrence': self.recurrence,
             'title': self.title_var.get().strip() or 'Untitled',
             'due': self.due_var.get().strip() or None,
             'priority': int(self.prio_var.get()),
@@ -164,6 +414,53 @@ class TaskDialog(simpledialog.Dialog):
         }
 
 
+class BulkEditDialog(simpledialog.Dialog):
+    """Changes for several tasks at once; blank fields are left alone."""
+
+    def body(self, master):
+        tk.Label(master, text="Priority (1=High,2=Normal,3=Low):").grid(row=0, column=0, sticky='w')
+        self.prio_var = tk.StringVar()
+        self.prio_entry = tk.Spinbox(master, values=('', '1', '2', '3'), textvariable=self.prio_var, width=5)
+        self.prio_entry.grid(row=0, column=1, sticky='w')
+
+        tk.Label(master, text="Due (YYYY-MM-DD HH:MM, +N/-N days,\nor 'none' to clear):").grid(row=1, column=0, sticky='w')
+        self.due_var = tk.StringVar()
+        tk.Entry(master, textvariable=self.due_var).grid(row=1, column=1, sticky='we')
+
+        tk.Label(master, text="Add tags (comma separated):").grid(row=2, column=0, sticky='w')
+        self.add_var = tk.StringVar()
+        tk.Entry(master, textvariable=self.add_var).grid(row=2, column=1, sticky='we')
+
+        tk.Label(master, text="Remove tags (comma separated):").grid(row=3, column=0, sticky='w')
+        self.remove_var = tk.StringVar()
+        tk.Entry(master, textvariable=self.remove_var).grid(row=3, column=1, sticky='we')
+        return self.prio_entry
+
+    def validate(self):
+        self.changes = {}
+        prio = self.prio_var.get().strip()
+        if prio:
+            self.changes['priority'] = int(prio)
+        due = self.due_var.get().strip()
+        if due.lower() == 'none':
+            self.changes['due'] = ''
+        elif due[:1] in '+-' and due[1:].isdigit():
+            self.changes['shift_days'] = int(due)
+        elif due:
+            if parse_due(due) is None:
+                messagebox.showerror('Invalid due date', 'Use YYYY-MM-DD, YYYY-MM-DD HH:MM or +N / -N days', parent=self)
+                return False
+            self.changes['due'] = due
+        for key, var in (('add_tags', self.add_var), ('remove_tags', self.remove_var)):
+            tags = [t.strip() for t in var.get().split(',') if t.strip()]
+            if tags:
+                self.changes[key] = tags
+        return True
+
+    def apply(self):
+        self.result = self.changes or None
+
+
 class TodoApp(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -172,19 +469,50 @@ class TodoApp(tk.Tk):
         self.minsize(700, 400)
         self.style = ttk.Style(self)
 
-        # Storage
+        # Storage, and the model that all edits go through
         self.storage = TaskStorage()
+        self.model = TaskModel(self.storage, self)
+        self.model.subscribe(self._on_task_changed)
+        self.model.on_error = self._on_write_error
 
-        # Undo stack (very small: last action)
-        self.undo_stack = []
+        # list queries run off the Tk thread
+        self.query_worker = QueryWorker(self.storage)
+        self._load_generation = 0
+        self._load_after = None
+        self._poll_after = None
+        self._page = {'loaded': 0, 'done': True, 'keys': {}}
+        # set by select_all: the filter it stands for and the rows it selected
+        self._select_all = None
 
         self._build_ui()
         self._bind_keys()
         self._load_tasks()
 
-        # Start reminder thread
-        self._reminder_interval = 30  # seconds
-        self._start_reminders()
+        # reminders: one timer, re-armed whenever the model changes
+        self._reminder_list = None
+        self.reminders = ReminderScheduler(self, self.storage, self._on_reminders)
+        self.model.subscribe(self.reminders.task_changed)
+        self.reminders.reload()
+        self.protocol('WM_DELETE_WINDOW', self._on_close)
+
+    def _on_close(self):
+        # let queued writes (reminder bookkeeping, a running import) commit
+        # first, without leaving a frozen window on screen meanwhile
+        self.withdraw()
+        flushed = self.storage.submit(lambda conn: None)
+
+        def wait():
+            if not flushed.done():
+                self.after(50, wait)
+                return
+            self.storage.close()
+            self.destroy()
+        wait()
+
+    def _on_write_error(self, error):
+        traceback.print_exception(type(error), error, error.__traceback__)
+        self.status_var.set('Save failed')
+        messagebox.showerror('Error', f'Failed to save changes: {error}')
 
     def _build_ui(self):
         # Top toolbar
@@ -192,9 +520,11 @@ class TodoApp(tk.Tk):
         toolbar.pack(side='top', fill='x', padx=6, pady=6)
 
         ttk.Button(toolbar, text='New (Ctrl+N)', command=self.add_task).pack(side='left')
+        ttk.Button(toolbar, text='Subtask (Ins)', command=self.add_subtask).pack(side='left')
         ttk.Button(toolbar, text='Edit (Ctrl+E)', command=self.edit_task).pack(side='left')
         ttk.Button(toolbar, text='Delete (Del)', command=self.delete_task).pack(side='left')
         ttk.Button(toolbar, text='Complete', command=self.toggle_complete).pack(side='left')
+        ttk.Button(toolbar, text='Select All', command=self.select_all).pack(side='left')
         ttk.Button(toolbar, text='Import', command=self.import_tasks).pack(side='left')
         ttk.Button(toolbar, text='Export', command=self.export_tasks).pack(side='left')
 
@@ -202,7 +532,7 @@ class TodoApp(tk.Tk):
         self.search_var = tk.StringVar()
         search_entry = ttk.Entry(toolbar, textvariable=self.search_var)
         search_entry.pack(side='left', padx=(2, 6))
-        search_entry.bind('<KeyRelease>', lambda e: self._load_tasks())
+        search_entry.bind('<KeyRelease>', lambda e: self._schedule_load())
 
         ttk.Label(toolbar, text='Filter:').pack(side='left')
         self.filter_var = tk.StringVar(value='All')
@@ -210,6 +540,14 @@ class TodoApp(tk.Tk):
         filter_cb.pack(side='left')
         filter_cb.bind('<<ComboboxSelected>>', lambda e: self._load_tasks())
 
+        # tag facets; the menu is rebuilt each time it opens so the counts are current
+        self.tag_vars = {}
+        self.tag_mode = tk.StringVar(value='all')
+        self.tags_btn = ttk.Menubutton(toolbar, text='Tags')
+        self.tags_menu = tk.Menu(self.tags_btn, tearoff=0, postcommand=self._fill_tags_menu)
+        self.tags_btn['menu'] = self.tags_menu
+        self.tags_btn.pack(side='left', padx=(6, 0))
+
         ttk.Label(toolbar, text='Theme:').pack(side='right')
         self.theme_var = tk.StringVar(value='Light')
         theme_cb = ttk.Combobox(toolbar, values=['Light', 'Dark'], width=8, state='readonly', textvariable=self.theme_var)
@@ -221,20 +559,26 @@ class TodoApp(tk.Tk):
         main.pack(fill='both', expand=True, padx=6, pady=(0,6))
 
         # Task list (Treeview)
-        cols = ('title', 'due', 'priority', 'tags', 'status')
-        self.tree = ttk.Treeview(main, columns=cols, show='headings', selectmode='browse')
-        self.tree.heading('title', text='Title')
+        cols = ('due', 'priority', 'progress', 'tags', 'status')
+        self.tree = ttk.Treeview(main, columns=cols, show='tree headings', selectmode='extended')
+        self.tree.heading('#0', text='Title')
         self.tree.heading('due', text='Due')
         self.tree.heading('priority', text='Prio')
+        self.tree.heading('progress', text='Subtasks')
         self.tree.heading('tags', text='Tags')
         self.tree.heading('status', text='Status')
-        self.tree.column('title', width=360)
+        self.tree.column('#0', width=360)
         self.tree.column('due', width=140)
         self.tree.column('priority', width=60, anchor='center')
+        self.tree.column('progress', width=90, anchor='center')
         self.tree.column('tags', width=120)
         self.tree.column('status', width=80, anchor='center')
+        self.tree_scroll = ttk.Scrollbar(main, orient='vertical', command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._on_tree_scroll)
         self.tree.pack(side='left', fill='both', expand=True)
+        self.tree_scroll.pack(side='left', fill='y')
         self.tree.bind('<Double-1>', lambda e: self.edit_task())
+        self.tree.bind('<<TreeviewOpen>>', lambda e: self._load_children(self.tree.focus()))
 
         # Right pane for details
         right = ttk.Frame(main, width=320)
@@ -249,7 +593,9 @@ class TodoApp(tk.Tk):
         status.pack(side='bottom', fill='x')
 
         # selection change
-        self.tree.bind('<<TreeviewSelect>>', lambda e: self._show_details())
+        self.tree.bind('<<TreeviewSelect>>', lambda e: self._on_select())
+        self.tree.bind('<Control-a>', lambda e: self.select_all() or 'break')
+        self.tree.bind('<Control-A>', lambda e: self.select_all() or 'break')
 
     def _apply_theme(self):
         theme = self.theme_var.get()
@@ -267,12 +613,15 @@ class TodoApp(tk.Tk):
     def _bind_keys(self):
         self.bind('<Control-n>', lambda e: self.add_task())
         self.bind('<Control-N>', lambda e: self.add_task())
+        self.bind('<Insert>', lambda e: self.add_subtask())
         self.bind('<Control-e>', lambda e: self.edit_task())
         self.bind('<Control-E>', lambda e: self.edit_task())
         self.bind('<Delete>', lambda e: self.delete_task())
         self.bind('<Return>', lambda e: self.edit_task())
         self.bind('<Control-f>', lambda e: self.focus_search())
         self.bind('<Control-z>', lambda e: self.undo())
+        self.bind('<Control-y>', lambda e: self.redo())
+        self.bind('<Control-Y>', lambda e: self.redo())
 
     def focus_search(self):
         self.focus_force()
@@ -284,52 +633,329 @@ class TodoApp(tk.Tk):
                         w.focus_set()
                         return
 
+    def _selected_tags(self):
+        return [name for name, var in self.tag_vars.items() if var.get()]
+
+    def _current_filter(self):
+        return build_task_filter(
+            self.search_var.get().strip(), self.filter_var.get(), self.storage.has_fts,
+            self._selected_tags(), self.tag_mode.get() == 'all',
+        )
+
+    def _fill_tags_menu(self):
+        menu = self.tags_menu
+        menu.delete(0, 'end')
+        menu.add_radiobutton(label='Match all', value='all', variable=self.tag_mode, command=self._on_tags_changed)
+        menu.add_radiobutton(label='Match any', value='any', variable=self.tag_mode, command=self._on_tags_changed)
+        menu.add_command(label='Clear', command=self._clear_tags)
+        menu.add_separator()
+        selected = self._selected_tags()
+        # counts cover the tasks the list would show: with "Match all" each is
+        # what checking that tag leaves; with "Match any" the tag choice is
+        # left out so the counts are not limited to the tags already picked
+        match_all = self.tag_mode.get() == 'all'
+        where, params = build_task_filter(
+            self.search_var.get().strip(), self.filter_var.get(), self.storage.has_fts,
+            selected if match_all else (), match_all,
+        )
+        counts = [tuple(r) for r in self.storage.tag_counts(where, params)]
+        # keep checked tags that no listed task carries, so they can be unchecked
+        listed = {name.lower() for name, _ in counts}
+        counts += [(name, 0) for name in selected if name.lower() not in listed]
+        tag_vars = {}
+        for name, count in counts:
+            var = tk.BooleanVar(value=name in selected)
+            tag_vars[name] = var
+            menu.add_checkbutton(label=f'{name} ({count})', variable=var, command=self._on_tags_changed)
+        self.tag_vars = tag_vars
+
+    def _clear_tags(self):
+        for var in self.tag_vars.values():
+            var.set(False)
+        self._on_tags_changed()
+
+    def _on_tags_changed(self):
+        selected = self._selected_tags()
+        self.tags_btn.config(text=f'Tags ({len(selected)})' if selected else 'Tags')
+        self._load_tasks()
+
+    def _schedule_load(self):
+        # debounce: only query once typing pauses
+        if self._load_after:
+            self.after_cancel(self._load_after)
+        self._load_after = self.after(SEARCH_DEBOUNCE_MS, self._load_tasks)
+
     def _load_tasks(self):
-        qparts = []
-        params = []
-        s = self.search_var.get().strip()
-        if s:
-            qparts.append("(title LIKE ? OR notes LIKE ? OR tags LIKE ?)")
-            like = f"%{s}%"
-            params += [like, like, like]
-
-        filter_opt = self.filter_var.get()
-        if filter_opt == 'Todo':
-            qparts.append("status = 'todo'")
-        elif filter_opt == 'Completed':
-            qparts.append("status = 'done'")
-        elif filter_opt == 'Overdue':
-            qparts.append("due IS NOT NULL AND datetime(due) < datetime('now') AND status != 'done'")
-        elif filter_opt == 'Today':
-            today = datetime.date.today().isoformat()
-            qparts.append("date(due) = ?")
-            params.append(today)
-
-        where = None
-        if qparts:
-            where = ' AND '.join(qparts)
-
-        rows = self.storage.list_tasks(where, params)
-        # clear
-        for i in self.tree.get_children():
-            self.tree.delete(i)
+        """Reload the first page in the background; stale results are discarded."""
+        if self._load_after:
+            self.after_cancel(self._load_after)
+            self._load_after = None
+        search = self.search_var.get().strip()
+        count_where, count_params = self._current_filter()
+        # the unfiltered list shows the subtask hierarchy; filters and searches are flat
+        tags = self._selected_tags()
+        tree_mode = not search and not tags and self.filter_var.get() == 'All'
+        if search and self.storage.has_fts:
+            # ranked by relevance rather than due date
+            where, params = build_task_filter('', self.filter_var.get(), tags=tags, match_all=self.tag_mode.get() == 'all')
+        elif tree_mode:
+            search, where, params = None, "parent_id IS NULL", ()
+        else:
+            search, where, params = None, count_where, count_params
+        page = {
+            'search': search, 'where': where, 'params': params, 'tree': tree_mode,
+            'last': None, 'loaded': 0, 'done': True, 'total': 0,
+            # task_sort_key of each row, in tree order, per parent iid whose rows
+            # are loaded ('' is the top level); unused for ranked search
+            'keys': {'': []},
+        }
+
+        def query(conn):
+            rows = self._fetch_page(conn, page)
+            total = len(rows)
+            if total == PAGE_SIZE:
+                total = self.storage.count_tasks(count_where, count_params, conn=conn)
+            return rows, total
+
+        self._page = page
+        self._select_all = None
+        self._submit_load(query, append=False)
+
+    def _fetch_page(self, conn, page):
+        if page['search']:
+            return self.storage.search(
+                page['search'], page['where'], page['params'], after=page['last'], limit=PAGE_SIZE, conn=conn
+            )
+        return self.storage.page_tasks(page['where'], page['params'], after=page['last'], conn=conn)
+
+    def _load_more(self):
+        """Fetch the page after the last loaded row (keyset, not OFFSET)."""
+        page = self._page
+        if page['done'] or self._poll_after:
+            return
+        page['done'] = True  # until this page arrives
+        self._submit_load(lambda conn: (self._fetch_page(conn, page), None), append=True)
+
+    def _submit_load(self, query, append):
+        self._load_generation = self.query_worker.submit(query)
+        self._load_append = append
+        self._load_started = time.monotonic()
+        # action messages set after this call ('Task added') win over the count
+        self._load_status = self.status_var.get()
+        if not self._poll_after:
+            self._poll_after = self.after(10, self._poll_tasks)
+
+    def _on_tree_scroll(self, first, last):
+        self.tree_scroll.set(first, last)
+        self._maybe_load_more()
+
+    def _maybe_load_more(self):
+        # keep PREFETCH_ROWS loaded below the visible part of the list
+        if not self.tree.winfo_ismapped():
+            return
+        last = self.tree.yview()[1]
+        if (1.0 - last) * self._page['loaded'] < PREFETCH_ROWS:
+            self._load_more()
+
+    def _poll_tasks(self):
+        result = self.query_worker.poll()
+        if result is None or result[0] != self._load_generation:
+            if time.monotonic() - self._load_started > 0.3 and self.status_var.get() == self._load_status:
+                self.status_var.set('Searching...')
+                self._load_status = 'Searching...'
+            self._poll_after = self.after(25, self._poll_tasks)
+            return
+        self._poll_after = None
+        _, result, error = result
+        if error is not None:
+            self.status_var.set(f'Search failed: {error}')
+            return
+        rows, total = result
+        page = self._page
+        if not self._load_append:
+            # clear
+            self.tree.delete(*self.tree.get_children())
+            page['total'] = total
+        self.model.load(rows, replace=not self._load_append)
+        for r in rows:
+            if self.tree.exists(str(r['id'])):
+                continue  # moved past the cursor since its page was loaded
+            self.tree.insert('', 'end', iid=str(r['id']), **self._row_item(r))
+            page['loaded'] += 1
+            if not page['search']:
+                page['keys'][''].append(task_sort_key(r))
+            if page['tree']:
+                self._sync_placeholder(r)
+        if rows:
+            page['last'] = rows[-1]
+            self._extend_select_all(str(r['id']) for r in rows)
+        page['done'] = len(rows) < PAGE_SIZE
+
+        if self.status_var.get() == self._load_status:
+            self.status_var.set(f"{page['total']} tasks")
+        self._maybe_load_more()
+
+    @staticmethod
+    def _row_item(r):
+        """Treeview text and values for a task row."""
+        pr = {1: 'High', 2: 'Normal', 3: 'Low'}.get(r['priority'], str(r['priority']))
+        status = 'Done' if r['status'] == 'done' else 'Todo'
+        due = r['due'] or ''
+        progress = ''
+        if r['sub_total']:
+            progress = f"{r['sub_done']}/{r['sub_total']} ({100 * r['sub_done'] // r['sub_total']}%)"
+        return {'text': r['title'], 'values': (due, pr, progress, r['tags'] or '', status)}
+
+    def _sync_placeholder(self, task):
+        # collapsed parents get a dummy child so Tk draws the expand arrow
+        iid = str(task['id'])
+        placeholder = f'more:{iid}'
+        if iid in self._page['keys']:
+            return  # children already loaded
+        if task['sub_total'] and not self.tree.exists(placeholder):
+            self.tree.insert(iid, 'end', iid=placeholder, text='Loading...')
+        elif not task['sub_total'] and self.tree.exists(placeholder):
+            self.tree.delete(placeholder)
+
+    def _load_children(self, iid):
+        """Fill in a parent's subtasks the first time it is expanded."""
+        page = self._page
+        if not page.get('tree') or not iid.isdigit() or iid in page['keys'] or not self.tree.exists(iid):
+            return
+        placeholder = f'more:{iid}'
+        if self.tree.exists(placeholder):
+            self.tree.delete(placeholder)
+        rows = self.storage.list_tasks("parent_id = ?", (int(iid),))
+        self.model.load(rows)
+        keys = page['keys'][iid] = []
         for r in rows:
-            pr = {1: 'High', 2: 'Normal', 3: 'Low'}.get(r['priority'], str(r['priority']))
-            status = 'Done' if r['status'] == 'done' else 'Todo'
-            due = r['due'] or ''
-            self.tree.insert('', 'end', iid=str(r['id']), values=(r['title'], due, pr, r['tags'] or '', status))
+            self.tree.insert(iid, 'end', iid=str(r['id']), **self._row_item(r))
+            keys.append(task_sort_key(r))
+            self._sync_placeholder(r)
+        self._extend_select_all(str(r['id']) for r in rows)
+
+    def _selected_id(self):
+        """The selected task when exactly one is selected."""
+        sel = self._selected_ids()
+        return sel[0] if len(sel) == 1 and not self._select_all else None
 
-        self.status_var.set(f'{len(rows)} tasks')
+    def _selected_ids(self):
+        return [int(iid) for iid in self.tree.selection() if iid.isdigit()]
+
+    def select_all(self):
+        """Select every task matching the current search and filters, loaded or not."""
+        where, params = self._current_filter()
+        rows = [iid for iid in self._all_rows() if iid.isdigit()]
+        self._select_all = {
+            'where': where, 'params': params, 'rows': set(rows),
+            'count': self.storage.count_tasks(where, params),
+        }
+        self.tree.selection_set(rows)
+        self.status_var.set(f"All {self._select_all['count']} matching tasks selected")
+
+    def _all_rows(self, parent=''):
+        for iid in self.tree.get_children(parent):
+            yield iid
+            yield from self._all_rows(iid)
+
+    def _extend_select_all(self, iids):
+        # rows loaded later are part of the selection too
+        if self._select_all:
+            iids = list(iids)
+            self._select_all['rows'].update(iids)
+            self.tree.selection_add(iids)
+
+    def _on_select(self):
+        # clicking another row ends "select all"
+        if self._select_all and set(self.tree.selection()) != self._select_all['rows']:
+            self._select_all = None
+        self._show_details()
+
+    def _bulk_target(self):
+        """(where, params, count) when more than one task is selected, else None."""
+        if self._select_all:
+            return self._select_all['where'], self._select_all['params'], self._select_all['count']
+        ids = self._selected_ids()
+        if len(ids) < 2:
+            return None
+        return (*id_filter(ids), len(ids))
+
+    def _on_task_changed(self, event, task_id, task):
+        """Patch the one row a model change affects instead of reloading."""
+        if event == 'reset':
+            # a bulk change: one reload instead of a patch per row
+            self._load_tasks()
+            return
+        page = self._page
+        iid = str(task_id)
+        shown = self.tree.exists(iid)
+        index = None
+        if shown:
+            index = self.tree.index(iid)
+            if not page['search']:
+                del page['keys'][self.tree.parent(iid)][index]
+        if task is None:
+            page['keys'].pop(iid, None)
+        container = ''
+        if page['tree'] and task is not None and task['parent_id'] is not None:
+            container = str(task['parent_id'])
+        siblings = page['keys'].get(container)
+
+        if task is None:
+            visible = False
+        elif page['tree']:
+            visible = siblings is not None  # only under parents that are expanded
+        else:
+            visible = (
+                self.storage.task_matches(task_id, page['where'], page['params'])
+                and (not page['search'] or self.storage.matches_search(task, page['search']))
+            )
+        position = None
+        if visible and page['search']:
+            # rank is only known to the index: keep the row where it was
+            position = index if shown else ('end' if page['done'] else None)
+        elif visible:
+            key = task_sort_key(task)
+            position = bisect.bisect_left(siblings, key)
+            if container == '' and position == len(siblings) and not page['done']:
+                position = None  # sorts into a page that isn't loaded yet
+            else:
+                siblings.insert(position, key)
+
+        if position is None:
+            if shown:
+                self.tree.delete(iid)
+                page['loaded'] -= 1
+        elif shown:
+            # move keeps the selection and focus on the row
+            self.tree.item(iid, **self._row_item(task))
+            self.tree.move(iid, container, position)
+        else:
+            self.tree.insert(container, position, iid=iid, **self._row_item(task))
+            page['loaded'] += 1
+        if position is not None and page['tree']:
+            self._sync_placeholder(task)
+
+        if page['tree']:
+            page['total'] += (event == 'added') - (event == 'removed')
+        elif shown or page['done'] or event == 'added':
+            # a row that wasn't shown may still have been counted if the list isn't fully loaded
+            page['total'] += visible - shown
+        self.status_var.set(f"{page['total']} tasks")
+        if self.tree.selection() == (iid,) or (shown and not self.tree.exists(iid)):
+            self._show_details()
 
     def _show_details(self):
-        sel = self.tree.selection()
-        if not sel:
+        task_id = self._selected_id()
+        if task_id is None:
+            target = self._bulk_target()
             self.details.config(state='normal')
             self.details.delete('1.0', 'end')
+            if target:
+                self.details.insert('1.0', f'{target[2]} tasks selected')
             self.details.config(state='disabled')
             return
-        task_id = int(sel[0])
-        r = self.storage.get_task(task_id)
+        r = self.model.get(task_id)
         if not r:
             return
         txt = []
@@ -338,6 +964,18 @@ class TodoApp(tk.Tk):
         txt.append(f"Priority: {r['priority']}")
         txt.append(f"Due: {r['due']}")
         txt.append(f"Tags: {r['tags']}")
+        if r['parent_id']:
+            parent = self.model.get(r['parent_id'])
+            txt.append(f"Subtask of: {parent['title'] if parent else r['parent_id']}")
+        if r['sub_total']:
+            txt.append(f"Subtasks: {r['sub_done']}/{r['sub_total']} done ({100 * r['sub_done'] // r['sub_total']}%)")
+        if r['recurrence']:
+            txt.append(f"Repeats: {r['recurrence']}")
+            try:
+                upcoming = itertools.islice(iter_occurrences(parse_recurrence(r['recurrence'], parse_due(r['due'])), parse_due(r['due'])), 3)
+                txt.append('Then: ' + ', '.join(o.strftime('%Y-%m-%d %H:%M') for o in upcoming))
+            except (ValueError, TypeError):
+                pass
         txt.append('')
         txt.append('Notes:')
         txt.append(r['notes'] or '')
@@ -347,146 +985,192 @@ class TodoApp(tk.Tk):
         self.details.config(state='disabled')
 
     def add_task(self):
-        try:
-            d = TaskDialog(self, title='New Task')
-            if d.result:
-                tid = self.storage.add_task(d.result)
-                self.undo_stack.append(('add', tid))
-                self._load_tasks()
-                self.status_var.set('Task added')
-        except Exception:
-            traceback.print_exc()
-            messagebox.showerror('Error', 'Failed to add task')
+        d = TaskDialog(self, title='New Task')
+        if d.result:
+            self.model.add(d.result, lambda tid: self.status_var.set('Task added'))
+
+    def add_subtask(self):
+        parent_id = self._selected_id()
+        if parent_id is None:
+            messagebox.showinfo('New Subtask', 'Select the parent task first')
+            return
+        d = TaskDialog(self, title='New Subtask')
+        if d.result:
+            if self._page.get('tree'):
+                self._load_children(str(parent_id))
+                self.tree.item(str(parent_id), open=True)
+
+            def added(tid):
+                if self.tree.exists(str(tid)):
+                    self.tree.see(str(tid))
+                self.status_var.set('Subtask added')
+            self.model.add({**d.result, 'parent_id': parent_id}, added)
 
     def edit_task(self):
-        sel = self.tree.selection()
-        if not sel:
+        target = self._bulk_target()
+        if target:
+            where, params, count = target
+            d = BulkEditDialog(self, title=f'Edit {count} Tasks')
+            if d.result:
+                self.model.bulk('edit', where, params, lambda n: self.status_var.set(f'{n} tasks updated'), **d.result)
+            return
+        tid = self._selected_id()
+        if tid is None:
             messagebox.showinfo('Edit Task', 'Select a task to edit')
             return
-        tid = int(sel[0])
-        r = self.storage.get_task(tid)
+        r = self.model.get(tid)
         if not r:
             return
         initial = dict(r)
         d = TaskDialog(self, title='Edit Task', task=initial)
         if d.result:
-            self.storage.update_task(tid, d.result)
-            self.undo_stack.append(('edit', tid, initial))
-            self._load_tasks()
-            self.status_var.set('Task updated')
+            self.model.update(tid, d.result, done=lambda _: self.status_var.set('Task updated'))
 
     def delete_task(self):
-        sel = self.tree.selection()
-        if not sel:
+        target = self._bulk_target()
+        if target:
+            where, params, count = target
+            if messagebox.askyesno('Delete', f'Delete {count} tasks and their subtasks?'):
+                self.model.bulk('delete', where, params, lambda n: self.status_var.set(f'{n} tasks deleted'))
+            return
+        tid = self._selected_id()
+        if tid is None:
             return
-        tid = int(sel[0])
-        r = self.storage.get_task(tid)
+        r = self.model.get(tid)
         if not r:
             return
-        if not messagebox.askyesno('Delete', f"Delete task '{r['title']}'?"):
+        question = f"Delete task '{r['title']}'?"
+        if r['sub_total']:
+            question = f"Delete task '{r['title']}' and its {r['sub_total']} subtasks?"
+        if not messagebox.askyesno('Delete', question):
             return
-        # push undo
-        self.undo_stack.append(('delete', dict(r)))
-        self.storage.delete_task(tid)
-        self._load_tasks()
-        self.status_var.set('Task deleted')
+        self.model.delete(tid, lambda _: self.status_var.set('Task deleted'))
 
     def toggle_complete(self):
-        sel = self.tree.selection()
-        if not sel:
+        target = self._bulk_target()
+        if target:
+            # like a single task: complete them, or reopen them if all are done already
+            where, params, count = target
+            if self.storage.count_tasks(f"({where or 1}) AND status != 'done'", params):
+                def completed(result):
+                    self.status_var.set(f'{len(result[0])} tasks completed')
+                self.model.bulk('complete', where, params, completed)
+            else:
+                self.model.bulk('edit', where, params, lambda n: self.status_var.set(f'{n} tasks reopened'), status='todo')
+            return
+        tid = self._selected_id()
+        if tid is None:
             return
-        tid = int(sel[0])
-        r = self.storage.get_task(tid)
+        r = self.model.get(tid)
         if not r:
             return
         new_status = 'done' if r['status'] != 'done' else 'todo'
-        self.storage.update_task(tid, {'status': new_status})
-        self._load_tasks()
-        self.status_var.set('Status toggled')
+
+        def toggled(next_id):
+            task = self.model.get(next_id) if next_id is not None else None
+            if task is not None:
+                self.status_var.set(f"Completed; next due {task['due']}")
+            else:
+                self.status_var.set('Status toggled')
+        self.model.set_status(tid, new_status, toggled)
 
     def undo(self):
-        if not self.undo_stack:
-            self.status_var.set('Nothing to undo')
-            return
-        action = self.undo_stack.pop()
-        kind = action[0]
-        if kind == 'add':
-            tid = action[1]
-            self.storage.delete_task(tid)
-            self.status_var.set('Undo add')
-        elif kind == 'delete':
-            task = action[1]
-            # reinsert
-            t = {k: task[k] for k in task.keys() if k not in ('id',)}
-            self.storage.add_task(t)
-            self.status_var.set('Undo delete')
-        elif kind == 'edit':
-            tid = action[1]
-            old = action[2]
-            # restore old
-            fields = {k: old[k] for k in old.keys() if k not in ('id',)}
-            self.storage.update_task(tid, fields)
-            self.status_var.set('Undo edit')
-        self._load_tasks()
+        self.model.undo(lambda step: self._replay('Undo', step))
+
+    def redo(self):
+        self.model.redo(lambda step: self._replay('Redo', step))
+
+    def _replay(self, verb, step):
+        if step is None:
+            self.status_var.set(f'Nothing to {verb.lower()}')
+        elif 'error' in step:
+            self.status_var.set(f"Can't {verb.lower()} {step['label']}")
+            messagebox.showerror(verb, f"Can't {verb.lower()} {step['label']}: {step['error']}")
+        else:
+            self.status_var.set(f"{verb} {step['label']}")
 
     def import_tasks(self):
-        path = filedialog.askopenfilename(filetypes=[('JSON', '*.json'), ('All', '*.*')])
+        path = filedialog.askopenfilename(filetypes=[('JSON', '*.json'), ('NDJSON', '*.ndjson *.jsonl'), ('All', '*.*')])
         if not path:
             return
-        try:
-            n = self.storage.import_json(path)
-            self._load_tasks()
-            messagebox.showinfo('Import', f'Imported {n} tasks')
-        except Exception as e:
-            messagebox.showerror('Import error', str(e))
+
+        # runs on the storage writer thread; the window keeps working meanwhile
+        progress = {'count': 0}
+        future = self.storage.import_json(path, progress=lambda n: progress.__setitem__('count', n))
+
+        def poll():
+            if not future.done():
+                self.status_var.set(f"Importing... {progress['count']} tasks")
+                self.after(100, poll)
+            elif future.exception() is not None:
+                self.status_var.set('Import failed')
+                messagebox.showerror('Import error', str(future.exception()))
+            else:
+                self.status_var.set(f'Imported {future.result()} tasks')
+                self._load_tasks()
+                self.reminders.reload()
+                messagebox.showinfo('Import', f'Imported {future.result()} tasks')
+
+        poll()
 
     def export_tasks(self):
-        path = filedialog.asksaveasfilename(defaultextension='.json', filetypes=[('JSON', '*.json')])
+        path = filedialog.asksaveasfilename(
+            defaultextension='.json',
+            filetypes=[
+                ('JSON', '*.json'), ('NDJSON', '*.ndjson'), ('CSV', '*.csv'),
+                ('Gzipped', '*.json.gz *.ndjson.gz *.csv.gz'),
+            ],
+        )
         if not path:
             return
-        try:
-            self.storage.export_json(path)
-            messagebox.showinfo('Export', f'Exported tasks to {path}')
-        except Exception as e:
-            messagebox.showerror('Export error', str(e))
-
-    def _start_reminders(self):
-        def check():
+        # export what the list currently shows, off the Tk thread
+        where, params = self._current_filter()
+        progress = {'count': 0}
+        result = {}
+
+        def work():
             try:
-                rows = self.storage.list_tasks("due IS NOT NULL AND status != 'done'")
-                now = datetime.datetime.now()
-                for r in rows:
-                    try:
-                        if not r['due']:
-                            continue
-                        due_dt = None
-                        for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
-                            try:
-                                due_dt = datetime.datetime.strptime(r['due'], fmt)
-                                break
-                            except Exception:
-                                continue
-                        if not due_dt:
-                            continue
-                        delta = (due_dt - now).total_seconds()
-                        # if within next minute or overdue, notify
-                        if -5 <= delta <= 60:
-                            self._notify(f"Due: {r['title']}", f"Due at {r['due']}")
-                    except Exception:
-                        continue
-            except Exception:
-                pass
-            # schedule next
-            self.after(self._reminder_interval * 1000, check)
+                result['count'] = self.storage.export(
+                    path, where_clause=where, params=params,
+                    progress=lambda n: progress.__setitem__('count', n),
+                )
+            except Exception as e:
+                result['error'] = e
+
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+
+        def poll():
+            if worker.is_alive():
+                self.status_var.set(f"Exporting... {progress['count']} tasks")
+                self.after(100, poll)
+            elif 'error' in result:
+                self.status_var.set('Export failed')
+                messagebox.showerror('Export error', str(result['error']))
+            else:
+                self.status_var.set(f"Exported {result['count']} tasks")
+                messagebox.showinfo('Export', f'Exported tasks to {path}')
+
+        poll()
 
-        check()
+    def _on_reminders(self, tasks):
+        for r in tasks:
+            self._notify(f"Due: {r['title']}", f"Due at {r['due']}")
 
     def _notify(self, title, message):
-        try:
-            # simple in-app pop-up
-            messagebox.showinfo(title, message)
-        except Exception:
-            pass
+        # one non-modal window collects reminders, so the main loop never blocks
+        box = self._reminder_list
+        if box is None or not box.winfo_exists():
+            win = tk.Toplevel(self)
+            win.title('Reminders')
+            win.attributes('-topmost', True)
+            box = self._reminder_list = tk.Listbox(win, width=60, height=8)
+            box.pack(fill='both', expand=True, padx=6, pady=6)
+            ttk.Button(win, text='Dismiss', command=win.destroy).pack(pady=(0, 6))
+        box.insert('end', f'{title} — {message}')
+        box.see('end')
+        box.winfo_toplevel().lift()
+        self.bell()
 
 
 if __name__ == '__main__':
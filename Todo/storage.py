@@ -0,0 +1,1732 @@
+"""
+Task storage: SQLite schema, migrations and TaskStorage, with no GUI dependency.
+
+main.py (the Tk app) and api.py (the HTTP service) both build on this
+module; import it directly when Tk isn't wanted.
+"""
+import sqlite3
+import threading
+import json
+import datetime
+import os
+import time
+import csv
+import gzip
+import re
+import calendar
+import itertools
+import queue
+import contextlib
+from collections import namedtuple
+from concurrent.futures import Future
+
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "tasks.db")
+
+
+EXPORT_FORMATS = ('json', 'ndjson', 'csv')
+DUE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+# undated tasks last; served from the due_epoch indexes
+TASK_ORDER = "due_epoch IS NULL, due_epoch, priority, id"
+# rows fetched per page by the task list; more are loaded while scrolling
+PAGE_SIZE = 200
+# pooled read connections per TaskStorage
+READ_POOL_SIZE = 4
+# most queued writes folded into one commit
+WRITE_BATCH = 256
+# undo journal bounds: steps kept, and their total size in bytes
+UNDO_STEPS = 500
+UNDO_BYTES = 4 << 20
+# task fields the undo journal records; the rest are derived from these
+JOURNAL_COLUMNS = ('title', 'notes', 'due', 'priority', 'status', 'tags', 'created', 'recurrence', 'parent_id', 'series_id')
+FTS_TOKENIZE = 'unicode61 remove_diacritics 2'
+# "quoted phrase" or a bare word in the search box
+SEARCH_TOKEN = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def now_iso():
+    return datetime.datetime.now().isoformat(sep=" ", timespec="seconds")
+
+
+# now_iso() as computed inside SQLite, for triggers
+SQL_NOW = "strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')"
+
+
+def parse_due(text):
+    """Parse a due date as typed in the dialog; None if empty or unrecognised."""
+    if not text:
+        return None
+    text = text.strip().replace('T', ' ')
+    for fmt in DUE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def shift_due(text, days):
+    """`text` moved by `days`, written in the DUE_FORMATS shape it matched; None if unrecognised."""
+    text = text.strip().replace('T', ' ')
+    for fmt in DUE_FORMATS:
+        try:
+            dt = datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return (dt + datetime.timedelta(days=days)).strftime(fmt)
+    return None
+
+
+def due_epoch(text):
+    """Local-time Unix timestamp for a due date string, stored alongside it for indexing."""
+    dt = parse_due(text)
+    return int(dt.timestamp()) if dt else None
+
+
+Recurrence = namedtuple('Recurrence', 'freq interval weekdays monthday until count start')
+RECURRENCE_FREQS = ('DAILY', 'WEEKLY', 'MONTHLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+
+def parse_recurrence(text, start=None):
+    """Parse an RRULE-style rule such as ``FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH``.
+
+    Supported parts: FREQ (DAILY, WEEKLY, MONTHLY; the bare words 'daily',
+    'weekly' and 'monthly' also work), INTERVAL, BYDAY for weekly rules,
+    BYMONTHDAY for monthly ones, UNTIL (a date), COUNT and DTSTART. The
+    series starts at DTSTART, else at `start` (normally the task's due
+    date). Raises ValueError for anything else.
+    """
+    text = (text or '').strip()
+    if text.upper() in RECURRENCE_FREQS:
+        text = 'FREQ=' + text
+    parts = {}
+    for item in filter(None, text.split(';')):
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f'Bad recurrence part: {item!r}')
+        parts[key.strip().upper()] = value.strip()
+    unknown = set(parts) - {'FREQ', 'INTERVAL', 'BYDAY', 'BYMONTHDAY', 'UNTIL', 'COUNT', 'DTSTART'}
+    if unknown:
+        raise ValueError(f"Unsupported recurrence part: {', '.join(sorted(unknown))}")
+    freq = parts.get('FREQ', '').upper()
+    if freq not in RECURRENCE_FREQS:
+        raise ValueError('FREQ must be DAILY, WEEKLY or MONTHLY')
+    try:
+        interval = int(parts.get('INTERVAL', 1))
+        count = int(parts['COUNT']) if 'COUNT' in parts else None
+        monthday = int(parts['BYMONTHDAY']) if 'BYMONTHDAY' in parts else None
+        weekdays = tuple(sorted(WEEKDAYS.index(d.strip().upper()) for d in parts['BYDAY'].split(','))) if 'BYDAY' in parts else ()
+    except ValueError:
+        raise ValueError(f'Bad recurrence rule: {text!r}') from None
+    if interval < 1 or (count is not None and count < 1) or (monthday is not None and not 1 <= monthday <= 31):
+        raise ValueError(f'Bad recurrence rule: {text!r}')
+    if weekdays and freq != 'WEEKLY' or monthday and freq != 'MONTHLY':
+        raise ValueError('BYDAY needs FREQ=WEEKLY and BYMONTHDAY needs FREQ=MONTHLY')
+    until = None
+    if 'UNTIL' in parts:
+        until = parse_due(parts['UNTIL'])
+        if until is None:
+            raise ValueError(f"Bad UNTIL date: {parts['UNTIL']!r}")
+        if until.time() == datetime.time():
+            until = until.replace(hour=23, minute=59, second=59)  # a bare date includes that day
+    if 'DTSTART' in parts:
+        start = parse_due(parts['DTSTART'])
+        if start is None:
+            raise ValueError(f"Bad DTSTART: {parts['DTSTART']!r}")
+    return Recurrence(freq, interval, weekdays, monthday, until, count, start)
+
+
+def format_recurrence(rule):
+    """The canonical text for `rule`, as stored in the recurrence column."""
+    parts = [f'FREQ={rule.freq}']
+    if rule.interval != 1:
+        parts.append(f'INTERVAL={rule.interval}')
+    if rule.weekdays:
+        parts.append('BYDAY=' + ','.join(WEEKDAYS[d] for d in rule.weekdays))
+    if rule.monthday:
+        parts.append(f'BYMONTHDAY={rule.monthday}')
+    if rule.until:
+        parts.append('UNTIL=' + rule.until.strftime('%Y-%m-%d'))
+    if rule.count:
+        parts.append(f'COUNT={rule.count}')
+    if rule.start:
+        parts.append('DTSTART=' + rule.start.strftime('%Y-%m-%d %H:%M'))
+    return ';'.join(parts)
+
+
+def anchored_recurrence(text, due):
+    """`text` in canonical form, starting at `due` unless it has its own DTSTART.
+
+    Every instance of a series copies the stored rule, so it has to carry
+    the series start: otherwise COUNT and INTERVAL would restart at each
+    instance's due date. Raises ValueError for a bad rule.
+    """
+    if not text:
+        return text
+    return format_recurrence(parse_recurrence(text, parse_due(due)))
+
+
+def _add_months(dt, months, day):
+    year, month = divmod(dt.month - 1 + months, 12)
+    year += dt.year
+    # clamp: "monthly on the 31st" means the last day of shorter months
+    return dt.replace(year=year, month=month + 1, day=min(day, calendar.monthrange(year, month + 1)[1]))
+
+
+def iter_occurrences(rule, after=None):
+    """Lazily yield the occurrences of `rule` in order, optionally only those after `after`.
+
+    Without COUNT the generator jumps straight to the period containing
+    `after`, so finding the next occurrence of a long-running series costs
+    the same as for a new one. With COUNT it has to count from the start.
+    """
+    start = rule.start
+    if start is None:
+        return
+    if rule.freq == 'DAILY':
+        step = datetime.timedelta(days=rule.interval)
+        base = start
+    elif rule.freq == 'WEEKLY':
+        step = datetime.timedelta(weeks=rule.interval)
+        base = start - datetime.timedelta(days=start.weekday()) if rule.weekdays else start
+    else:
+        step = None
+        base = start
+    first = 0
+    if after is not None and rule.count is None and after > base:
+        if step is not None:
+            first = (after - base) // step
+        else:
+            first = ((after.year - base.year) * 12 + after.month - base.month) // rule.interval
+    emitted = 0
+    for period in itertools.count(first):
+        if step is not None:
+            anchor = base + period * step
+            candidates = [anchor + datetime.timedelta(days=d) for d in rule.weekdays] if rule.weekdays else [anchor]
+        else:
+            candidates = [_add_months(base, period * rule.interval, rule.monthday or start.day)]
+        for occurrence in candidates:
+            if occurrence < start:
+                continue
+            if rule.until is not None and occurrence > rule.until:
+                return
+            emitted += 1
+            if rule.count is not None and emitted > rule.count:
+                return
+            if after is None or occurrence > after:
+                yield occurrence
+
+
+def next_occurrence(rule, after):
+    """The first occurrence of `rule` strictly after `after`, or None when the series has ended."""
+    return next(iter_occurrences(rule, after), None)
+
+
+def _migrate_create_tasks(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            notes TEXT,
+            due TEXT,
+            priority INTEGER DEFAULT 2,
+            status TEXT DEFAULT 'todo',
+            tags TEXT,
+            created TEXT,
+            updated TEXT,
+            recurrence TEXT,
+            parent_id INTEGER
+        )
+        """
+    )
+
+
+def _migrate_due_epoch(conn):
+    # normalized due timestamp, backfilled from the free-text column
+    conn.execute("ALTER TABLE tasks ADD COLUMN due_epoch INTEGER")
+    conn.create_function("due_epoch", 1, due_epoch, deterministic=True)
+    conn.execute("UPDATE tasks SET due_epoch = due_epoch(due) WHERE due IS NOT NULL")
+    # status filters (Todo/Completed/Overdue) and the default ordering
+    conn.execute("CREATE INDEX IF NOT EXISTS tasks_status_due ON tasks(status, due_epoch, priority)")
+    # date-range filters that don't constrain status (Today)
+    conn.execute("CREATE INDEX IF NOT EXISTS tasks_due ON tasks(due_epoch, priority)")
+
+
+def _migrate_fts(conn):
+    # external-content index: text lives in tasks, tasks_fts holds only the index
+    try:
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE tasks_fts USING fts5(
+                title, notes, tags,
+                content='tasks', content_rowid='id',
+                tokenize='{FTS_TOKENIZE}', prefix='2 3'
+            )
+            """.format(FTS_TOKENIZE=FTS_TOKENIZE)
+        )
+    except sqlite3.OperationalError as e:
+        if 'fts5' not in str(e):
+            raise
+        return  # SQLite built without FTS5; search falls back to LIKE
+    # separate statements: executescript() would commit the migration's transaction
+    conn.execute(
+        """
+        CREATE TRIGGER tasks_fts_insert AFTER INSERT ON tasks BEGIN
+            INSERT INTO tasks_fts(rowid, title, notes, tags) VALUES (new.id, new.title, new.notes, new.tags);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER tasks_fts_delete AFTER DELETE ON tasks BEGIN
+            INSERT INTO tasks_fts(tasks_fts, rowid, title, notes, tags) VALUES ('delete', old.id, old.title, old.notes, old.tags);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER tasks_fts_update AFTER UPDATE OF title, notes, tags ON tasks BEGIN
+            INSERT INTO tasks_fts(tasks_fts, rowid, title, notes, tags) VALUES ('delete', old.id, old.title, old.notes, old.tags);
+            INSERT INTO tasks_fts(rowid, title, notes, tags) VALUES (new.id, new.title, new.notes, new.tags);
+        END
+        """
+    )
+    conn.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+
+def _migrate_reminders(conn):
+    # the due_epoch each task was last reminded about; a new due date re-arms it
+    conn.execute("CREATE TABLE reminders (task_id INTEGER PRIMARY KEY, due_epoch INTEGER NOT NULL)")
+    conn.execute(
+        """
+        CREATE TRIGGER reminders_cleanup AFTER DELETE ON tasks BEGIN
+            DELETE FROM reminders WHERE task_id = old.id;
+        END
+        """
+    )
+
+
+def _migrate_series(conn):
+    # instances of one recurring task share the id of its first instance
+    conn.execute("ALTER TABLE tasks ADD COLUMN series_id INTEGER")
+    conn.execute("UPDATE tasks SET series_id = id WHERE recurrence IS NOT NULL")
+    conn.execute("CREATE INDEX tasks_series ON tasks(series_id, due_epoch) WHERE series_id IS NOT NULL")
+
+
+def rebuild_tree(conn):
+    """Recompute task_tree and every rollup from parent_id in a few set-based statements.
+
+    Used to backfill, and after imports whose parents may arrive after
+    their children. Links to missing parents are dropped.
+    """
+    conn.execute("UPDATE tasks SET parent_id = NULL WHERE parent_id IS NOT NULL AND parent_id NOT IN (SELECT id FROM tasks)")
+    conn.execute("DELETE FROM task_tree")
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO task_tree (ancestor, descendant, depth)
+        WITH RECURSIVE up(ancestor, descendant, depth) AS (
+            SELECT id, id, 0 FROM tasks
+            UNION ALL
+            SELECT t.parent_id, up.descendant, up.depth + 1
+            FROM up JOIN tasks t ON t.id = up.ancestor
+            WHERE t.parent_id IS NOT NULL AND up.depth < 1000
+        )
+        SELECT ancestor, descendant, depth FROM up
+        """
+    )
+    conn.execute("UPDATE tasks SET sub_total = 0, sub_done = 0 WHERE sub_total != 0 OR sub_done != 0")
+    conn.execute(
+        """
+        WITH agg AS (
+            SELECT c.ancestor AS id, COUNT(*) AS total, SUM(d.status = 'done') AS done
+            FROM task_tree c JOIN tasks d ON d.id = c.descendant
+            WHERE c.depth > 0
+            GROUP BY c.ancestor
+        )
+        UPDATE tasks SET sub_total = agg.total, sub_done = agg.done FROM agg WHERE tasks.id = agg.id
+        """
+    )
+
+
+def _migrate_subtasks(conn):
+    # closure table: one row per (ancestor, descendant) pair, including each task with itself
+    conn.execute("ALTER TABLE tasks ADD COLUMN sub_total INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE tasks ADD COLUMN sub_done INTEGER NOT NULL DEFAULT 0")
+    conn.execute(
+        """
+        CREATE TABLE task_tree (
+            ancestor INTEGER NOT NULL,
+            descendant INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor, descendant)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX task_tree_up ON task_tree(descendant, depth)")
+    conn.execute("CREATE INDEX tasks_parent ON tasks(parent_id, due_epoch, priority)")
+    conn.execute(
+        """
+        CREATE TRIGGER tasks_tree_insert AFTER INSERT ON tasks BEGIN
+            INSERT INTO task_tree (ancestor, descendant, depth) VALUES (new.id, new.id, 0);
+            INSERT INTO task_tree (ancestor, descendant, depth)
+                SELECT ancestor, new.id, depth + 1 FROM task_tree WHERE descendant = new.parent_id;
+            UPDATE tasks SET sub_total = sub_total + 1, sub_done = sub_done + (new.status = 'done')
+                WHERE id IN (SELECT ancestor FROM task_tree WHERE descendant = new.id AND depth > 0);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER tasks_tree_delete AFTER DELETE ON tasks BEGIN
+            UPDATE tasks SET sub_total = sub_total - 1, sub_done = sub_done - (old.status = 'done')
+                WHERE id IN (SELECT ancestor FROM task_tree WHERE descendant = old.id AND depth > 0);
+            DELETE FROM task_tree WHERE descendant = old.id OR ancestor = old.id;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER tasks_tree_status AFTER UPDATE OF status ON tasks
+        WHEN (old.status = 'done') != (new.status = 'done') BEGIN
+            UPDATE tasks SET sub_done = sub_done + (CASE WHEN new.status = 'done' THEN 1 ELSE -1 END)
+                WHERE id IN (SELECT ancestor FROM task_tree WHERE descendant = new.id AND depth > 0);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER tasks_tree_cycle BEFORE UPDATE OF parent_id ON tasks
+        WHEN new.parent_id IS NOT NULL BEGIN
+            SELECT RAISE(ABORT, 'a task cannot be moved under itself or its own subtask')
+                WHERE EXISTS (SELECT 1 FROM task_tree WHERE ancestor = new.id AND descendant = new.parent_id);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER tasks_tree_move AFTER UPDATE OF parent_id ON tasks
+        WHEN old.parent_id IS NOT new.parent_id BEGIN
+            -- take the whole subtree's counts off the old ancestors...
+            UPDATE tasks SET sub_total = sub_total - 1 - new.sub_total,
+                             sub_done = sub_done - (new.status = 'done') - new.sub_done
+                WHERE id IN (SELECT ancestor FROM task_tree WHERE descendant = new.id AND depth > 0);
+            DELETE FROM task_tree
+                WHERE descendant IN (SELECT descendant FROM task_tree WHERE ancestor = new.id)
+                  AND ancestor IN (SELECT ancestor FROM task_tree WHERE descendant = new.id AND depth > 0);
+            -- ...relink it under the new parent's ancestors...
+            INSERT INTO task_tree (ancestor, descendant, depth)
+                SELECT a.ancestor, d.descendant, a.depth + d.depth + 1
+                FROM task_tree a, task_tree d
+                WHERE a.descendant = new.parent_id AND d.ancestor = new.id;
+            -- ...and add the counts to them
+            UPDATE tasks SET sub_total = sub_total + 1 + new.sub_total,
+                             sub_done = sub_done + (new.status = 'done') + new.sub_done
+                WHERE id IN (SELECT ancestor FROM task_tree WHERE descendant = new.id AND depth > 0);
+        END
+        """
+    )
+    rebuild_tree(conn)
+
+
+def _tag_list_sql(column):
+    """SQL for a JSON array of the comma-separated tags in `column`, for json_each().
+
+    Malformed values (stray control characters) give an empty list rather
+    than failing the write.
+    """
+    quoted = f"""'["' || replace(replace(replace({column}, '\\', '\\\\'), '"', '\\"'), ',', '","') || '"]'"""
+    return f"CASE WHEN json_valid({quoted}) THEN {quoted} ELSE '[]' END"
+
+
+def _link_tags_sql(task):
+    # statements that tag `task` (new.* in a trigger) from its tags column
+    tags = _tag_list_sql(f"{task}.tags")
+    return f"""
+        INSERT OR IGNORE INTO tags (name)
+            SELECT trim(value) FROM json_each({tags}) WHERE trim(value) != '';
+        INSERT OR IGNORE INTO task_tags (tag_id, task_id)
+            SELECT id, {task}.id FROM tags WHERE name IN (SELECT trim(value) FROM json_each({tags}));
+        UPDATE tags SET task_count = task_count + 1
+            WHERE id IN (SELECT tag_id FROM task_tags WHERE task_id = {task}.id);
+    """
+
+
+def _unlink_tags_sql(task):
+    return f"""
+        UPDATE tags SET task_count = task_count - 1
+            WHERE id IN (SELECT tag_id FROM task_tags WHERE task_id = {task}.id);
+        DELETE FROM task_tags WHERE task_id = {task}.id;
+        DELETE FROM tags WHERE task_count <= 0;
+    """
+
+
+def _migrate_tags(conn):
+    # normalized tags; task_count is kept current by the triggers below
+    conn.execute(
+        """
+        CREATE TABLE tags (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            task_count INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE task_tags (
+            tag_id INTEGER NOT NULL,
+            task_id INTEGER NOT NULL,
+            PRIMARY KEY (tag_id, task_id)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX task_tags_task ON task_tags(task_id)")
+    conn.execute(f"CREATE TRIGGER tasks_tags_insert AFTER INSERT ON tasks BEGIN {_link_tags_sql('new')} END")
+    conn.execute(
+        f"""
+        CREATE TRIGGER tasks_tags_update AFTER UPDATE OF tags ON tasks
+        WHEN old.tags IS NOT new.tags BEGIN {_unlink_tags_sql('old')} {_link_tags_sql('new')} END
+        """
+    )
+    conn.execute(f"CREATE TRIGGER tasks_tags_delete AFTER DELETE ON tasks BEGIN {_unlink_tags_sql('old')} END")
+    # backfill
+    tags = _tag_list_sql('tasks.tags')
+    conn.execute(
+        f"""
+        INSERT OR IGNORE INTO tags (name)
+        SELECT trim(j.value) FROM tasks, json_each({tags}) j
+        WHERE tasks.tags IS NOT NULL AND trim(j.value) != ''
+        """
+    )
+    conn.execute(
+        f"""
+        INSERT OR IGNORE INTO task_tags (tag_id, task_id)
+        SELECT t.id, tasks.id FROM tasks, json_each({tags}) j JOIN tags t ON t.name = trim(j.value)
+        WHERE tasks.tags IS NOT NULL
+        """
+    )
+    conn.execute("UPDATE tags SET task_count = (SELECT COUNT(*) FROM task_tags WHERE tag_id = tags.id)")
+
+
+def _migrate_sync(conn):
+    # delta sync: changes are found by `updated`, deletions by their tombstone
+    conn.execute("CREATE INDEX tasks_updated ON tasks(updated, id)")
+    conn.execute("CREATE TABLE deleted_tasks (task_id INTEGER PRIMARY KEY, deleted TEXT NOT NULL)")
+    conn.execute("CREATE INDEX deleted_tasks_deleted ON deleted_tasks(deleted)")
+    conn.execute(
+        f"""
+        CREATE TRIGGER tasks_tombstone AFTER DELETE ON tasks BEGIN
+            INSERT OR REPLACE INTO deleted_tasks (task_id, deleted) VALUES (old.id, {SQL_NOW});
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER tasks_untombstone AFTER INSERT ON tasks BEGIN
+            DELETE FROM deleted_tasks WHERE task_id = new.id;
+        END
+        """
+    )
+    # a parent's rollup counts are part of its row, so changing them is a change
+    conn.execute(
+        f"""
+        CREATE TRIGGER tasks_rollup_touch AFTER UPDATE OF sub_total, sub_done ON tasks
+        WHEN new.updated IS old.updated BEGIN
+            UPDATE tasks SET updated = {SQL_NOW} WHERE id = new.id;
+        END
+        """
+    )
+
+
+def _migrate_journal(conn):
+    # undo history; `changes` is [[task_id, before, after], ...] where before/after
+    # hold only the changed JOURNAL_COLUMNS, the whole row for inserts and deletes,
+    # and null for a row that doesn't exist on that side
+    conn.execute(
+        """
+        CREATE TABLE journal (
+            id INTEGER PRIMARY KEY,
+            label TEXT NOT NULL,
+            changes TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            undone INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+
+
+def _install_capture(conn):
+    """Per-connection TEMP triggers that note every task row a journaled step touches.
+
+    While journal_capturing has a row, the first change to each task stores
+    its prior JOURNAL_COLUMNS (NULL for rows the step inserted) in
+    journal_capture. Cascades and rollup updates made by other triggers are
+    caught too.
+    """
+    row = "json_object(" + ", ".join(f"'{c}', old.{c}" for c in JOURNAL_COLUMNS) + ")"
+    conn.execute("CREATE TEMP TABLE journal_capture (task_id INTEGER PRIMARY KEY, before TEXT)")
+    conn.execute("CREATE TEMP TABLE journal_capturing (active INTEGER)")
+    for event, when, before in (('UPDATE', 'BEFORE', row), ('DELETE', 'BEFORE', row), ('INSERT', 'AFTER', 'NULL')):
+        key = 'new.id' if event == 'INSERT' else 'old.id'
+        conn.execute(
+            f"""
+            CREATE TEMP TRIGGER journal_capture_{event.lower()} {when} {event} ON main.tasks
+            WHEN EXISTS (SELECT 1 FROM journal_capturing) BEGIN
+                INSERT OR IGNORE INTO journal_capture (task_id, before) VALUES ({key}, {before});
+            END
+            """
+        )
+
+
+def parents_first(rows):
+    """Order task rows so that any parent among them comes before its subtasks."""
+    by_id = {r['id']: r for r in rows}
+    ordered, seen = [], set()
+
+    def visit(row):
+        if row['id'] in seen:
+            return
+        seen.add(row['id'])
+        parent = by_id.get(row['parent_id'])
+        if parent is not None:
+            visit(parent)
+        ordered.append(row)
+
+    for row in rows:
+        visit(row)
+    return ordered
+
+
+# applied in order; PRAGMA user_version records how many have run
+MIGRATIONS = [
+    _migrate_create_tasks,
+    _migrate_due_epoch,
+    _migrate_fts,
+    _migrate_reminders,
+    _migrate_series,
+    _migrate_subtasks,
+    _migrate_tags,
+    _migrate_sync,
+    _migrate_journal,
+]
+
+
+class TaskStorage:
+    """SQLite-backed task storage, safe to share between threads.
+
+    The database runs in WAL mode, so reads never wait for writes. Reads
+    borrow a read-only connection from a small pool (see reader()). All
+    writes go through one writer thread: the write methods queue a job and
+    return a concurrent.futures.Future. The writer runs every job waiting in
+    the queue in one transaction, each under its own savepoint, so a burst
+    of writes costs a single commit and one failing job doesn't undo the
+    others. A future resolves once its job has been committed.
+
+    Writes given an `undo` label are recorded in the journal table as one
+    undoable step; undo() and redo() walk it. The journal keeps at most
+    `undo_steps` steps and `undo_bytes` bytes of changes (the newest step is
+    always kept), and survives restarts.
+    """
+    def __init__(self, path=DB_PATH, readers=READ_POOL_SIZE, undo_steps=UNDO_STEPS, undo_bytes=UNDO_BYTES):
+        self.path = path
+        self.undo_steps = undo_steps
+        self.undo_bytes = undo_bytes
+        self._writer = self._connect()
+        self._pool = queue.LifoQueue()
+        self._pool_lock = threading.Lock()
+        if path == ':memory:':
+            # can't be shared between connections: readers and the writer
+            # take turns with the one there is
+            self._pool.put(self._writer)
+            self._spare_readers = 0
+        else:
+            self._writer.execute("PRAGMA journal_mode = WAL")
+            self._spare_readers = readers
+        self._probe = None
+        self._probe_lock = threading.Lock()
+        self._init_db()
+        _install_capture(self._writer)
+        self._jobs = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._write_loop, name='TaskStorage writer', daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        # autocommit; transactions are opened explicitly
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        """Bring the schema up to date, one migration per PRAGMA user_version step."""
+        conn = self._writer
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        self.has_fts = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts'"
+        ).fetchone() is not None
+        self._analyze(conn)
+
+    @staticmethod
+    def _analyze(conn):
+        """Refresh planner statistics (sampled, so cheap even on big tables).
+
+        Without them SQLite prefers the status index over an FTS rowid list
+        when search and filter are combined.
+        """
+        conn.execute("PRAGMA analysis_limit = 1000")
+        conn.execute("ANALYZE tasks")
+
+    # -- connections --------------------------------------------------------
+
+    @contextlib.contextmanager
+    def reader(self):
+        """Borrow a pooled read connection: ``with storage.reader() as conn:``.
+
+        Connections are opened on demand up to the pool size; after that
+        callers wait for one to be handed back.
+        """
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._pool_lock:
+                if self._spare_readers:
+                    self._spare_readers -= 1
+                    conn = self._connect()
+                    conn.execute("PRAGMA query_only = ON")
+            if conn is None:
+                conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def _reading(self, conn=None):
+        # the caller's connection if it passed one, else a pooled one
+        return contextlib.nullcontext(conn) if conn is not None else self.reader()
+
+    def _fetch(self, sql, params=()):
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def submit(self, job, *args, undo=None):
+        """Queue ``job(conn, *args)`` for the writer thread; returns a Future for its result.
+
+        The job runs inside the writer's transaction and must not commit.
+        With an `undo` label, every task row it changes is journaled as one
+        undoable step.
+        """
+        if self._closed:
+            raise RuntimeError('TaskStorage is closed')
+        if undo is not None:
+            job, args = self._journaled, (undo, job, args)
+        future = Future()
+        self._jobs.put((future, job, args))
+        return future
+
+    def close(self):
+        """Finish the queued writes, then close every connection."""
+        if self._closed:
+            return
+        self._closed = True
+        self._jobs.put(None)
+        self._thread.join()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        self._writer.close()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._jobs.get()]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            batch = [item for item in batch if item is not None]
+            if batch:
+                # an in-memory database's only connection sits in the reader pool
+                shared = self.path == ':memory:'
+                with self.reader() if shared else contextlib.nullcontext(self._writer) as conn:
+                    self._run_batch(conn, batch)
+            if stop:
+                return
+
+    @staticmethod
+    def _run_batch(conn, batch):
+        """Run queued jobs in one transaction (group commit) and settle their futures."""
+        batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except Exception as e:
+            for future, _, _ in batch:
+                future.set_exception(e)
+            return
+        done = []
+        try:
+            for future, job, args in batch:
+                conn.execute("SAVEPOINT job")
+                try:
+                    result = job(conn, *args)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    future.set_exception(e)
+                else:
+                    conn.execute("RELEASE job")
+                    done.append((future, result))
+            conn.execute("COMMIT")
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for future, _ in done:
+                future.set_exception(e)
+            for future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for future, result in done:
+            future.set_result(result)
+
+    # -- writes (each returns a Future) -------------------------------------
+
+    def add_task(self, task, undo=None):
+        """Insert a task; the Future gives its id."""
+        return self.submit(self._add_task, task, undo=undo)
+
+    def _add_task(self, conn, task):
+        now = now_iso()
+        cur = conn.execute(
+            """
+            INSERT INTO tasks (title, notes, due, due_epoch, priority, status, tags, created, updated, recurrence, parent_id, series_id)
+            VALUES (:title, :notes, :due, :due_epoch, :priority, :status, :tags, :created, :updated, :recurrence, :parent_id, :series_id)
+            """,
+            {
+                'title': task.get('title'),
+                'notes': task.get('notes'),
+                'due': task.get('due'),
+                'due_epoch': due_epoch(task.get('due')),
+                'priority': task.get('priority', 2),
+                'status': task.get('status', 'todo'),
+                'tags': task.get('tags'),
+                'created': now,
+                'updated': now,
+                'recurrence': anchored_recurrence(task.get('recurrence'), task.get('due')),
+                'parent_id': task.get('parent_id'),
+                'series_id': task.get('series_id'),
+            },
+        )
+        if task.get('recurrence') and not task.get('series_id'):
+            conn.execute("UPDATE tasks SET series_id = id WHERE id = ?", (cur.lastrowid,))
+        return cur.lastrowid
+
+    def update_task(self, task_id, fields, check=None, undo=None):
+        """Change some of a task's fields.
+
+        `check(row)`, if given, is called with the current row inside the
+        write transaction; raising from it cancels the update.
+        """
+        return self.submit(self._update_task, task_id, fields, check, undo=undo)
+
+    @staticmethod
+    def _update_task(conn, task_id, fields, check=None):
+        if check is not None:
+            check(conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone())
+        fields = dict(fields)
+        fields['updated'] = now_iso()
+        if 'due' in fields:
+            fields['due_epoch'] = due_epoch(fields['due'])
+        if fields.get('recurrence'):
+            if 'due' in fields:
+                due = fields['due']
+            else:
+                row = conn.execute("SELECT due FROM tasks WHERE id = ?", (task_id,)).fetchone()
+                due = row[0] if row else None
+            fields['recurrence'] = anchored_recurrence(fields['recurrence'], due)
+        set_clause = ",".join(f"{k} = :{k}" for k in fields.keys())
+        if fields.get('recurrence') and 'series_id' not in fields:
+            set_clause += ", series_id = COALESCE(series_id, id)"
+        params = {**fields, 'id': task_id}
+        conn.execute(f"UPDATE tasks SET {set_clause} WHERE id = :id", params)
+
+    def _spawn_next(self, conn, task):
+        """Create the next instance of a recurring task; returns its id.
+
+        Only ever one instance per occurrence: if the next one already
+        exists (the task was completed, reopened and completed again), or
+        the series has ended, nothing is created and None is returned.
+        """
+        due = parse_due(task['due'])
+        if not task['recurrence'] or due is None:
+            return None
+        series = task['series_id'] or task['id']
+        rule = parse_recurrence(task['recurrence'])
+        if rule.start is None:
+            # stored before rules carried DTSTART: the series starts at its earliest instance
+            first = conn.execute(
+                "SELECT due FROM tasks WHERE series_id = ? AND due_epoch IS NOT NULL ORDER BY due_epoch LIMIT 1",
+                (series,),
+            ).fetchone()
+            rule = rule._replace(start=parse_due(first[0]) if first else due)
+        nxt = next_occurrence(rule, due)
+        if nxt is None:
+            return None
+        epoch = int(nxt.timestamp())
+        if conn.execute("SELECT 1 FROM tasks WHERE series_id = ? AND due_epoch = ?", (series, epoch)).fetchone():
+            return None
+        has_time = len(task['due'].strip()) > 10
+        return self._add_task(conn, {
+            'title': task['title'],
+            'notes': task['notes'],
+            'due': nxt.strftime('%Y-%m-%d %H:%M' if has_time else '%Y-%m-%d'),
+            'priority': task['priority'],
+            'tags': task['tags'],
+            'recurrence': format_recurrence(rule),
+            'parent_id': task['parent_id'],
+            'series_id': series,
+        })
+
+    def delete_task(self, task_id, undo=None):
+        """Delete a task together with all its subtasks; the Future gives the deleted ids."""
+        return self.submit(self._delete_task, task_id, undo=undo)
+
+    @staticmethod
+    def _delete_task(conn, task_id):
+        ids = [r[0] for r in conn.execute(
+            "SELECT descendant FROM task_tree WHERE ancestor = ? ORDER BY depth", (task_id,)
+        )] or [task_id]
+        conn.execute("DELETE FROM tasks WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),))
+        return ids
+
+    def complete_task(self, task_id, undo=None):
+        """Mark a task and every open subtask done, and continue the recurring ones.
+
+        The Future gives (ids that changed, {changed id: id of its next
+        instance}). All of it is one write, so it is also one undo step.
+        """
+        return self.submit(self._complete_task, task_id, undo=undo)
+
+    def _complete_task(self, conn, task_id):
+        changed = self._complete_subtree(conn, task_id)
+        recurring = conn.execute(
+            "SELECT * FROM tasks WHERE id IN (SELECT value FROM json_each(?)) AND recurrence IS NOT NULL",
+            (json.dumps(changed),),
+        ).fetchall()
+        spawned = {}
+        for task in recurring:
+            next_id = self._spawn_next(conn, task)
+            if next_id is not None:
+                spawned[task['id']] = next_id
+        return changed, spawned
+
+    @staticmethod
+    def _complete_subtree(conn, task_id):
+        # one UPDATE; the rollup triggers adjust the ancestors' counts
+        ids = [r[0] for r in conn.execute(
+            """
+            SELECT id FROM tasks
+            WHERE id IN (SELECT descendant FROM task_tree WHERE ancestor = ?) AND status != 'done'
+            """,
+            (task_id,),
+        )]
+        conn.execute(
+            "UPDATE tasks SET status = 'done', updated = ? WHERE id IN (SELECT value FROM json_each(?))",
+            (now_iso(), json.dumps(ids)),
+        )
+        return ids
+
+    @staticmethod
+    def _insert_rows(conn, rows):
+        """Re-insert journaled rows with their original ids.
+
+        Rollups and the closure table are rebuilt by the insert triggers.
+        `updated` is set to now, so delta sync sees them come back.
+        """
+        now = now_iso()
+        columns = ('id', *JOURNAL_COLUMNS, 'due_epoch', 'updated')
+        conn.executemany(
+            f"INSERT INTO tasks ({', '.join(columns)}) VALUES ({', '.join(':' + k for k in columns)})",
+            [{**r, 'due_epoch': due_epoch(r['due']), 'updated': now} for r in parents_first(rows)],
+        )
+
+    # -- bulk edits ---------------------------------------------------------
+    #
+    # Each takes a list_tasks-style filter for the tasks to change, so "every
+    # task matching the search" costs the same as a handful of ids. The
+    # matching ids are fixed first (an edit may change which rows match),
+    # then each change is a single UPDATE or DELETE over them.
+
+    def bulk_complete(self, where_clause=None, params=(), undo=None):
+        """complete_task for every matching task; the Future gives (changed, spawned) as there."""
+        return self.submit(self._bulk_complete, where_clause, params, undo=undo)
+
+    def bulk_delete(self, where_clause=None, params=(), undo=None):
+        """Delete every matching task and its subtasks; the Future gives how many rows went."""
+        return self.submit(self._bulk_delete, where_clause, params, undo=undo)
+
+    def bulk_edit(self, where_clause=None, params=(), status=None, priority=None, due=None, shift_days=None,
+                  add_tags=(), remove_tags=(), undo=None):
+        """Change matching tasks in one transaction.
+
+        `status`, `priority` and `due` are set when given (due='' clears
+        it); `shift_days` moves existing due dates by that many days,
+        keeping the time of day; `add_tags` and `remove_tags` edit each
+        task's tag list. The Future gives the number of matching tasks.
+        """
+        # one spelling per tag: "new" and "New" would both be appended, and the
+        # have-them-all check below would count two where the task holds one
+        unique = {}
+        for tag in add_tags:
+            unique.setdefault(tag.casefold(), tag)
+        return self.submit(
+            self._bulk_edit, where_clause, params, status, priority, due, shift_days,
+            list(unique.values()), list(remove_tags), undo=undo,
+        )
+
+    @staticmethod
+    def _select(conn, where_clause, params):
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS bulk_selection (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM bulk_selection")
+        q = "INSERT INTO bulk_selection SELECT id FROM tasks"
+        if where_clause:
+            q += " WHERE " + where_clause
+        return conn.execute(q, params).rowcount
+
+    def _bulk_complete(self, conn, where_clause, params):
+        self._select(conn, where_clause, params)
+        changed = [r[0] for r in conn.execute(
+            """
+            SELECT id FROM tasks
+            WHERE id IN (SELECT descendant FROM task_tree WHERE ancestor IN (SELECT id FROM bulk_selection))
+              AND status != 'done'
+            """
+        )]
+        conn.execute(
+            "UPDATE tasks SET status = 'done', updated = ? WHERE id IN (SELECT value FROM json_each(?))",
+            (now_iso(), json.dumps(changed)),
+        )
+        spawned = {}
+        recurring = conn.execute(
+            "SELECT * FROM tasks WHERE id IN (SELECT value FROM json_each(?)) AND recurrence IS NOT NULL",
+            (json.dumps(changed),),
+        ).fetchall()
+        for task in recurring:
+            next_id = self._spawn_next(conn, task)
+            if next_id is not None:
+                spawned[task['id']] = next_id
+        return changed, spawned
+
+    def _bulk_delete(self, conn, where_clause, params):
+        self._select(conn, where_clause, params)
+        return conn.execute(
+            """
+            DELETE FROM tasks
+            WHERE id IN (SELECT descendant FROM task_tree WHERE ancestor IN (SELECT id FROM bulk_selection))
+            """
+        ).rowcount
+
+    def _bulk_edit(self, conn, where_clause, params, status, priority, due, shift_days, add_tags, remove_tags):
+        count = self._select(conn, where_clause, params)
+        now = now_iso()
+        selected = "id IN (SELECT id FROM bulk_selection)"
+        fields = {}
+        if status is not None:
+            fields['status'] = status
+        if priority is not None:
+            fields['priority'] = priority
+        if due is not None:
+            fields['due'] = due or None
+            fields['due_epoch'] = due_epoch(due)
+        if fields:
+            set_clause = ", ".join(f"{k} = :{k}" for k in fields)
+            conn.execute(f"UPDATE tasks SET {set_clause}, updated = :updated WHERE {selected}", {**fields, 'updated': now})
+        if shift_days:
+            # in Python, so unpadded dates like 2026-1-5 parse as they do everywhere
+            # else; the shifted text is zero-padded
+            rows = conn.execute(f"SELECT id, due FROM tasks WHERE {selected} AND due IS NOT NULL").fetchall()
+            shifted = []
+            for task_id, due_text in rows:
+                new_due = shift_due(due_text, int(shift_days))
+                if new_due is not None:
+                    shifted.append({'id': task_id, 'due': new_due, 'due_epoch': due_epoch(new_due), 'updated': now})
+            conn.executemany(
+                "UPDATE tasks SET due = :due, due_epoch = :due_epoch, updated = :updated WHERE id = :id", shifted
+            )
+        if add_tags or remove_tags:
+            current = _tag_list_sql('tasks.tags')
+            # rebuild each list: kept tags in their order, then the new ones;
+            # only rows that gain or lose something are touched
+            conn.execute(
+                f"""
+                UPDATE tasks SET updated = :updated, tags = (
+                    SELECT group_concat(name, ', ') FROM (
+                        SELECT trim(value) AS name FROM json_each({current})
+                        WHERE trim(value) != '' AND lower(trim(value)) NOT IN (SELECT lower(value) FROM json_each(:remove))
+                        UNION ALL
+                        SELECT value FROM json_each(:add)
+                        WHERE lower(value) NOT IN (SELECT lower(trim(value)) FROM json_each({current}))
+                    )
+                )
+                WHERE {selected} AND (
+                    EXISTS (
+                        SELECT 1 FROM task_tags tt JOIN tags t ON t.id = tt.tag_id
+                        WHERE tt.task_id = tasks.id AND t.name IN (SELECT value FROM json_each(:remove))
+                    )
+                    OR (
+                        SELECT COUNT(*) FROM task_tags tt JOIN tags t ON t.id = tt.tag_id
+                        WHERE tt.task_id = tasks.id AND t.name IN (SELECT value FROM json_each(:add))
+                    ) < json_array_length(:add)
+                )
+                """,
+                {'updated': now, 'add': json.dumps(add_tags), 'remove': json.dumps(remove_tags)},
+            )
+        return count
+
+    # -- undo journal -------------------------------------------------------
+
+    def undo(self):
+        """Revert the newest journal step.
+
+        The Future gives None when there is nothing to undo, else a dict
+        with the step's `label` and the ids it `added`, `removed` and
+        `updated` (ancestors whose rollups moved included). If the step
+        can no longer be applied, because a restored id has been reused or
+        a row it would put back has since been changed outside the journal
+        (an import or the API), it is dropped and the dict carries an
+        `error`; the later change is kept.
+        """
+        return self.submit(self._undo_redo, True)
+
+    def redo(self):
+        """Re-apply the step undone last; the Future's result is as for undo()."""
+        return self.submit(self._undo_redo, False)
+
+    @staticmethod
+    def _begin_capture(conn):
+        conn.execute("DELETE FROM journal_capture")
+        conn.execute("INSERT INTO journal_capturing VALUES (1)")
+
+    @staticmethod
+    def _end_capture(conn):
+        """Stop capturing; returns [(task_id, before, after)] for every row touched.
+
+        `before` and `after` are dicts of JOURNAL_COLUMNS, None where the
+        row didn't (or no longer does) exist.
+        """
+        conn.execute("DELETE FROM journal_capturing")
+        captured = conn.execute("SELECT task_id, before FROM journal_capture ORDER BY task_id").fetchall()
+        conn.execute("DELETE FROM journal_capture")
+        current = {r['id']: r for r in conn.execute(
+            f"SELECT id, {', '.join(JOURNAL_COLUMNS)} FROM tasks WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps([r['task_id'] for r in captured]),),
+        )}
+        return [
+            (r['task_id'], json.loads(r['before']) if r['before'] else None,
+             {k: current[r['task_id']][k] for k in JOURNAL_COLUMNS} if r['task_id'] in current else None)
+            for r in captured
+        ]
+
+    def _journaled(self, conn, label, job, args):
+        self._begin_capture(conn)
+        try:
+            result = job(conn, *args)
+        finally:
+            touched = self._end_capture(conn)
+        changes = []
+        for task_id, before, after in touched:
+            if before is not None and after is not None:
+                # only what changed; rows that merely had their rollups adjusted drop out
+                keys = [k for k in JOURNAL_COLUMNS if before[k] != after[k]]
+                if not keys:
+                    continue
+                before, after = {k: before[k] for k in keys}, {k: after[k] for k in keys}
+            elif before is None and after is None:
+                continue  # created and deleted within the step
+            changes.append([task_id, before, after])
+        if changes:
+            data = json.dumps(changes, separators=(',', ':'))
+            # a new step ends the redo history
+            conn.execute("DELETE FROM journal WHERE undone = 1")
+            conn.execute("INSERT INTO journal (label, changes, size) VALUES (?, ?, ?)", (label, data, len(data)))
+            conn.execute(
+                """
+                DELETE FROM journal WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER newest AS n, SUM(size) OVER newest AS total
+                        FROM journal WINDOW newest AS (ORDER BY id DESC)
+                    )
+                    WHERE n > 1 AND (n > ? OR total > ?)
+                )
+                """,
+                (self.undo_steps, self.undo_bytes),
+            )
+        return result
+
+    def _undo_redo(self, conn, undo):
+        step = conn.execute(
+            f"SELECT id, label, changes FROM journal WHERE undone = ? ORDER BY id {'DESC' if undo else 'ASC'} LIMIT 1",
+            (0 if undo else 1,),
+        ).fetchone()
+        if step is None:
+            return None
+        # (task_id, state to bring the row to, state it is in now)
+        moves = [(t, b, a) if undo else (t, a, b) for t, b, a in json.loads(step['changes'])]
+        # unjournaled writes land between steps; replaying over one would silently revert it
+        stale = [t for t, _, current in moves if current is not None and not self._row_is(conn, t, current)]
+        if stale:
+            conn.execute("DELETE FROM journal WHERE id = ?", (step['id'],))
+            error = f"task {stale[0]} was changed outside the undo history"
+            return {'label': step['label'], 'added': [], 'removed': [], 'updated': [], 'error': error}
+        self._begin_capture(conn)
+        conn.execute("SAVEPOINT apply")
+        try:
+            # rows the step created go (with any subtasks added outside the journal)...
+            conn.execute(
+                """
+                DELETE FROM tasks WHERE id IN (
+                    SELECT descendant FROM task_tree WHERE ancestor IN (SELECT value FROM json_each(?))
+                )
+                """,
+                (json.dumps([t for t, target, _ in moves if target is None]),),
+            )
+            # ...rows it deleted come back under their own ids, and edits are reverted
+            self._insert_rows(conn, [{**target, 'id': t} for t, target, current in moves if current is None and target])
+            for t, target, current in moves:
+                if target is not None and current is not None:
+                    self._update_task(conn, t, target)
+        except sqlite3.IntegrityError as e:
+            conn.execute("ROLLBACK TO apply")
+            conn.execute("RELEASE apply")
+            self._end_capture(conn)
+            conn.execute("DELETE FROM journal WHERE id = ?", (step['id'],))
+            return {'label': step['label'], 'added': [], 'removed': [], 'updated': [], 'error': str(e)}
+        conn.execute("RELEASE apply")
+        touched = self._end_capture(conn)
+        conn.execute("UPDATE journal SET undone = ? WHERE id = ?", (int(undo), step['id']))
+        return {
+            'label': step['label'],
+            'added': [t for t, before, after in touched if before is None and after is not None],
+            'removed': [t for t, before, after in touched if before is not None and after is None],
+            'updated': [t for t, before, after in touched if before is not None and after is not None],
+        }
+
+    @staticmethod
+    def _row_is(conn, task_id, state):
+        """Whether the task exists with the journaled `state` (a dict of some JOURNAL_COLUMNS)."""
+        row = conn.execute(f"SELECT {', '.join(state)} FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return row is not None and all(row[k] == v for k, v in state.items())
+
+    def mark_reminded(self, due):
+        """Record (task_id, due_epoch) pairs whose reminder has fired."""
+        return self.submit(
+            lambda conn: conn.executemany("INSERT OR REPLACE INTO reminders (task_id, due_epoch) VALUES (?, ?)", due)
+        )
+
+    # -- reads --------------------------------------------------------------
+
+    def subtree_ids(self, task_id):
+        """The task and all its descendants, parents before children."""
+        rows = self._fetch(
+            "SELECT descendant FROM task_tree WHERE ancestor = ? ORDER BY depth", (task_id,)
+        )
+        return [r[0] for r in rows]
+
+    def ancestor_ids(self, task_id):
+        """Parent, grandparent, ... of the task, nearest first."""
+        rows = self._fetch(
+            "SELECT ancestor FROM task_tree WHERE descendant = ? AND depth > 0 ORDER BY depth", (task_id,)
+        )
+        return [r[0] for r in rows]
+
+    def tag_counts(self, where_clause=None, params=()):
+        """(name, count) for every tag, most used first.
+
+        Unfiltered counts are read from the tags table; with `where_clause`
+        only the matching tasks are counted, and tags none of them carry
+        are left out.
+        """
+        if not where_clause:
+            return self._fetch("SELECT name, task_count FROM tags ORDER BY task_count DESC, name")
+        return self._fetch(
+            f"""
+            SELECT t.name, COUNT(*) AS task_count FROM task_tags tt JOIN tags t ON t.id = tt.tag_id
+            WHERE tt.task_id IN (SELECT id FROM tasks WHERE {where_clause})
+            GROUP BY t.id ORDER BY task_count DESC, t.name
+            """,
+            params,
+        )
+
+    def get_tasks(self, ids):
+        """Rows for many ids in one query, in no particular order."""
+        return self._fetch(
+            "SELECT * FROM tasks WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(list(ids)),)
+        )
+
+    def get_task(self, task_id):
+        rows = self._fetch("SELECT * FROM tasks WHERE id = ?", (task_id,))
+        return rows[0] if rows else None
+
+    def task_matches(self, task_id, where_clause=None, params=()):
+        """Whether the task passes a list_tasks filter (a primary-key lookup)."""
+        q = "SELECT 1 FROM tasks WHERE id = ?"
+        if where_clause:
+            q += f" AND ({where_clause})"
+        return bool(self._fetch(q, (task_id, *params)))
+
+    def matches_search(self, task, text):
+        """Whether `task` matches the full-text query `text`.
+
+        Checked against a one-row FTS5 table in memory rather than the real
+        index, whose cost grows with how common the search terms are.
+        """
+        with self._probe_lock:
+            if self._probe is None:
+                self._probe = sqlite3.connect(':memory:', check_same_thread=False)
+                self._probe.execute(f"CREATE VIRTUAL TABLE probe USING fts5(title, notes, tags, tokenize='{FTS_TOKENIZE}')")
+            with self._probe:
+                self._probe.execute("DELETE FROM probe")
+                self._probe.execute("INSERT INTO probe VALUES (?, ?, ?)", (task['title'], task['notes'], task['tags']))
+                return self._probe.execute("SELECT 1 FROM probe WHERE probe MATCH ?", (fts_query(text),)).fetchone() is not None
+
+    def reminded_due(self, task_id):
+        """The due_epoch the task was last reminded about, or None."""
+        rows = self._fetch("SELECT due_epoch FROM reminders WHERE task_id = ?", (task_id,))
+        return rows[0][0] if rows else None
+
+    def upcoming_reminders(self, after, limit):
+        """Open tasks not yet reminded about, after the (due_epoch, priority, id) key `after`.
+
+        Read in (status, due_epoch, priority, id) index order.
+        """
+        return self._fetch(
+            """
+            SELECT id, due_epoch, priority FROM tasks
+            WHERE status = 'todo' AND (due_epoch, priority, id) > (?, ?, ?)
+              AND NOT EXISTS (SELECT 1 FROM reminders r WHERE r.task_id = tasks.id AND r.due_epoch = tasks.due_epoch)
+            ORDER BY due_epoch, priority, id LIMIT ?
+            """,
+            (*after, limit),
+        )
+
+    def changes(self, since, where_clause=None, params=(), after=None, limit=PAGE_SIZE, conn=None):
+        """Rows updated at or after `since`, plus ids deleted since then.
+
+        Returns ``(rows, deleted)``, `deleted` being (task_id, deleted)
+        tombstones. Rows come in (updated, id) order from the tasks_updated
+        index; pass the last one as `after` for the next `limit`. Each row
+        carries `matches`, whether it passes `where_clause`, so callers can
+        tell a changed row from one that has left a filtered view.
+
+        Writes are stamped in commit order (there is one writer), so the
+        newest stamp seen is a safe `since` for the next call. It is
+        inclusive because `updated` has one-second resolution: changes made
+        in that second are sent again rather than missed.
+        """
+        match = f"({where_clause})" if where_clause else "1"
+        q = f"SELECT *, {match} AS matches FROM tasks WHERE updated >= ?"
+        args = [*params, since]
+        if after is not None:
+            q += " AND (updated, id) > (?, ?)"
+            args += [after['updated'], after['id']]
+        q += " ORDER BY updated, id LIMIT ?"
+        with self._reading(conn) as conn:
+            rows = conn.execute(q, (*args, limit)).fetchall()
+            deleted = conn.execute(
+                "SELECT task_id, deleted FROM deleted_tasks WHERE deleted >= ? ORDER BY task_id", (since,)
+            ).fetchall()
+        return rows, deleted
+
+    def list_tasks(self, where_clause=None, params=(), conn=None):
+        q = "SELECT * FROM tasks"
+        if where_clause:
+            q += " WHERE " + where_clause
+        q += " ORDER BY " + TASK_ORDER
+        with self._reading(conn) as conn:
+            return conn.execute(q, params).fetchall()
+
+    def count_tasks(self, where_clause=None, params=(), conn=None):
+        q = "SELECT COUNT(*) FROM tasks"
+        if where_clause:
+            q += " WHERE " + where_clause
+        with self._reading(conn) as conn:
+            return conn.execute(q, params).fetchone()[0]
+
+    def page_tasks(self, where_clause=None, params=(), after=None, limit=PAGE_SIZE, conn=None):
+        """The next `limit` tasks in list_tasks order after the row `after`.
+
+        Keyset pagination on (due_epoch, priority, id): dated tasks are read
+        in index order, then undated ones, so every page is an index range
+        scan no matter how deep into the list it starts. Pass the last row
+        of the previous page as `after` (None for the first page).
+        """
+        base = [f"({where_clause})"] if where_clause else []
+        rows = []
+        with self._reading(conn) as conn:
+            if after is None or after['due_epoch'] is not None:
+                parts, args = base + ["due_epoch IS NOT NULL"], list(params)
+                if after is not None:
+                    parts.append("(due_epoch, priority, id) > (?, ?, ?)")
+                    args += [after['due_epoch'], after['priority'], after['id']]
+                q = "SELECT * FROM tasks WHERE " + " AND ".join(parts) + " ORDER BY due_epoch, priority, id LIMIT ?"
+                rows = conn.execute(q, (*args, limit)).fetchall()
+                if len(rows) == limit:
+                    return rows
+                after = None
+            parts, args = base + ["due_epoch IS NULL"], list(params)
+            if after is not None:
+                parts.append("(priority, id) > (?, ?)")
+                args += [after['priority'], after['id']]
+            q = "SELECT * FROM tasks WHERE " + " AND ".join(parts) + " ORDER BY priority, id LIMIT ?"
+            return rows + conn.execute(q, (*args, limit - len(rows))).fetchall()
+
+    def search(self, text, where_clause=None, params=(), after=None, limit=-1, conn=None):
+        """Tasks matching the full-text query `text`, best match first.
+
+        `where_clause` narrows the result further, as in list_tasks. Rows
+        carry their bm25 `score`; pass the last row seen as `after` to page
+        through results `limit` at a time. Needs FTS5 (see has_fts).
+        """
+        q = ("SELECT tasks.*, tasks_fts.rank AS score FROM tasks_fts JOIN tasks ON tasks.id = tasks_fts.rowid"
+             " WHERE tasks_fts MATCH ?")
+        args = [fts_query(text)]
+        if where_clause:
+            q += f" AND ({where_clause})"
+            args += params
+        if after is not None:
+            q += " AND (tasks_fts.rank, tasks.id) > (?, ?)"
+            args += [after['score'], after['id']]
+        q += " ORDER BY tasks_fts.rank, tasks.id LIMIT ?"
+        with self._reading(conn) as conn:
+            return conn.execute(q, (*args, limit)).fetchall()
+
+    def export_json(self, path):
+        return self.export(path, fmt='json')
+
+    def export(self, path, fmt=None, compress=None, where_clause=None, params=(), chunk_size=1000, progress=None):
+        """Stream tasks to `path` as JSON, NDJSON or CSV, optionally gzipped.
+
+        `fmt` and `compress` default to what the file name says
+        (``tasks.csv.gz`` -> CSV, gzipped). `where_clause`/`params` take the
+        same filters as list_tasks. Rows are fetched `chunk_size` at a time
+        and written immediately, so memory use does not depend on table
+        size. The rows come from one statement on a pooled reader, which
+        sees a single consistent snapshot while writes carry on. Returns
+        the number of tasks written.
+        """
+        name = path.lower()
+        if compress is None:
+            compress = name.endswith('.gz')
+        if name.endswith('.gz'):
+            name = name[:-3]
+        if fmt is None:
+            fmt = os.path.splitext(name)[1].lstrip('.') or 'json'
+        if fmt == 'jsonl':
+            fmt = 'ndjson'
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f'Unsupported export format: {fmt}')
+
+        q = "SELECT * FROM tasks"
+        if where_clause:
+            q += " WHERE " + where_clause
+        q += " ORDER BY " + TASK_ORDER
+
+        opener = gzip.open if compress else open
+        count = 0
+        with self.reader() as conn:
+            cur = conn.cursor()
+            cur.execute(q, params)
+            columns = [d[0] for d in cur.description]
+            with opener(path, 'wt', encoding='utf-8', newline='') as f:
+                if fmt == 'csv':
+                    writer = csv.writer(f)
+                    writer.writerow(columns)
+                elif fmt == 'json':
+                    f.write('[')
+                while True:
+                    rows = cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    if fmt == 'csv':
+                        writer.writerows(rows)
+                    elif fmt == 'ndjson':
+                        f.writelines(json.dumps(dict(zip(columns, r)), default=str) + '\n' for r in rows)
+                    else:
+                        for i, r in enumerate(rows, count):
+                            f.write(',\n  ' if i else '\n  ')
+                            f.write(json.dumps(dict(zip(columns, r)), default=str))
+                    count += len(rows)
+                    if progress:
+                        progress(count)
+                if fmt == 'json':
+                    f.write('\n]\n' if count else ']\n')
+        return count
+
+    def import_json(self, path, batch_size=5000, progress=None, preserve_ids=False):
+        """Bulk-import tasks from a JSON array or NDJSON file.
+
+        The file is parsed incrementally and rows are inserted with
+        executemany in batches of `batch_size`, all inside one transaction,
+        so memory use stays flat and a failure leaves the table untouched.
+        `progress(count)` is called after every batch.
+
+        With `preserve_ids` the source ids are kept as-is (an id clash aborts
+        the import). Otherwise tasks get new ids and `parent_id` links between
+        imported tasks are remapped to them; links to tasks outside the file
+        are dropped.
+
+        Runs as one job on the writer thread (so `progress` is called from
+        there); the Future gives the number of tasks inserted.
+        """
+        return self.submit(self._import_json, path, batch_size, progress, preserve_ids)
+
+    def _import_json(self, conn, path, batch_size, progress, preserve_ids):
+        inserted = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            cur = conn.cursor()
+            if not preserve_ids:
+                cur.execute("CREATE TEMP TABLE IF NOT EXISTS import_map (src_id INTEGER PRIMARY KEY, new_id INTEGER)")
+                cur.execute("DELETE FROM import_map")
+                # source parent of each new row, linked once every row is in
+                cur.execute("CREATE TEMP TABLE IF NOT EXISTS import_parents (new_id INTEGER PRIMARY KEY, src_parent INTEGER)")
+                cur.execute("DELETE FROM import_parents")
+                cur.execute("SELECT COALESCE(MAX(id), 0) FROM tasks")
+                first_id = next_id = cur.fetchone()[0] + 1
+            now = now_iso()
+            rows, mapping, parents = [], [], []
+            for index, item in enumerate(iter_json_records(f)):
+                if not isinstance(item, dict):
+                    raise ValueError(f'Record {index} is not a JSON object')
+                row = {
+                    'id': None,
+                    'title': item.get('title') or 'Untitled',
+                    'notes': item.get('notes'),
+                    'due': item.get('due'),
+                    'due_epoch': due_epoch(item.get('due')),
+                    'priority': item.get('priority') or 2,
+                    'status': item.get('status', 'todo'),
+                    'tags': item.get('tags'),
+                    'created': item.get('created') or now,
+                    'updated': now,
+                    # kept as exported: a series' instances anchor at its first one (see _spawn_next)
+                    'recurrence': item.get('recurrence'),
+                    'parent_id': item.get('parent_id'),
+                    'series_id': item.get('series_id') or (item.get('id') if item.get('recurrence') else None),
+                }
+                if preserve_ids:
+                    row['id'] = item.get('id')
+                else:
+                    # a source parent id may be taken by an unrelated task here,
+                    # so rows go in unlinked and the tree is built from the new ids
+                    row['id'] = next_id
+                    row['parent_id'] = None
+                    if item.get('id') is not None:
+                        mapping.append((item['id'], next_id))
+                    if item.get('parent_id') not in (None, item.get('id')):
+                        parents.append((next_id, item['parent_id']))
+                    next_id += 1
+                rows.append(row)
+                if len(rows) >= batch_size:
+                    inserted += self._insert_batch(cur, rows, mapping, parents)
+                    rows, mapping, parents = [], [], []
+                    if progress:
+                        progress(inserted)
+            if rows:
+                inserted += self._insert_batch(cur, rows, mapping, parents)
+                if progress:
+                    progress(inserted)
+            if not preserve_ids:
+                # link imported subtasks to their parents' new ids; unknown parents stay NULL
+                cur.execute(
+                    """
+                    UPDATE tasks SET parent_id = m.new_id
+                    FROM import_parents p JOIN import_map m ON m.src_id = p.src_parent
+                    WHERE tasks.id = p.new_id
+                    """
+                )
+                cur.execute(
+                    """
+                    UPDATE tasks SET series_id = (SELECT new_id FROM import_map WHERE src_id = tasks.series_id)
+                    WHERE id >= ? AND series_id IS NOT NULL
+                    """,
+                    (first_id,),
+                )
+                # recurring tasks whose series wasn't in the file start their own
+                cur.execute(
+                    "UPDATE tasks SET series_id = id WHERE id >= ? AND recurrence IS NOT NULL AND series_id IS NULL",
+                    (first_id,),
+                )
+                cur.execute("DELETE FROM import_map")
+                cur.execute("DELETE FROM import_parents")
+            else:
+                # parents may have come after their children in the file
+                rebuild_tree(conn)
+        self._analyze(conn)
+        return inserted
+
+    def _insert_batch(self, cur, rows, mapping, parents=()):
+        cur.executemany(
+            """
+            INSERT INTO tasks (id, title, notes, due, due_epoch, priority, status, tags, created, updated, recurrence, parent_id, series_id)
+            VALUES (:id, :title, :notes, :due, :due_epoch, :priority, :status, :tags, :created, :updated, :recurrence, :parent_id, :series_id)
+            """,
+            rows,
+        )
+        if mapping:
+            cur.executemany("INSERT OR REPLACE INTO import_map (src_id, new_id) VALUES (?, ?)", mapping)
+        if parents:
+            cur.executemany("INSERT INTO import_parents (new_id, src_parent) VALUES (?, ?)", parents)
+        return len(rows)
+
+
+def iter_json_records(f, chunk_size=1 << 16):
+    """Yield objects from a JSON array or an NDJSON stream without loading it whole."""
+    buf = f.read(chunk_size)
+    while buf and not buf.strip():
+        more = f.read(chunk_size)
+        if not more:
+            break
+        buf += more
+    stripped = buf.lstrip()
+    if not stripped.startswith('['):
+        yield from _iter_ndjson(f, buf, chunk_size)
+        return
+
+    decoder = json.JSONDecoder()
+    pos = len(buf) - len(stripped) + 1
+    eof = False
+    while True:
+        # skip whitespace and separators between elements, refilling as needed
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            more = f.read(chunk_size)
+            buf, pos, eof = more, 0, not more
+        if pos >= len(buf):
+            raise ValueError('Unexpected end of JSON array')
+        if buf[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise ValueError(f'Invalid JSON: {e}')
+            item, end = None, None
+        # a value ending exactly at the buffer edge may be cut short (e.g. a number)
+        if end is None or (end == len(buf) and not eof):
+            more = f.read(chunk_size)
+            buf, pos, eof = buf[pos:] + more, 0, not more
+            continue
+        yield item
+        pos = end
+        if pos > chunk_size:
+            buf, pos = buf[pos:], 0
+
+
+def _iter_ndjson(f, pending, chunk_size):
+    while True:
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+        more = f.read(chunk_size)
+        if not more:
+            break
+        pending += more
+    if pending.strip():
+        yield json.loads(pending)
+
+
+def fts_query(text):
+    """Turn search box text into an FTS5 MATCH expression.
+
+    Bare words match as prefixes ("rep" finds "report"), "quoted text" is a
+    phrase, and OR between two terms means either; everything else must all
+    match. User text is always quoted, so it can't produce a syntax error.
+    """
+    terms = []
+    for phrase, word in SEARCH_TOKEN.findall(text):
+        if word == 'OR':
+            if terms and terms[-1] != 'OR':
+                terms.append('OR')
+            continue
+        if word == 'AND':
+            continue  # implicit between terms
+        value = (phrase if phrase else word).replace('"', '""')
+        if not re.search(r'\w', value):
+            continue  # punctuation only; the tokenizer would drop it anyway
+        terms.append(f'"{value}"' if phrase else f'"{value}"*')
+    if terms and terms[-1] == 'OR':
+        terms.pop()
+    return ' '.join(terms) or '""'
+
+
+def build_task_filter(search='', filter_opt='All', fts=False, tags=(), match_all=True):
+    """WHERE clause and params for the search box and filter combobox.
+
+    With `fts` the search goes through the tasks_fts index; otherwise it
+    falls back to LIKE substring matching. `tags` keeps tasks carrying all
+    of them (or any of them, without `match_all`), looked up exactly in
+    the task_tags index.
+    """
+    qparts = []
+    params = []
+    if search and fts:
+        qparts.append("id IN (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ?)")
+        params.append(fts_query(search))
+    elif search:
+        qparts.append("(title LIKE ? OR notes LIKE ? OR tags LIKE ?)")
+        like = f"%{search}%"
+        params += [like, like, like]
+
+    if tags:
+        # tag names compare with NOCASE, which folds ASCII letters only; a
+        # repeated tag would otherwise raise the count HAVING asks for
+        tags = list({t.encode().lower(): t for t in tags}.values())
+        marks = ', '.join('?' * len(tags))
+        subquery = f"SELECT tt.task_id FROM tags t JOIN task_tags tt ON tt.tag_id = t.id WHERE t.name IN ({marks})"
+        if match_all and len(tags) > 1:
+            subquery += f" GROUP BY tt.task_id HAVING COUNT(*) = {len(tags)}"
+        qparts.append(f"id IN ({subquery})")
+        params += list(tags)
+
+    # every filter is a range on the (status, due_epoch) / (due_epoch) indexes
+    if filter_opt == 'Todo':
+        qparts.append("status = 'todo'")
+    elif filter_opt == 'Completed':
+        qparts.append("status = 'done'")
+    elif filter_opt == 'Overdue':
+        qparts.append("status = 'todo' AND due_epoch < ?")
+        params.append(int(time.time()))
+    elif filter_opt == 'Today':
+        start = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        qparts.append("due_epoch >= ? AND due_epoch < ?")
+        params += [int(start.timestamp()), int((start + datetime.timedelta(days=1)).timestamp())]
+
+    where = None
+    if qparts:
+        where = ' AND '.join(qparts)
+    return where, params
+
+
+def id_filter(ids):
+    """WHERE clause and params for an explicit set of task ids."""
+    return "id IN (SELECT value FROM json_each(?))", [json.dumps(list(ids))]
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from urllib.parse import quote
+
+from api import serve
+from storage import TaskStorage
+
+
+class APITest(unittest.IsolatedAsyncioTestCase):
+    """Requests over a real socket against a temporary database."""
+
+    async def asyncSetUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.storage = TaskStorage(os.path.join(self.dir, 'tasks.db'))
+        self.server = await serve(self.storage, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.storage.close()
+        shutil.rmtree(self.dir)
+
+    async def raw(self, data):
+        """Send `data` as is; returns (status, headers, parsed body or None)."""
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        writer.write(data)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        await writer.wait_closed()
+        head, _, body = response.partition(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        headers = dict(line.split(': ', 1) for line in lines[1:])
+        return int(lines[0].split()[1]), headers, json.loads(body) if body else None
+
+    async def request(self, method, target, body=None, **headers):
+        data = b'' if body is None else json.dumps(body).encode()
+        head = [f'{method} {target} HTTP/1.1', 'Connection: close', f'Content-Length: {len(data)}']
+        head += [f"{k.replace('_', '-')}: {v}" for k, v in headers.items()]
+        return await self.raw(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + data)
+
+    async def test_create_and_etag(self):
+        status, headers, task = await self.request('POST', '/tasks', {'title': 'write tests', 'priority': 1})
+        self.assertEqual(status, 201)
+        self.assertEqual(headers['Location'], f"/tasks/{task['id']}")
+        status, headers, fetched = await self.request('GET', headers['Location'])
+        self.assertEqual((status, fetched), (200, task))
+        status, _, body = await self.request('GET', f"/tasks/{task['id']}", If_None_Match=headers['ETag'])
+        self.assertEqual((status, body), (304, None))
+
+    async def test_if_match(self):
+        _, headers, task = await self.request('POST', '/tasks', {'title': 'a'})
+        etag = headers['ETag']
+        status, _, _ = await self.request('PATCH', f"/tasks/{task['id']}", {'title': 'b'}, If_Match=etag)
+        self.assertEqual(status, 200)
+        # the first edit changed the ETag
+        status, _, body = await self.request('PATCH', f"/tasks/{task['id']}", {'title': 'c'}, If_Match=etag)
+        self.assertEqual(status, 412)
+        self.assertEqual(self.storage.get_task(task['id'])['title'], 'b')
+
+    async def test_since_reports_changes_and_removals(self):
+        ids = [(await self.request('POST', '/tasks', {'title': title}))[2]['id'] for title in 'abc']
+        status, _, delta = await self.request('GET', '/tasks?since=0&filter=Todo')
+        self.assertEqual(status, 200)
+        self.assertEqual(sorted(t['id'] for t in delta['tasks']), ids)
+        self.assertIsNone(delta['next'])
+
+        await self.request('PATCH', f'/tasks/{ids[0]}', {'status': 'done'})
+        await self.request('DELETE', f'/tasks/{ids[1]}')
+        await self.request('PATCH', f'/tasks/{ids[2]}', {'title': 'c2'})
+        _, _, delta = await self.request('GET', f"/tasks?since={quote(delta['cursor'])}&filter=Todo")
+        # the cursor is inclusive, so rows changed in its second may come again
+        self.assertIn(ids[2], [t['id'] for t in delta['tasks']])
+        self.assertEqual(delta['removed'], ids[:2])
+
+    async def test_bad_requests(self):
+        _, _, task = await self.request('POST', '/tasks', {'title': 'a'})
+        cases = [
+            ('POST', '/tasks', {'title': 5}),
+            ('POST', '/tasks', {'title': 'x', 'parent_id': 999}),
+            ('POST', '/tasks', {'title': 'x', 'due': 'soon'}),
+            ('PATCH', f"/tasks/{task['id']}", {'nope': 1}),
+            ('GET', '/tasks?limit=ten', None),
+            ('GET', '/tasks?after=garbage', None),
+            ('GET', '/tasks?filter=Someday', None),
+        ]
+        for method, target, body in cases:
+            with self.subTest(method=method, target=target, body=body):
+                status, _, error = await self.request(method, target, body)
+                self.assertEqual(status, 400)
+                self.assertIn('error', error)
+
+    async def test_malformed_content_length(self):
+        for length in ('abc', '-1', '1e3'):
+            with self.subTest(length=length):
+                status, _, error = await self.raw(f'POST /tasks HTTP/1.1\r\nContent-Length: {length}\r\n\r\n'.encode())
+                self.assertEqual(status, 400)
+                self.assertIn('error', error)
+        status, _, _ = await self.raw(b'nonsense\r\n\r\n')
+        self.assertEqual(status, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from storage import TaskStorage, build_task_filter, due_epoch
+
+
+class ImportExportTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.storage = self.open('tasks.db')
+
+    def tearDown(self):
+        for s in self.opened:
+            s.close()
+        shutil.rmtree(self.dir)
+
+    def open(self, name):
+        if not hasattr(self, 'opened'):
+            self.opened = []
+        s = TaskStorage(os.path.join(self.dir, name))
+        self.opened.append(s)
+        return s
+
+    def tree(self, storage):
+        """(title, parent title, sub_total, sub_done) per task, and the closure table."""
+        rows = {r['id']: r for r in storage.list_tasks()}
+        tasks = sorted(
+            (r['title'], rows[r['parent_id']]['title'] if r['parent_id'] else None, r['sub_total'], r['sub_done'])
+            for r in rows.values()
+        )
+        with storage.reader() as conn:
+            pairs = sorted(
+                (rows[a]['title'], rows[d]['title'], depth)
+                for a, d, depth in conn.execute("SELECT ancestor, descendant, depth FROM task_tree")
+            )
+        return tasks, pairs
+
+    def test_round_trip_into_empty_db(self):
+        parent = self.storage.add_task({'title': 'parent'}).result()
+        child = self.storage.add_task({'title': 'child', 'due': '2026-01-01', 'parent_id': parent}).result()
+        self.storage.add_task({'title': 'grandchild', 'status': 'done', 'parent_id': child}).result()
+        path = os.path.join(self.dir, 'export.json')
+        self.storage.export(path)
+
+        target = self.open('copy.db')
+        self.assertEqual(target.import_json(path).result(), 3)
+        self.assertEqual(self.tree(target), self.tree(self.storage))
+
+    def test_child_before_parent_with_clashing_ids(self):
+        path = os.path.join(self.dir, 'tasks.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([{'id': 2, 'title': 'child', 'parent_id': 1}, {'id': 1, 'title': 'parent'}], f)
+        self.assertEqual(self.storage.import_json(path).result(), 2)
+        tasks, pairs = self.tree(self.storage)
+        self.assertEqual(tasks, [('child', 'parent', 0, 0), ('parent', None, 1, 0)])
+        self.assertIn(('parent', 'child', 1), pairs)
+
+    def test_import_next_to_existing_tasks(self):
+        self.storage.add_task({'title': 'existing'}).result()
+        path = os.path.join(self.dir, 'tasks.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([{'id': 1, 'title': 'parent'}, {'id': 2, 'title': 'child', 'parent_id': 1}], f)
+        self.storage.import_json(path).result()
+        tasks, _ = self.tree(self.storage)
+        self.assertEqual(tasks, [('child', 'parent', 0, 0), ('existing', None, 0, 0), ('parent', None, 1, 0)])
+
+    def test_non_object_record(self):
+        path = os.path.join(self.dir, 'tasks.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([{'title': 'ok'}, 1], f)
+        with self.assertRaisesRegex(ValueError, 'Record 1 is not a JSON object'):
+            self.storage.import_json(path).result()
+        self.assertEqual(self.storage.list_tasks(), [])
+
+
+class RecurrenceTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.storage = TaskStorage(os.path.join(self.dir, 'tasks.db'))
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.dir)
+
+    def complete_series(self, task_id):
+        """Complete each instance in turn; returns the due dates of the series."""
+        dues = [self.storage.get_task(task_id)['due']]
+        for _ in range(10):
+            _, spawned = self.storage.complete_task(task_id).result()
+            if not spawned:
+                break
+            task_id = spawned[task_id]
+            dues.append(self.storage.get_task(task_id)['due'])
+        return dues
+
+    def test_count_spans_the_series(self):
+        task_id = self.storage.add_task({'title': 'x', 'due': '2026-01-01', 'recurrence': 'FREQ=DAILY;COUNT=2'}).result()
+        self.assertEqual(self.storage.get_task(task_id)['recurrence'], 'FREQ=DAILY;COUNT=2;DTSTART=2026-01-01 00:00')
+        self.assertEqual(self.complete_series(task_id), ['2026-01-01', '2026-01-02'])
+
+    def test_rule_set_by_update_starts_at_due(self):
+        task_id = self.storage.add_task({'title': 'x', 'due': '2026-02-01 09:00'}).result()
+        self.storage.update_task(task_id, {'recurrence': 'FREQ=WEEKLY;COUNT=3'}).result()
+        self.assertEqual(self.complete_series(task_id), ['2026-02-01 09:00', '2026-02-08 09:00', '2026-02-15 09:00'])
+
+
+class BulkEditTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.storage = TaskStorage(os.path.join(self.dir, 'tasks.db'))
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.dir)
+
+    def test_shift_days_accepts_unpadded_dues(self):
+        dues = ['2026-1-5', '2026-01-05 9:00', '2026-01-31', '2026-02-27 23:30:15', None]
+        ids = [self.storage.add_task({'title': str(i), 'due': due}).result() for i, due in enumerate(dues)]
+        self.assertEqual(self.storage.bulk_edit(shift_days=2).result(), len(dues))
+        rows = [self.storage.get_task(i) for i in ids]
+        self.assertEqual(
+            [r['due'] for r in rows],
+            ['2026-01-07', '2026-01-07 09:00', '2026-02-02', '2026-03-01 23:30:15', None],
+        )
+        self.assertEqual([r['due_epoch'] for r in rows], [due_epoch(r['due']) for r in rows])
+
+    def test_add_tags_once_whatever_the_case(self):
+        task_id = self.storage.add_task({'title': 'a', 'tags': 'x'}).result()
+        self.storage.bulk_edit(add_tags=['new', 'New', 'NEW']).result()
+        self.assertEqual(self.storage.get_task(task_id)['tags'], 'x, new')
+        self.storage.submit(lambda conn: conn.execute("UPDATE tasks SET updated = '2000-01-01 00:00:00'")).result()
+        self.storage.bulk_edit(add_tags=['New', 'new']).result()
+        task = self.storage.get_task(task_id)
+        self.assertEqual((task['tags'], task['updated']), ('x, new', '2000-01-01 00:00:00'))
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.storage = TaskStorage(os.path.join(self.dir, 'tasks.db'))
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.dir)
+
+    def snapshot(self):
+        """Every task row and the closure table."""
+        with self.storage.reader() as conn:
+            tasks = [tuple(r) for r in conn.execute("SELECT * FROM tasks ORDER BY id")]
+            tree = conn.execute("SELECT ancestor, descendant, depth FROM task_tree ORDER BY 1, 2").fetchall()
+        return tasks, [tuple(r) for r in tree]
+
+    def test_undo_complete_removes_spawned_instance(self):
+        task_id = self.storage.add_task({'title': 'x', 'due': '2026-03-01', 'recurrence': 'FREQ=DAILY'}).result()
+        before = self.snapshot()
+        _, spawned = self.storage.complete_task(task_id, undo='complete').result()
+        step = self.storage.undo().result()
+        self.assertEqual(step['removed'], [spawned[task_id]])
+        self.assertIsNone(self.storage.get_task(spawned[task_id]))
+        self.assertEqual(self.snapshot()[0], before[0])
+
+    def test_undo_delete_restores_ids_and_closure(self):
+        parent = self.storage.add_task({'title': 'parent'}).result()
+        child = self.storage.add_task({'title': 'child', 'parent_id': parent}).result()
+        self.storage.add_task({'title': 'grandchild', 'parent_id': child, 'status': 'done'}).result()
+        before = self.snapshot()
+        self.storage.delete_task(parent, undo='delete').result()
+        self.assertEqual(self.snapshot(), ([], []))
+        self.storage.undo().result()
+        self.assertEqual(self.snapshot(), before)
+
+    def test_new_step_prunes_redo(self):
+        task_id = self.storage.add_task({'title': 'a'}, undo='add').result()
+        self.storage.update_task(task_id, {'title': 'b'}, undo='edit').result()
+        self.assertEqual(self.storage.undo().result()['updated'], [task_id])
+        self.assertEqual(self.storage.redo().result()['label'], 'edit')
+        self.assertEqual(self.storage.get_task(task_id)['title'], 'b')
+        self.storage.undo().result()
+        self.storage.update_task(task_id, {'priority': 1}, undo='edit').result()
+        self.assertIsNone(self.storage.redo().result())
+        self.assertEqual(self.storage.get_task(task_id)['title'], 'a')
+
+    def test_undo_keeps_later_unjournaled_edit(self):
+        task_id = self.storage.add_task({'title': 'a'}).result()
+        self.storage.update_task(task_id, {'title': 'b'}, undo='edit').result()
+        # as the API writes: no undo label
+        self.storage.update_task(task_id, {'title': 'c'}).result()
+        self.assertIn('error', self.storage.undo().result())
+        self.assertEqual(self.storage.get_task(task_id)['title'], 'c')
+        self.assertIsNone(self.storage.undo().result())
+
+
+class TagFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.storage = TaskStorage(os.path.join(self.dir, 'tasks.db'))
+        for title, tags, status in (('a', 'home, urgent', 'todo'), ('b', 'home', 'todo'), ('c', 'home, urgent', 'done')):
+            self.storage.add_task({'title': title, 'tags': tags, 'status': status}).result()
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.dir)
+
+    def titles(self, where, params):
+        return sorted(r['title'] for r in self.storage.list_tasks(where, params))
+
+    def test_repeated_tags_match_all(self):
+        where, params = build_task_filter(tags=['home', 'urgent', 'Urgent', 'urgent'])
+        self.assertEqual(self.titles(where, params), ['a', 'c'])
+
+    def test_counts_cover_the_filtered_tasks(self):
+        self.assertEqual([tuple(r) for r in self.storage.tag_counts()], [('home', 3), ('urgent', 2)])
+        where, params = build_task_filter(filter_opt='Todo')
+        self.assertEqual([tuple(r) for r in self.storage.tag_counts(where, params)], [('home', 2), ('urgent', 1)])
+        where, params = build_task_filter(filter_opt='Completed', tags=['missing'])
+        self.assertEqual(self.storage.tag_counts(where, params), [])
+
+
+if __name__ == '__main__':
+    unittest.main()